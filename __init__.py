@@ -9,120 +9,194 @@ import os
 import sys
 import json
 import yaml
-import shutil
 import webbrowser
-import uuid
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout,
                              QWidget, QPushButton, QLabel, QLineEdit, QTextEdit,
                              QFileDialog, QMessageBox, QProgressBar, QGroupBox,
-                             QCheckBox, QScrollArea, QMenuBar, QAction,
+                             QCheckBox, QScrollArea, QMenuBar, QAction, QMenu,
                              QFrame, QSplitter, QTabWidget, QSpinBox, QComboBox,
-                             QDialog, QDialogButtonBox, QGridLayout, QFormLayout)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSettings
-from PyQt5.QtGui import QFont, QIcon, QPixmap, QPainter, QCursor
-
-
-class SettingsManager:
-    """设置管理器"""
-
-    def __init__(self):
-        self.settings = QSettings("FileClassifier", "Settings")
-        self._load_default_settings()
-        # 初次启动
-        if not self.settings.allKeys():
-            self.reset_to_defaults()
-
-    def _load_default_settings(self):
-        """加载默认设置"""
-        self.default_settings = {
-            ## 常规设置
-            # 自动保存程序设置
-            'auto_save_settings': True,
-            # 安全操作
-            'confirm_action': True,
-            # 日志等级
-            'log_level': '详细',
-
-            ## 界面设置
-            # 主题
-            'theme': '默认',
-            # 字体大小
-            'font_size': 10,
-            # 最大日志行数
-            'max_log_lines': 5000,
-
-            ## 分类设置
-            # 默认输出路径
-            'default_output_pattern': './{date}_{id}_分类',
-            # 是否移动文件
-            'move_files': True,
-            # 是否递归处理子文件夹
-            'recursive': True,
-            # 是否保持原有子目录结构
-            'preserve_structure': True,
-            # 是否清空源文件夹
-            'remove_empty_folders': False,
-            # 是否排除输出路径
-            'exclude_output_dirs': True,
-            # 分类前备份源文件并校验
-            'backup_and_verify_source': False,
-
-            ## 高级设置
-            # 自动保存分类规则
-            'auto_save_rules': True,
-            # 备份分类规则
-            'backup_rules': True,
-        }
-
-    def get(self, key, default=None):
-        """获取设置值"""
-        if default is None:
-            default = self.default_settings.get(key)
-        return self.settings.value(key, default)
-
-    def set(self, key, value):
-        """设置值"""
-        self.settings.setValue(key, value)
-
-    def get_bool(self, key):
-        """获取布尔值设置"""
-        return self.settings.value(key, self.default_settings.get(key, False), type=bool)
-
-    def get_int(self, key):
-        """获取整数值设置"""
-        return self.settings.value(key, self.default_settings.get(key, 0), type=int)
-
-    def reset_to_defaults(self):
-        """重置为默认设置"""
-        self.settings.clear()
-        for key, value in self.default_settings.items():
-            self.settings.setValue(key, value)
-
-
-class QCollapsibleGroupBox(QGroupBox):
-    """可折叠的GroupBox"""
+                             QDialog, QDialogButtonBox, QGridLayout, QFormLayout,
+                             QTreeView, QHeaderView, QAbstractItemView, QListView)
+from PyQt5.QtCore import (Qt, QThread, QTimer, pyqtSignal, QSettings, QAbstractItemModel, QModelIndex,
+                          QStringListModel)
+from PyQt5.QtGui import QFont, QIcon, QPixmap, QPainter, QCursor, QColor
+from file_classifier import SettingsManager, FileClassifier
+from file_classifier.checkpoint import Checkpoint
+from file_classifier.executor import CancellationToken, ClassificationCancelled
+from file_classifier.logs import DETAIL, INFO, WARNING, format_record, failure_summary_lines, summarize_failures
+from file_classifier.rulecache import SafeLoader
+from file_classifier.profiling import cprofile_to, format_report
+from file_classifier.progress import ProgressThrottle, format_eta
+from file_classifier.rules import CategoryIndex, KIND_GLOB, KIND_REGEX, KIND_SUFFIX, rule_kind
+from file_classifier.verify import HASH_ALGORITHMS
+
+
+class RulesTreeModel(QAbstractItemModel):
+    """
+    规则树模型: 第一层为分类, 第二层为分类下的规则
+
+    监听规则表的修改增量更新索引和视图, 视图只为可见的行取数据
+    """
 
     # 分类名, 是否启用
     rule_toggled = pyqtSignal(str, bool)
 
-    def __init__(self, title="", parent=None, category_name=""):
-        super().__init__(title, parent)
-        self.setCheckable(True)
-        self.setChecked(True)
-        # 存储分类名称
-        self.category_name = category_name
-        self.toggled.connect(self.on_toggled)
+    # 一次修改的规则超过该数量时整体重置, 比逐行通知视图更快
+    RESET_THRESHOLD = 200
+    # 分类行的预览最多列出的规则数
+    PREVIEW_RULES = 30
+    KIND_NAMES = {KIND_REGEX: "正则", KIND_GLOB: "通配符", KIND_SUFFIX: "扩展名"}
 
-    def on_toggled(self, checked):
-        """切换折叠状态"""
-        for child in self.findChildren(QWidget):
-            if child != self:
-                child.setVisible(checked)
+    def __init__(self, classifier, parent=None):
+        super().__init__(parent)
+        self.classifier = classifier
+        self.rule_index = CategoryIndex(classifier.categories)
+        # 分类 <-> 编号, 规则行的 internalId 为所属分类的编号, 分类行为0; 编号不重复使用
+        self._ids = {}
+        self._names = {}
+        self._next_id = 1
+        classifier.categories.listeners.append(self.on_rules_changed)
+
+    def _category_id(self, category):
+        category_id = self._ids.get(category)
+        if category_id is None:
+            category_id = self._next_id
+            self._next_id += 1
+            self._ids[category] = category_id
+            self._names[category_id] = category
+        return category_id
+
+    def item_at(self, index):
+        """返回 (分类, 规则), 分类行的规则为None"""
+        if not index.isValid():
+            return None, None
+        if index.internalId() == 0:
+            return self.rule_index.names[index.row()], None
+        category = self._names.get(index.internalId())
+        return category, self.rule_index.rules(category)[index.row()]
+
+    def category_index(self, category):
+        row = self.rule_index.category_row(category)
+        return self.createIndex(row, 0, 0) if row >= 0 else QModelIndex()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        if parent.internalId() == 0:
+            category = self.rule_index.names[parent.row()]
+            return self.createIndex(row, column, self._category_id(category))
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        category = self._names.get(index.internalId())
+        return self.category_index(category) if category is not None else QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.rule_index)
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.rule_index.rules(self.rule_index.names[parent.row()]))
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ("分类 / 规则", "规则")[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.internalId() == 0 and index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        category, rule = self.item_at(index)
+        if rule is None:
+            if role == Qt.DisplayRole:
+                rules = self.rule_index.rules(category)
+                if index.column() == 0:
+                    return f"{category} ({len(rules)}条规则)"
+                preview = ', '.join(rules[:self.PREVIEW_RULES])
+                return preview + (' ...' if len(rules) > self.PREVIEW_RULES else '')
+            if role == Qt.CheckStateRole and index.column() == 0:
+                return Qt.Unchecked if category in self.classifier.disabled_categories else Qt.Checked
+            if role == Qt.ForegroundRole and category in self.classifier.disabled_categories:
+                return QColor(Qt.gray)
+            return None
+        if role == Qt.DisplayRole:
+            return rule if index.column() == 0 else self.KIND_NAMES[rule_kind(rule)]
+        return None
 
-        if self.category_name:
-            self.rule_toggled.emit(self.category_name, checked)
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid() or index.internalId() != 0:
+            return False
+        category, _ = self.item_at(index)
+        self.rule_toggled.emit(category, value == Qt.Checked)
+        self._category_changed(category)
+        return True
+
+    def _category_changed(self, category):
+        row = self.rule_index.category_row(category)
+        if row >= 0:
+            self.dataChanged.emit(self.createIndex(row, 0, 0), self.createIndex(row, 1, 0))
+
+    def on_rules_changed(self, changes):
+        """规则表修改后增量更新, 修改较多或整个规则表被替换时整体重置"""
+        if changes is None or len(changes) > self.RESET_THRESHOLD:
+            self.beginResetModel()
+            self.rule_index.rebuild(self.classifier.categories)
+            self._ids.clear()
+            self._names.clear()
+            self.endResetModel()
+            return
+        for rule, old, new in changes:
+            if old is not None:
+                self._remove(rule, old)
+            if new is not None:
+                self._insert(rule, new)
+
+    def _insert(self, rule, category):
+        row, new_category, rule_row = self.rule_index.insert_position(category, rule)
+        if new_category:
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rule_index.add(category, rule)
+            self.endInsertRows()
+            return
+        self.beginInsertRows(self.createIndex(row, 0, 0), rule_row, rule_row)
+        self.rule_index.add(category, rule)
+        self.endInsertRows()
+        self._category_changed(category)
+
+    def _remove(self, rule, category):
+        row = self.rule_index.category_row(category)
+        rule_row = self.rule_index.rule_row(category, rule)
+        if row < 0 or rule_row < 0:
+            return
+        if len(self.rule_index.rules(category)) == 1:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.rule_index.remove(category, rule)
+            self.endRemoveRows()
+            category_id = self._ids.pop(category, None)
+            self._names.pop(category_id, None)
+            return
+        self.beginRemoveRows(self.createIndex(row, 0, 0), rule_row, rule_row)
+        self.rule_index.remove(category, rule)
+        self.endRemoveRows()
+        self._category_changed(category)
 
 
 class SettingsDialog(QDialog):
@@ -152,6 +226,11 @@ class SettingsDialog(QDialog):
         self.log_level_combo = QComboBox()
         self.log_level_combo.addItems(["简洁", "详细", "调试"])
         general_layout.addRow("日志级别:", self.log_level_combo)
+        self.log_file_input = QLineEdit()
+        self.log_file_input.setPlaceholderText("留空则不写入文件")
+        general_layout.addRow("日志文件:", self.log_file_input)
+        self.enable_profiling_cb = QCheckBox("记录各阶段及各类操作的耗时 (工具 -> 运行统计)")
+        general_layout.addRow("运行统计:", self.enable_profiling_cb)
         tab_widget.addTab(general_tab, "常规")
 
         # 界面设置
@@ -167,6 +246,10 @@ class SettingsDialog(QDialog):
         self.max_log_lines_spin.setRange(100, 10000)
         self.max_log_lines_spin.setSuffix(" 行")
         ui_layout.addRow("最大日志行数:", self.max_log_lines_spin)
+        self.progress_rate_spin = QSpinBox()
+        self.progress_rate_spin.setRange(1, 60)
+        self.progress_rate_spin.setSuffix(" 次/秒")
+        ui_layout.addRow("进度刷新频率:", self.progress_rate_spin)
         tab_widget.addTab(ui_tab, "界面")
 
         # 分类设置
@@ -187,6 +270,30 @@ class SettingsDialog(QDialog):
         classify_layout.addRow("智能排除:", self.exclude_output_cb)
         self.backup_and_verify_cb = QCheckBox("分类前备份源文件并进行校验 (更安全)")
         classify_layout.addRow("安全与校验:", self.backup_and_verify_cb)
+        self.backup_strategy_combo = QComboBox()
+        for label, strategy in (("自动选择", 'auto'), ("硬链接快照 (同一文件系统)", 'hardlink'),
+                                ("写时复制克隆 (btrfs/XFS等)", 'reflink'), ("完整复制", 'copy')):
+            self.backup_strategy_combo.addItem(label, strategy)
+        classify_layout.addRow("备份方式:", self.backup_strategy_combo)
+        verify_layout = QHBoxLayout()
+        self.verify_checksum_cb = QCheckBox("校验文件内容哈希")
+        verify_layout.addWidget(self.verify_checksum_cb)
+        self.checksum_algorithm_combo = QComboBox()
+        self.checksum_algorithm_combo.addItems(sorted(HASH_ALGORITHMS))
+        verify_layout.addWidget(self.checksum_algorithm_combo)
+        verify_layout.addStretch()
+        classify_layout.addRow("内容校验:", verify_layout)
+        self.io_workers_spin = QSpinBox()
+        self.io_workers_spin.setRange(0, 64)
+        self.io_workers_spin.setSpecialValueText("自动 (按目标设备)")
+        self.io_workers_spin.setSuffix(" 线程")
+        classify_layout.addRow("并发文件操作:", self.io_workers_spin)
+        self.content_sniffing_cb = QCheckBox("扩展名无法识别时按文件内容识别")
+        classify_layout.addRow("内容识别:", self.content_sniffing_cb)
+        self.enable_cache_cb = QCheckBox("复制时缓存已分类的文件, 再次分类时跳过未变更的文件")
+        classify_layout.addRow("分类缓存:", self.enable_cache_cb)
+        self.enable_journal_cb = QCheckBox("记录操作日志, 可撤销分类")
+        classify_layout.addRow("操作日志:", self.enable_journal_cb)
         tab_widget.addTab(classify_tab, "分类")
 
         # 高级设置
@@ -196,6 +303,10 @@ class SettingsDialog(QDialog):
         advanced_layout.addRow("规则保存:", self.auto_save_rules_cb)
         self.backup_rules_cb = QCheckBox("备份分类规则")
         advanced_layout.addRow("规则备份:", self.backup_rules_cb)
+        self.rule_backup_retention_spin = QSpinBox()
+        self.rule_backup_retention_spin.setRange(1, 1000)
+        self.rule_backup_retention_spin.setSuffix(" 个")
+        advanced_layout.addRow("保留备份:", self.rule_backup_retention_spin)
         tab_widget.addTab(advanced_tab, "高级")
 
         layout.addWidget(tab_widget)
@@ -216,10 +327,13 @@ class SettingsDialog(QDialog):
         self.auto_save_settings_cb.setChecked(self.settings_manager.get_bool('auto_save_settings'))
         self.confirm_action_cb.setChecked(self.settings_manager.get_bool('confirm_action'))
         self.log_level_combo.setCurrentText(self.settings_manager.get('log_level'))
+        self.log_file_input.setText(self.settings_manager.get('log_file'))
+        self.enable_profiling_cb.setChecked(self.settings_manager.get_bool('enable_profiling'))
 
         self.theme_combo.setCurrentText(self.settings_manager.get('theme'))
         self.font_size_spin.setValue(self.settings_manager.get_int('font_size'))
         self.max_log_lines_spin.setValue(self.settings_manager.get_int('max_log_lines'))
+        self.progress_rate_spin.setValue(self.settings_manager.get_int('progress_updates_per_second'))
 
         self.output_pattern_input.setText(self.settings_manager.get('default_output_pattern'))
         self.move_files_cb.setChecked(self.settings_manager.get_bool('move_files'))
@@ -228,9 +342,18 @@ class SettingsDialog(QDialog):
         self.remove_empty_folders_cb.setChecked(self.settings_manager.get_bool('remove_empty_folders'))
         self.exclude_output_cb.setChecked(self.settings_manager.get_bool('exclude_output_dirs'))
         self.backup_and_verify_cb.setChecked(self.settings_manager.get_bool('backup_and_verify_source'))
+        self.io_workers_spin.setValue(self.settings_manager.get_int('io_workers'))
+        self.backup_strategy_combo.setCurrentIndex(
+            max(0, self.backup_strategy_combo.findData(self.settings_manager.get('backup_strategy'))))
+        self.verify_checksum_cb.setChecked(self.settings_manager.get_bool('verify_checksum'))
+        self.checksum_algorithm_combo.setCurrentText(self.settings_manager.get('checksum_algorithm'))
+        self.content_sniffing_cb.setChecked(self.settings_manager.get_bool('content_sniffing'))
+        self.enable_cache_cb.setChecked(self.settings_manager.get_bool('enable_cache'))
+        self.enable_journal_cb.setChecked(self.settings_manager.get_bool('enable_journal'))
 
         self.auto_save_rules_cb.setChecked(self.settings_manager.get_bool('auto_save_rules'))
         self.backup_rules_cb.setChecked(self.settings_manager.get_bool('backup_rules'))
+        self.rule_backup_retention_spin.setValue(self.settings_manager.get_int('rule_backup_retention'))
 
     def reset_defaults(self):
         """重置为默认设置"""
@@ -251,10 +374,13 @@ class SettingsDialog(QDialog):
         self.settings_manager.set('auto_save_settings', self.auto_save_settings_cb.isChecked())
         self.settings_manager.set('confirm_action', self.confirm_action_cb.isChecked())
         self.settings_manager.set('log_level', self.log_level_combo.currentText())
+        self.settings_manager.set('log_file', self.log_file_input.text().strip())
+        self.settings_manager.set('enable_profiling', self.enable_profiling_cb.isChecked())
 
         self.settings_manager.set('theme', self.theme_combo.currentText())
         self.settings_manager.set('font_size', self.font_size_spin.value())
         self.settings_manager.set('max_log_lines', self.max_log_lines_spin.value())
+        self.settings_manager.set('progress_updates_per_second', self.progress_rate_spin.value())
 
         self.settings_manager.set('default_output_pattern', self.output_pattern_input.text())
         self.settings_manager.set('move_files', self.move_files_cb.isChecked())
@@ -263,9 +389,17 @@ class SettingsDialog(QDialog):
         self.settings_manager.set('remove_empty_folders', self.remove_empty_folders_cb.isChecked())
         self.settings_manager.set('exclude_output_dirs', self.exclude_output_cb.isChecked())
         self.settings_manager.set('backup_and_verify_source', self.backup_and_verify_cb.isChecked())
+        self.settings_manager.set('io_workers', self.io_workers_spin.value())
+        self.settings_manager.set('backup_strategy', self.backup_strategy_combo.currentData())
+        self.settings_manager.set('verify_checksum', self.verify_checksum_cb.isChecked())
+        self.settings_manager.set('checksum_algorithm', self.checksum_algorithm_combo.currentText())
+        self.settings_manager.set('content_sniffing', self.content_sniffing_cb.isChecked())
+        self.settings_manager.set('enable_cache', self.enable_cache_cb.isChecked())
+        self.settings_manager.set('enable_journal', self.enable_journal_cb.isChecked())
 
         self.settings_manager.set('auto_save_rules', self.auto_save_rules_cb.isChecked())
         self.settings_manager.set('backup_rules', self.backup_rules_cb.isChecked())
+        self.settings_manager.set('rule_backup_retention', self.rule_backup_retention_spin.value())
 
         super().accept()
 
@@ -384,7 +518,7 @@ class RuleEditDialog(QDialog):
         layout.addRow("分类名称:", self.category_input)
 
         self.extensions_input = QLineEdit()
-        self.extensions_input.setPlaceholderText("例: doc,docx,pdf (用逗号分隔)")
+        self.extensions_input.setPlaceholderText("例: doc,pdf,tar.gz,*.min.js,re:^IMG_\\d+ (用逗号分隔)")
         layout.addRow("文件扩展名:", self.extensions_input)
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -397,658 +531,70 @@ class RuleEditDialog(QDialog):
         return self.category_input.text().strip(), self.extensions_input.text().strip()
 
 
-class FileClassifier:
-    """文件分类器核心类"""
-
-    def __init__(self, settings_manager, log_callback=None):
-        self.settings_manager = settings_manager
-        self.config_file = "classifier_rules.yaml"
-        self.backup_dir = "rule_backups"
-        # 禁用分类
-        self.disabled_categories = set()
-        # 记录输出目录历史
-        self.output_dirs_history = set()
-        # 回调函数
-        self.log_callback = log_callback
-        # 默认分类规则
-        self.default_categories = {
-            # 文档类
-            'txt': 'Text',
-            'doc': 'Documents',
-            'docx': 'Documents',
-            'pdf': 'PDF',
-            'rtf': 'Documents',
-            'odt': 'Documents',
-            'pages': 'Documents',
-            'wpd': 'Documents',
-            'wps': 'Documents',
-            'md': 'Text',
-            'markdown': 'Text',
-            'tex': 'Text',
-            'text': 'Text',
-            'nfo': 'Text',
-            'log': 'Text',
-            'wri': 'Documents',
-            'xps': 'Documents',
-
-            # 电子表格类
-            'xlsx': 'Spreadsheets',
-            'xls': 'Spreadsheets',
-            'csv': 'Spreadsheets',
-            'ods': 'Spreadsheets',
-            'numbers': 'Spreadsheets',
-            'tsv': 'Spreadsheets',
-            'gsheet': 'Spreadsheets',
-
-            # 演示文稿
-            'ppt': 'Presentations',
-            'pptx': 'Presentations',
-            'odp': 'Presentations',
-            'key': 'Presentations',
-            'gslide': 'Presentations',
-
-            # 电子书
-            'epub': 'eBooks',
-            'mobi': 'eBooks',
-            'azw': 'eBooks',
-            'azw3': 'eBooks',
-            'fb2': 'eBooks',
-            'lit': 'eBooks',
-            'lrf': 'eBooks',
-            'prc': 'eBooks',
-            'kpf': 'eBooks',
-
-            # 图片类
-            'jpg': 'Images',
-            'jpeg': 'Images',
-            'png': 'Images',
-            'gif': 'Images',
-            'bmp': 'Images',
-            'svg': 'Images',
-            'ico': 'Images',
-            'webp': 'Images',
-            'tga': 'Images',
-            'psd': 'Images',
-            'ai': 'Images',
-            'eps': 'Images',
-            'raw': 'Images',
-            'cr2': 'Images',
-            'nef': 'Images',
-            'heic': 'Images',
-            'heif': 'Images',
-            'avif': 'Images',
-            'jxl': 'Images',
-            'wmf': 'Images',
-            'emf': 'Images',
-
-            # 视频类
-            'mp4': 'Videos',
-            'avi': 'Videos',
-            'mkv': 'Videos',
-            'mov': 'Videos',
-            'wmv': 'Videos',
-            'flv': 'Videos',
-            'webm': 'Videos',
-            'm4v': 'Videos',
-            'mpg': 'Videos',
-            'mpeg': 'Videos',
-            '3gp': 'Videos',
-            '3g2': 'Videos',
-            'rmvb': 'Videos',
-            'rm': 'Videos',
-            'asf': 'Videos',
-            'vob': 'Videos',
-            'm2ts': 'Videos',
-
-            # 音频类
-            'mp3': 'Audio',
-            'wav': 'Audio',
-            'flac': 'Audio',
-            'aac': 'Audio',
-            'ogg': 'Audio',
-            'oga': 'Audio',
-            'wma': 'Audio',
-            'm4a': 'Audio',
-            'ape': 'Audio',
-            'alac': 'Audio',
-            'opus': 'Audio',
-            'aiff': 'Audio',
-            'aif': 'Audio',
-            'au': 'Audio',
-            'ra': 'Audio',
-            'amr': 'Audio',
-
-            # 压缩包类
-            'zip': 'Archives',
-            'rar': 'Archives',
-            '7z': 'Archives',
-            'tar': 'Archives',
-            'gz': 'Archives',
-            'bz2': 'Archives',
-            'xz': 'Archives',
-            'dmg': 'Archives',
-            'cab': 'Archives',
-            'z': 'Archives',
-            'arj': 'Archives',
-            'lzh': 'Archives',
-
-            # 代码类
-            'py': 'Code',
-            'js': 'Code',
-            'html': 'Code',
-            'htm': 'Code',
-            'css': 'Code',
-            'cpp': 'Code',
-            'cxx': 'Code',
-            'cc': 'Code',
-            'c': 'Code',
-            'h': 'Code',
-            'hpp': 'Code',
-            'java': 'Code',
-            'kt': 'Code',
-            'swift': 'Code',
-            'go': 'Code',
-            'rs': 'Code',
-            'php': 'Code',
-            'rb': 'Code',
-            'pl': 'Code',
-            'sh': 'Code',
-            'bat': 'Code',
-            'ps1': 'Code',
-            'vbs': 'Code',
-            'sql': 'Code',
-            'r': 'Code',
-            'scala': 'Code',
-            'clj': 'Code',
-            'hs': 'Code',
-            'elm': 'Code',
-            'dart': 'Code',
-            'vue': 'Code',
-            'jsx': 'Code',
-            'tsx': 'Code',
-            'ts': 'Code',
-            'json': 'Code',
-            'xml': 'Code',
-            'yaml': 'Code',
-            'yml': 'Code',
-            'toml': 'Code',
-            'conf': 'Code',
-            'cjs': 'Code',
-            'mjs': 'Code',
-            'ejs': 'Code',
-            'hbs': 'Code',
-            'pug': 'Code',
-            'haml': 'Code',
-            'slim': 'Code',
-            'mts': 'Code',
-            'scss': 'Code',
-            'sass': 'Code',
-            'less': 'Code',
-            'coffee': 'Code',
-            'cljs': 'Code',
-            'fs': 'Code',
-            'jl': 'Code',
-            'lua': 'Code',
-            'groovy': 'Code',
-            's': 'Code',
-            'pas': 'Code',
-            'for': 'Code',
-            'f90': 'Code',
-            'cob': 'Code',
-            'bas': 'Code',
-            'vb': 'Code',
-            'csproj': 'Code',
-            'vcproj': 'Code',
-            'sln': 'Code',
-            'gradle': 'Code',
-            'pom': 'Code',
-            'Makefile': 'Code',
-            'makefile': 'Code',
-            'Dockerfile': 'Code',
-            'dockerfile': 'Code',
-            'gitignore': 'Code',
-            'npmrc': 'Code',
-            'nvmrc': 'Code',
-
-            # 字体类
-            'ttf': 'Fonts',
-            'otf': 'Fonts',
-            'woff': 'Fonts',
-            'woff2': 'Fonts',
-            'eot': 'Fonts',
-            'fon': 'Fonts',
-            'fnt': 'Fonts',
-
-            # 可执行文件
-            'exe': 'Executables',
-            'msi': 'Executables',
-            'app': 'Executables',
-            'pkg': 'Executables',
-            'run': 'Executables',
-            'deb': 'Executables',
-            'rpm': 'Executables',
-            'apk': 'Executables',
-            'ipa': 'Executables',
-            'jar': 'Executables',
-            'com': 'Executables',
-            'drv': 'Executables',
-            'vmdk': 'Executables',
-            'vhd': 'Executables',
-
-            # 3D模型
-            'obj': '3D_Models',
-            'fbx': '3D_Models',
-            '3ds': '3D_Models',
-            'dae': '3D_Models',
-            'blend': '3D_Models',
-            'max': '3D_Models',
-            'ma': '3D_Models',
-            'mb': '3D_Models',
-
-            # 数据库文件
-            'db': 'Database',
-            'sqlite': 'Database',
-            'sqlite3': 'Database',
-            'mdb': 'Database',
-            'accdb': 'Database',
-            'dbf': 'Database',
-            'sqlitedb': 'Database',
-            'frm': 'Database',
-            'myd': 'Database',
-            'myi': 'Database',
-            'ibd': 'Database',
-
-            # 应用文件
-            'asar': 'App_Data',
-            'blockmap': 'App_Data',
-            'pak': 'App_Data',
-            'dat': 'App_Data',
-            'config': 'App_Data',
-            'settings': 'App_Data',
-            'pref': 'App_Data',
-
-            # Flash文件
-            'swf': 'Flash',
-            'fla': 'Flash',
-
-            # 种子文件
-            'torrent': 'Torrents',
-
-            # 快捷方式
-            'lnk': 'Shortcuts',
-            'url': 'Shortcuts',
-            'webloc': 'Shortcuts',
-            'desktop': 'Shortcuts',
-
-            # CAD文件
-            'dwg': 'CAD',
-            'dxf': 'CAD',
-            'dgn': 'CAD',
-            'iges': 'CAD',
-            'step': 'CAD',
-            'stp': 'CAD',
-            'sldprt': 'CAD',
-            'sldasm': 'CAD',
-            'prt': 'CAD',
-            'asm': 'CAD',
-
-            # GIS文件
-            'shp': 'GIS',
-            'shx': 'GIS',
-            'geojson': 'GIS',
-            'kml': 'GIS',
-            'kmz': 'GIS',
-            'gpx': 'GIS',
-            'tiff': 'GIS',
-
-            # 光盘镜像
-            'iso': 'Disc_Images',
-            'img': 'Disc_Images',
-            'nrg': 'Disc_Images',
-            'ccd': 'Disc_Images',
-            'bin': 'Disc_Images',
-            'cue': 'Disc_Images',
-
-            # 临时文件
-            'tmp': 'Temporary',
-            'temp': 'Temporary',
-            'bak': 'Temporary',
-
-            # 系统文件
-            'dll': 'System',
-            'sys': 'System',
-            'cfg': 'System',
-            'ini': 'System',
-            'inf': 'System',
-            'reg': 'System',
-            'dmp': 'System',
-        }
-
-        self.categories = self.default_categories.copy()
-        self.load_rules()
-
-    def _log(self, message):
-        if self.log_callback:
-            self.log_callback(message)
-
-    def generate_output_path(self, base_dir, pattern=None):
-        """生成输出路径"""
-        if pattern is None:
-            pattern = self.settings_manager.get('default_output_pattern')
-
-        # 替换模式中的变量
-        now = datetime.now()
-        unique_id = str(uuid.uuid4())[:8]
-        # 支持的变量
-        variables = {
-            'date': now.strftime('%Y%m%d'),
-            'time': now.strftime('%H%M%S'),
-            'datetime': now.strftime('%Y%m%d_%H%M%S'),
-            'id': unique_id,
-            'uuid': str(uuid.uuid4()),
-        }
-        # 替换变量
-        output_path = pattern
-        for var, value in variables.items():
-            output_path = output_path.replace(f'{{{var}}}', value)
-        # 如果是相对路径, 基于base_dir
-        if not os.path.isabs(output_path):
-            output_path = os.path.join(base_dir, output_path)
-        # 记录输出目录
-        self.output_dirs_history.add(os.path.abspath(output_path))
-        return output_path
-
-    def is_output_directory(self, path):
-        """检查路径是否为输出目录"""
-        if not self.settings_manager.get_bool('exclude_output_dirs'):
-            return False
-        abs_path = os.path.abspath(path)
-        # 检查是否是已知的输出目录
-        for output_dir in self.output_dirs_history:
-            if abs_path == output_dir or abs_path.startswith(output_dir + os.sep):
-                return True
-        # 检查目录名是否匹配输出目录模式
-        dir_name = os.path.basename(abs_path)
-        if '分类' in dir_name and ('_' in dir_name or any(char.isdigit() for char in dir_name)):
-            return True
-        return False
-
-    def toggle_category(self, category, enabled):
-        """切换分类的启用状态"""
-        if enabled:
-            self.disabled_categories.discard(category)
-            # 从默认规则中恢复该分类
-            for ext, cat in self.default_categories.items():
-                if cat == category:
-                    self.categories[ext] = cat
-        else:
-            self.disabled_categories.add(category)
-            # 临时移除该分类的规则
-            extensions_to_remove = [ext for ext, cat in self.categories.items() if cat == category]
-            for ext in extensions_to_remove:
-                del self.categories[ext]
-
-        self.save_rules()
-
-    def backup_rules(self):
-        """备份规则文件"""
-        if not self.settings_manager.get_bool('backup_rules'):
-            return
-        if not os.path.exists(self.config_file):
-            return
+class FailureDialog(QDialog):
+    """失败详情: 按原因汇总, 下方列表只绘制可见的行"""
 
-        # 创建备份目录
-        os.makedirs(self.backup_dir, exist_ok=True)
-        # 生成备份文件名
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(self.backup_dir, f"rules_backup_{timestamp}.yaml")
-        try:
-            shutil.copy2(self.config_file, backup_file)
-            self._log(f"规则已备份到: {backup_file}")
-        except Exception as e:
-            self._log(f"备份失败: {e}")
-
-    def load_rules(self):
-        """从YAML文件加载规则"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    # saved_rules = json.load(f)
-                    # self.categories.update(saved_rules)
-                    data = yaml.safe_load(f)
-                    if data:
-                        self.categories.update(data.get('categories', {}))
-                        self.output_dirs_history.update(data.get('output_dirs_history', []))
-                self._log("分类规则已成功加载")
-        except Exception as e:
-            self._log(f"加载规则失败: {e}")
-
-    def save_rules(self):
-        """保存规则到YAML文件"""
-        try:
-            # 备份现有规则
-            self.backup_rules()
-            data = {
-                'categories': self.categories,
-                'output_dirs_history': list(self.output_dirs_history),
-                'metadata': {
-                    'version': '1.0.2',
-                    'created': datetime.now().isoformat(),
-                    'disabled_categories': list(self.disabled_categories)
-                }
-            }
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                # json.dump(self.categories, f, ensure_ascii=False, indent=2)
-                yaml.dump(data, f, indent=2, allow_unicode=True)
-            self._log("分类规则已自动保存")
-        except Exception as e:
-            self._log(f"保存规则失败: {e}")
-
-    def add_category_rule(self, extension, category):
-        """添加新的分类规则"""
-        self.categories[extension.lower()] = category
-        self.save_rules()
-
-    def remove_category_rule(self, extension):
-        """移除分类规则"""
-        if extension.lower() in self.categories:
-            del self.categories[extension.lower()]
-            self.save_rules()
-
-    def get_file_category(self, filename):
-        """根据文件名获取分类"""
-        if filename.startswith('.'):
-            ext = filename[1:]
-        else:
-            _, ext = os.path.splitext(filename)
-            ext = ext.lower().lstrip('.')
-        # return self.categories.get(ext, None)
-
-        category = self.categories.get(ext, None)
-        # 检查分类是否被禁用
-        if category and category in self.disabled_categories:
-            return None
-        return category
+    def __init__(self, failed_files, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"失败详情 ({len(failed_files)} 个)")
+        self.resize(700, 500)
+        layout = QVBoxLayout(self)
 
-    def remove_empty_folders(self, path):
-        """递归删除空文件夹"""
-        if not os.path.exists(path) or not os.path.isdir(path):
-            return
+        summary = QTextEdit()
+        summary.setReadOnly(True)
+        summary.setPlainText('\n'.join(f"{group.reason}: {group.count} 个"
+                                        for group in summarize_failures(failed_files, examples=0)))
+        summary.setMaximumHeight(150)
+        layout.addWidget(summary)
 
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                self.remove_empty_folders(item_path)
-        # 如果目录为空则删除
-        try:
-            if not os.listdir(path):
-                os.rmdir(path)
-                self._log(f"已删除空文件夹: {path}")
-        except OSError:
-            # 目录不为空或无法删除
-            pass
+        self.model = QStringListModel(failed_files, self)
+        view = QListView()
+        view.setUniformItemSizes(True)
+        view.setModel(self.model)
+        layout.addWidget(view)
 
-    def classify_files(self, src_dir, output_dir=None, move_files=True, callback=None,
-                       recursive=False, preserve_structure=None, backup_and_verify=False):
-        """
-        分类文件
-
-        Args:
-            src_dir: 源目录
-            output_dir: 输出目录, 如果为None则自动生成
-            move_files: True移动文件, False复制文件
-            callback: 进度回调函数
-            recursive: 是否递归处理子文件夹
-            preserve_structure: 是否保持目录结构
-            backup_and_verify: 是否备份和校验
-
-        Returns:
-            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果)
-        """
-        if not os.path.exists(src_dir):
-            raise ValueError(f"目录不存在: {src_dir}")
-
-        # 生成输出目录
-        if output_dir is None:
-            output_dir = self.generate_output_path(src_dir)
-        # 确保输出目录存在
-        os.makedirs(output_dir, exist_ok=True)
-        if preserve_structure is None:
-            preserve_structure = self.settings_manager.get_bool('preserve_structure')
-
-        # 获取所有文件
-        all_files = []
-        if recursive:
-            # 递归获取所有文件
-            for root, dirs, files in os.walk(src_dir):
-                # 跳过输出目录
-                if self.is_output_directory(root):
-                    continue
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # 存储相对于源目录的路径信息
-                    rel_path = os.path.relpath(file_path, src_dir)
-                    all_files.append((file_path, file, rel_path))
-        else:
-            # 只获取当前目录的文件
-            for f in os.listdir(src_dir):
-                file_path = os.path.join(src_dir, f)
-                if os.path.isfile(file_path) and not self.is_output_directory(file_path):
-                    all_files.append((file_path, f, f))
-
-        total_files = len(all_files)
-        success_count = 0
-        failed_files = []
-        # 记录成功的操作
-        successful_ops = {}
-        backup_path = None
-
-        # 备份
-        if backup_and_verify and total_files > 0:
-            try:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                backup_path = os.path.join(output_dir, f"_backup_{timestamp}")
-                os.makedirs(backup_path, exist_ok=True)
-                self._log(f"开始备份 {total_files} 个文件到: {backup_path}")
-                for file_path, _, rel_path in all_files:
-                    backup_dest_dir = os.path.dirname(os.path.join(backup_path, rel_path))
-                    os.makedirs(backup_dest_dir, exist_ok=True)
-                    shutil.copy2(file_path, os.path.join(backup_path, rel_path))
-                self._log("文件备份完成")
-            except Exception as e:
-                self._log(f"错误: 文件备份失败: {e}")
-                # 备份失败，可以选择停止操作
-                raise IOError(f"文件备份失败: {e}")
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
 
-        # 分类
-        for i, (file_path, filename, rel_path) in enumerate(all_files):
-            try:
-                # 获取文件分类
-                category = self.get_file_category(filename)
-
-                if category:
-                    # 创建分类目录
-                    category_dir = os.path.join(output_dir, category)
-                    os.makedirs(category_dir, exist_ok=True)
-
-                    # 构建目标文件路径
-                    if preserve_structure and recursive:
-                        # 保持原有的子目录结构
-                        rel_dir = os.path.dirname(rel_path)
-                        if rel_dir and rel_dir != '.':
-                            target_subdir = os.path.join(category_dir, rel_dir)
-                            os.makedirs(target_subdir, exist_ok=True)
-                            dst_file = os.path.join(target_subdir, filename)
-                        else:
-                            dst_file = os.path.join(category_dir, filename)
-                    else:
-                        dst_file = os.path.join(category_dir, filename)
-
-                    # 处理文件名冲突
-                    counter = 1
-                    base_name, ext = os.path.splitext(filename)
-                    original_dst = dst_file
-                    while os.path.exists(dst_file):
-                        new_filename = f"{base_name}_{counter}{ext}"
-                        # dst_file = os.path.join(category_dir, new_filename)
-                        dst_file = os.path.join(os.path.dirname(original_dst), new_filename)
-                        counter += 1
-
-                    # 移动或复制文件
-                    if move_files:
-                        shutil.move(file_path, dst_file)
-                    else:
-                        shutil.copy2(file_path, dst_file)
-
-                    successful_ops[dst_file] = file_path
-                    success_count += 1
-                else:
-                    failed_files.append(f"无法识别: {rel_path}")
 
-            except Exception as e:
-                failed_files.append(f"{rel_path}: {str(e)}")
-
-            # 调用进度回调
-            if callback:
-                callback(i + 1, total_files, rel_path)
-
-        # 校验
-        verification_passed = None
-        if backup_and_verify and total_files > 0:
-            self._log("开始校验分类结果...")
-            errors = 0
-            for dst_file, src_file in successful_ops.items():
-                if not os.path.exists(dst_file):
-                    errors += 1
-                    self._log(f"校验失败: 目标文件不存在 {dst_file}")
-                if move_files and os.path.exists(src_file):
-                    errors += 1
-                    self._log(f"校验失败: 源文件未被移动 {src_file}")
-
-            if errors == 0:
-                verification_passed = True
-                self._log(f"校验成功: {len(successful_ops)} 个文件的操作已确认")
-            else:
-                verification_passed = False
-                self._log(f"校验失败: 发现 {errors} 个错误, 详情请查看日志")
+class RunStatsDialog(QDialog):
+    """最近一次运行的统计: 各阶段耗时、各类操作的耗时分布及其他计数"""
 
-        # 清理空文件夹
-        if move_files and self.settings_manager.get_bool('remove_empty_folders'):
-            self.remove_empty_folders(src_dir)
+    def __init__(self, report, run_stats, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("运行统计")
+        self.resize(760, 520)
+        layout = QVBoxLayout(self)
 
-        return success_count, failed_files, total_files, output_dir, backup_path, verification_passed
+        lines = format_report(report)
+        if not lines:
+            lines = ["没有耗时记录 (尚未运行, 或设置中未启用运行统计)"]
+        if run_stats:
+            lines.append('')
+            lines.extend(f"{key}: {value}" for key, value in run_stats.items())
+        text = QTextEdit()
+        text.setReadOnly(True)
+        text.setLineWrapMode(QTextEdit.NoWrap)
+        font = QFont("Consolas")
+        font.setStyleHint(QFont.Monospace)
+        text.setFont(font)
+        text.setPlainText('\n'.join(lines))
+        layout.addWidget(text)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
 
 
-class ClassificationThread(QThread):
-    """文件分类线程"""
+class PlanningThread(QThread):
+    """扫描源目录并生成分类计划的线程"""
 
-    # 当前进度, 总数, 当前文件
-    progress_updated = pyqtSignal(int, int, str)
-    # 成功数, 失败列表, 总数, 输出目录, 备份目录, 校验结果
-    classification_finished = pyqtSignal(int, list, int, str, object, object)
+    # 分类计划, 错误信息
+    planning_finished = pyqtSignal(object, str)
 
     def __init__(self, classifier, src_dir, output_dir=None, move_files=True,
-                 recursive=False, preserve_structure=None, backup_and_verify=False):
+                 recursive=False, preserve_structure=None):
         super().__init__()
         self.classifier = classifier
         self.src_dir = src_dir
@@ -1056,41 +602,130 @@ class ClassificationThread(QThread):
         self.move_files = move_files
         self.recursive = recursive
         self.preserve_structure = preserve_structure
-        self.backup_and_verify = backup_and_verify
+        # 关闭窗口时取消扫描
+        self.cancel_token = CancellationToken()
 
     def run(self):
-        """运行分类任务"""
+        """运行扫描任务"""
         try:
-            success, failed, total, out_dir, backup_dir, verified = self.classifier.classify_files(
+            plan = self.classifier.plan_classification(
                 self.src_dir,
                 output_dir=self.output_dir,
                 move_files=self.move_files,
-                callback=self.progress_callback,
                 recursive=self.recursive,
                 preserve_structure=self.preserve_structure,
-                backup_and_verify=self.backup_and_verify
+                cancel_token=self.cancel_token
             )
+            self.planning_finished.emit(plan.sort_by_directory(), "")
+        except ClassificationCancelled:
+            pass
+        except Exception as e:
+            self.planning_finished.emit(None, str(e))
+
+
+class ClassificationThread(QThread):
+    """文件分类线程"""
+
+    # 合并后的进度事件 ProgressEvent
+    progress_updated = pyqtSignal(object)
+    # 成功数, 失败列表, 总数, 输出目录, 备份目录, 校验结果
+    classification_finished = pyqtSignal(int, list, int, str, object, object)
+
+    def __init__(self, classifier, plan=None, backup_and_verify=False, updates_per_second=10, resume_dir=None,
+                 cprofile_path=None):
+        super().__init__()
+        self.classifier = classifier
+        self.plan = plan
+        self.backup_and_verify = backup_and_verify
+        # 从该输出目录的检查点恢复, 此时不需要plan
+        self.resume_dir = resume_dir
+        # 用 cProfile 剖析本次运行, 结果写入该文件
+        self.cprofile_path = cprofile_path
+        # 协作式取消, 在文件操作之间及分块复制过程中检查
+        self.cancel_token = CancellationToken()
+        # 合并进度事件, 界面开销与文件数量无关
+        self.progress_throttle = ProgressThrottle(self.progress_updated.emit,
+                                                  interval=1.0 / max(1, updates_per_second))
+
+    def run(self):
+        """运行分类任务"""
+        try:
+            with cprofile_to(self.cprofile_path) if self.cprofile_path else nullcontext():
+                if self.resume_dir:
+                    result = self.classifier.resume_classification(
+                        self.resume_dir,
+                        callback=self.progress_throttle,
+                        cancel_token=self.cancel_token
+                    )
+                else:
+                    result = self.classifier.execute_plan(
+                        self.plan,
+                        callback=self.progress_throttle,
+                        backup_and_verify=self.backup_and_verify,
+                        cancel_token=self.cancel_token
+                    )
+            success, failed, total, out_dir, backup_dir, verified = result
+            self.progress_throttle.flush()
             self.classification_finished.emit(success, failed, total, out_dir, backup_dir, verified)
         except Exception as e:
             self.classification_finished.emit(0, [f"严重错误: {str(e)}"], 0, "", None, None)
 
-    def progress_callback(self, current, total, filename):
-        """进度回调"""
-        self.progress_updated.emit(current, total, filename)
+
+class UndoThread(QThread):
+    """按操作日志撤销分类的线程"""
+
+    progress_updated = pyqtSignal(object)
+    # 成功数, 失败列表, 总数
+    undo_finished = pyqtSignal(int, list, int)
+
+    def __init__(self, classifier, journal_path, updates_per_second=10):
+        super().__init__()
+        self.classifier = classifier
+        self.journal_path = journal_path
+        self.cancel_token = CancellationToken()
+        self.progress_throttle = ProgressThrottle(self.progress_updated.emit,
+                                                  interval=1.0 / max(1, updates_per_second))
+
+    def run(self):
+        """运行撤销任务"""
+        try:
+            success, failed, total = self.classifier.undo_run(
+                self.journal_path,
+                callback=self.progress_throttle,
+                cancel_token=self.cancel_token
+            )
+            self.progress_throttle.flush()
+            self.undo_finished.emit(success, failed, total)
+        except Exception as e:
+            self.undo_finished.emit(0, [f"严重错误: {str(e)}"], 0)
 
 
 class FileClassifierGUI(QMainWindow):
     """文件分类器GUI主窗口"""
 
+    # 停止输入该时间 (毫秒) 后再执行规则搜索
+    SEARCH_DELAY_MS = 200
+    # 从日志缓冲区取出新记录显示的间隔 (毫秒)
+    LOG_REFRESH_MS = 200
+
     def __init__(self):
         super().__init__()
-        self.settings_manager = SettingsManager()
+        self.settings_manager = SettingsManager(QSettings("FileClassifier", "Settings"))
+        self.planning_thread = None
         self.classification_thread = None
         self.init_ui()
 
-        self.classifier = FileClassifier(self.settings_manager, log_callback=self.log_text.append)
-        self.update_rules_management()
-        self.update_rules_preview()
+        # 日志记录写入分类器的环形缓冲区, 由定时器分批显示, 工作线程不直接操作界面
+        self.classifier = FileClassifier(self.settings_manager)
+        self.last_failures = []
+        # 下一次分类用 cProfile 剖析, 结果写入该文件
+        self.cprofile_path = None
+        self._log_seq = 0
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(self.LOG_REFRESH_MS)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        self.init_rules_model()
 
         self.create_menu_bar()
         self.center_window()
@@ -1207,15 +842,18 @@ class FileClassifierGUI(QMainWindow):
         """初始化规则管理选项卡"""
         rules_tab = QWidget()
         rules_layout = QVBoxLayout(rules_tab)
-        splitter = QSplitter(Qt.Vertical)
-        rules_layout.addWidget(splitter)
 
         rules_manage_group = QGroupBox("分类规则管理")
         rules_manage_layout = QVBoxLayout(rules_manage_group)
         search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入扩展名或分类名称搜索...")
-        self.search_input.textChanged.connect(self.filter_rules)
+        # 输入时只重新计时, 停止输入后再搜索
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.filter_rules)
+        self.search_input.textChanged.connect(self.search_timer.start)
         clear_search_btn = QPushButton("清空")
         clear_search_btn.clicked.connect(self.search_input.clear)
         search_layout.addWidget(QLabel("搜索规则:"))
@@ -1228,6 +866,14 @@ class FileClassifierGUI(QMainWindow):
         self.add_rule_btn.clicked.connect(self.add_rule)
         self.add_rule_btn.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; }")
         rule_buttons_layout.addWidget(self.add_rule_btn)
+        self.edit_rule_btn = QPushButton("编辑")
+        self.edit_rule_btn.clicked.connect(self.edit_selected_rule)
+        self.edit_rule_btn.setStyleSheet("QPushButton { background-color: #212121; color: white; }")
+        rule_buttons_layout.addWidget(self.edit_rule_btn)
+        self.delete_rule_btn = QPushButton("删除")
+        self.delete_rule_btn.clicked.connect(self.delete_selected_rule)
+        self.delete_rule_btn.setStyleSheet("QPushButton { background-color: #f44336; color: white; }")
+        rule_buttons_layout.addWidget(self.delete_rule_btn)
         self.reset_rules_btn = QPushButton("重置为默认")
         self.reset_rules_btn.clicked.connect(self.reset_rules)
         self.reset_rules_btn.setStyleSheet("QPushButton { background-color: #f44336; color: white; }")
@@ -1239,29 +885,33 @@ class FileClassifierGUI(QMainWindow):
         rule_buttons_layout.addStretch()
         rules_manage_layout.addLayout(rule_buttons_layout)
 
-        # 规则编辑区域 (折叠面板)
-        self.rules_scroll_area = QScrollArea()
-        self.rules_widget = QWidget()
-        self.rules_layout = QVBoxLayout(self.rules_widget)
-        self.rules_scroll_area.setWidget(self.rules_widget)
-        self.rules_scroll_area.setWidgetResizable(True)
-        rules_manage_layout.addWidget(self.rules_scroll_area)
-        splitter.addWidget(rules_manage_group)
-
-        # 分类规则预览区域
-        preview_group = QGroupBox("分类规则预览")
-        preview_layout = QVBoxLayout(preview_group)
-        self.preview_scroll_area = QScrollArea()
-        self.preview_widget = QWidget()
-        self.preview_layout = QVBoxLayout(self.preview_widget)
-        self.preview_scroll_area.setWidget(self.preview_widget)
-        self.preview_scroll_area.setWidgetResizable(True)
-        preview_layout.addWidget(self.preview_scroll_area)
-        splitter.addWidget(preview_group)
-
-        splitter.setSizes([400, 250])
+        # 规则树: 第一层为分类 (勾选框启用/禁用), 展开后为分类下的规则
+        self.rules_view = QTreeView()
+        self.rules_view.setUniformRowHeights(True)
+        self.rules_view.setAlternatingRowColors(True)
+        self.rules_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.rules_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.rules_view.customContextMenuRequested.connect(self.show_rules_menu)
+        self.rules_view.doubleClicked.connect(self.edit_selected_rule)
+        rules_manage_layout.addWidget(self.rules_view)
+        rules_layout.addWidget(rules_manage_group)
+
         self.tab_widget.addTab(rules_tab, "规则管理")
 
+    def init_rules_model(self):
+        """创建规则树模型, 之后规则表的修改会自动反映到视图"""
+        self.rules_model = RulesTreeModel(self.classifier, self)
+        self.rules_model.rule_toggled.connect(self.on_rule_toggled)
+        self.rules_view.setModel(self.rules_model)
+        header = self.rules_view.header()
+        header.setSectionResizeMode(0, QHeaderView.Interactive)
+        header.resizeSection(0, 280)
+        header.setStretchLastSection(True)
+        # 规则变更后重新应用搜索过滤, 连续的变更只过滤一次
+        self.rules_model.rowsInserted.connect(self.search_timer.start)
+        self.rules_model.rowsRemoved.connect(self.search_timer.start)
+        self.rules_model.modelReset.connect(self.search_timer.start)
+
     def init_log_tab(self):
         """初始化日志选项卡"""
         log_tab = QWidget()
@@ -1277,11 +927,15 @@ class FileClassifierGUI(QMainWindow):
         # 日志操作按钮
         log_buttons_layout = QHBoxLayout()
         clear_log_btn = QPushButton("清空日志")
-        clear_log_btn.clicked.connect(self.log_text.clear)
+        clear_log_btn.clicked.connect(self.clear_log_view)
         log_buttons_layout.addWidget(clear_log_btn)
         save_log_btn = QPushButton("保存日志")
         save_log_btn.clicked.connect(self.save_log)
         log_buttons_layout.addWidget(save_log_btn)
+        self.failures_btn = QPushButton("失败详情")
+        self.failures_btn.clicked.connect(self.show_failures)
+        self.failures_btn.setEnabled(False)
+        log_buttons_layout.addWidget(self.failures_btn)
         log_buttons_layout.addStretch()
         log_group_layout.addLayout(log_buttons_layout)
 
@@ -1299,6 +953,7 @@ class FileClassifierGUI(QMainWindow):
         font.setPointSize(self.settings_manager.get_int('font_size'))
         self.setFont(font)
         self.log_text.document().setMaximumBlockCount(self.settings_manager.get_int('max_log_lines'))
+        self.classifier.configure_logging()
 
     def save_settings(self):
         """保存UI设置"""
@@ -1309,6 +964,45 @@ class FileClassifierGUI(QMainWindow):
         self.settings_manager.set('backup_and_verify_source', self.backup_and_verify_cb.isChecked())
         self.settings_manager.settings.sync()
 
+    def append_log(self, *lines, level=INFO):
+        """界面产生的日志同样写入日志缓冲区, 并立即显示"""
+        for line in lines:
+            self.classifier.logger.log(level, line)
+        self.flush_log()
+
+    def flush_log(self):
+        """把缓冲区中的新记录一次性追加到日志区域"""
+        records, dropped = self.classifier.logger.since(self._log_seq)
+        if not records:
+            return
+        self._log_seq = records[-1].seq
+        # 超出日志区域行数上限的部分不再追加
+        max_lines = self.settings_manager.get_int('max_log_lines')
+        if len(records) > max_lines:
+            dropped += len(records) - max_lines
+            records = records[-max_lines:]
+        lines = [record.message for record in records]
+        if dropped:
+            lines.insert(0, f"... 省略 {dropped} 条日志")
+        self.log_text.append('\n'.join(lines))
+
+    def clear_log_view(self):
+        """清空日志区域, 之前的记录仍保留在缓冲区中"""
+        self.log_text.clear()
+        self._log_seq = self.classifier.logger.last_seq
+
+    def show_failure_summary(self, failed_files):
+        """按原因汇总失败的文件, 完整列表在 失败详情 中查看"""
+        self.last_failures = failed_files
+        self.failures_btn.setEnabled(bool(failed_files))
+        if failed_files:
+            self.append_log("失败汇总 (完整列表见 失败详情):", *failure_summary_lines(failed_files), level=WARNING)
+
+    def show_failures(self):
+        """显示最近一次运行的失败详情"""
+        if self.last_failures:
+            FailureDialog(self.last_failures, self).exec_()
+
     def save_log(self):
         """保存日志到文件"""
         file_path, _ = QFileDialog.getSaveFileName(self, "保存日志",
@@ -1317,7 +1011,8 @@ class FileClassifierGUI(QMainWindow):
         if file_path:
             try:
                 with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(self.log_text.toPlainText())
+                    # 保存缓冲区中的全部记录, 包括带时间和级别的完整信息
+                    f.writelines(format_record(record) + '\n' for record in self.classifier.logger.records())
                 QMessageBox.information(self, "保存成功", "日志已成功保存")
             except Exception as e:
                 QMessageBox.warning(self, "保存失败", f"保存日志失败: {str(e)}")
@@ -1359,6 +1054,23 @@ class FileClassifierGUI(QMainWindow):
         stats_action = QAction('统计信息', self)
         stats_action.triggered.connect(self.show_stats)
         tools_menu.addAction(stats_action)
+        run_stats_action = QAction('运行统计', self)
+        run_stats_action.triggered.connect(self.show_run_stats)
+        tools_menu.addAction(run_stats_action)
+        self.cprofile_action = QAction('剖析下一次分类 (cProfile)...', self)
+        self.cprofile_action.setCheckable(True)
+        self.cprofile_action.toggled.connect(self.toggle_cprofile)
+        tools_menu.addAction(self.cprofile_action)
+        tools_menu.addSeparator()
+        resume_action = QAction('恢复中断的分类...', self)
+        resume_action.triggered.connect(self.resume_classification)
+        tools_menu.addAction(resume_action)
+        undo_action = QAction('撤销分类...', self)
+        undo_action.triggered.connect(self.undo_classification)
+        tools_menu.addAction(undo_action)
+        compact_cache_action = QAction('压缩分类缓存', self)
+        compact_cache_action.triggered.connect(self.compact_cache)
+        tools_menu.addAction(compact_cache_action)
 
         # 帮助菜单
         help_menu = menubar.addMenu('说明(&H)')
@@ -1403,6 +1115,29 @@ class FileClassifierGUI(QMainWindow):
 
         QMessageBox.information(self, "统计信息", stats_text.strip())
 
+    def show_run_stats(self):
+        """显示最近一次运行各阶段及各类操作的耗时"""
+        RunStatsDialog(self.classifier.profiler.report(), self.classifier.run_stats, self).exec_()
+
+    def toggle_cprofile(self, checked):
+        """选择下一次分类的 cProfile 结果文件"""
+        if not checked:
+            self.cprofile_path = None
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "保存 cProfile 结果",
+                                                   f"classify_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof",
+                                                   "cProfile (*.prof)")
+        if not file_path:
+            self.cprofile_action.setChecked(False)
+            return
+        self.cprofile_path = file_path
+
+    def take_cprofile_path(self):
+        """取出下一次分类的 cProfile 结果文件, 只剖析一次"""
+        path, self.cprofile_path = self.cprofile_path, None
+        self.cprofile_action.setChecked(False)
+        return path
+
     def import_rules(self):
         """导入规则"""
         # file_path, _ = QFileDialog.getOpenFileName(self, "导入规则", "", "JSON files (*.json)")
@@ -1411,12 +1146,10 @@ class FileClassifierGUI(QMainWindow):
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     # imported_rules = json.load(f)
-                    data = yaml.safe_load(f)
+                    data = yaml.load(f, Loader=SafeLoader)
                     imported_rules = data.get('categories', {})
                 self.classifier.categories.update(imported_rules)
                 if self.settings_manager.get_bool('auto_save_rules'): self.classifier.save_rules()
-                self.update_rules_management()
-                self.update_rules_preview()
                 QMessageBox.information(self, "导入成功", f"成功导入 {len(imported_rules)} 条规则")
             except Exception as e:
                 QMessageBox.warning(self, "导入失败", f"导入规则失败: {str(e)}")
@@ -1427,7 +1160,7 @@ class FileClassifierGUI(QMainWindow):
         file_path, _ = QFileDialog.getSaveFileName(self, "导出规则", "rules.yaml", "YAML files (*.yaml *.yml)")
         if file_path:
             try:
-                data_to_export = {'categories': self.classifier.categories}
+                data_to_export = {'categories': dict(self.classifier.categories)}
                 with open(file_path, 'w', encoding='utf-8') as f:
                     # json.dump(self.classifier.categories, f, ensure_ascii=False, indent=2)
                     yaml.dump(data_to_export, f, indent=2, allow_unicode=True)
@@ -1436,50 +1169,24 @@ class FileClassifierGUI(QMainWindow):
                 QMessageBox.warning(self, "导出失败", f"导出规则失败: {str(e)}")
 
     def filter_rules(self):
-        """过滤规则显示"""
-        search_text = self.search_input.text().lower().strip()
-
-        # 遍历所有规则组
-        for i in range(self.rules_layout.count()):
-            item = self.rules_layout.itemAt(i)
-            if item and item.widget():
-                widget = item.widget()
-
-                # 检查是否为QCollapsibleGroupBox类型的widget
-                if isinstance(widget, QCollapsibleGroupBox):
-                    # 获取组标题(去除括号中的数量信息)
-                    title = widget.title()
-                    category_name = title.split('(')[0].strip().lower()
-                    # 检查分类名称是否匹配
-                    category_match = search_text in category_name
-                    # extensions = [k for k, v in self.classifier.categories.items() if v.lower() == title]
-                    # extension_match = any(search_text in ext.lower() for ext in extensions)
-                    # widget.setVisible(not search_text or category_match or extension_match)
-                    # 检查扩展名是否匹配
-                    extension_match = False
-                    # 从分类器中获取该分类下的所有扩展名
-                    for ext, cat in self.classifier.categories.items():
-                        if cat.lower() == category_name:
-                            if search_text in ext.lower():
-                                extension_match = True
-                                break
-                    # 显示或隐藏规则组
-                    is_visible = not search_text or category_match or extension_match
-                    widget.setVisible(is_visible)
-                    # 如果有搜索文本且匹配, 展开该组
-                    if search_text and is_visible:
-                        widget.setChecked(True)
+        """过滤规则显示: 通过搜索索引找出分类名或规则匹配的分类, 隐藏其余分类"""
+        search_text = self.search_input.text().strip()
+        rule_index = self.rules_model.rule_index
+        root = QModelIndex()
+        if not search_text:
+            for row in range(len(rule_index)):
+                self.rules_view.setRowHidden(row, root, False)
+            return
+        category_matches, rule_matches = rule_index.search(search_text)
+        for row, category in enumerate(rule_index.names):
+            self.rules_view.setRowHidden(row, root, category not in category_matches and category not in rule_matches)
+            # 只有规则匹配时展开该分类
+            if category in rule_matches and category not in category_matches:
+                self.rules_view.expand(self.rules_model.index(row, 0))
 
     def clear_search(self):
         """清空搜索框并显示所有规则"""
         self.search_input.clear()
-        # 显示所有规则组
-        for i in range(self.rules_layout.count()):
-            item = self.rules_layout.itemAt(i)
-            if item and item.widget():
-                widget = item.widget()
-                if isinstance(widget, QCollapsibleGroupBox):
-                    widget.setVisible(True)
 
     def clear_all_rules(self):
         """清空所有规则"""
@@ -1491,8 +1198,6 @@ class FileClassifierGUI(QMainWindow):
         if reply == QMessageBox.Yes:
             self.classifier.categories.clear()
             if self.settings_manager.get_bool('auto_save_rules'): self.classifier.save_rules()
-            self.update_rules_management()
-            self.update_rules_preview()
             QMessageBox.information(self, "清空完成", "所有规则已清空")
 
     def add_rule(self):
@@ -1504,8 +1209,6 @@ class FileClassifierGUI(QMainWindow):
                 ext_list = [ext.strip() for ext in extensions.split(',') if ext.strip()]
                 for ext in ext_list:
                     self.classifier.add_category_rule(ext, category)
-                self.update_rules_management()
-                self.update_rules_preview()
                 QMessageBox.information(self, "添加成功", f"已添加 {len(ext_list)} 条规则到分类 '{category}'")
 
     def reset_rules(self):
@@ -1518,50 +1221,33 @@ class FileClassifierGUI(QMainWindow):
         if reply == QMessageBox.Yes:
             self.classifier.categories = self.classifier.default_categories.copy()
             if self.settings_manager.get_bool('auto_save_rules'): self.classifier.save_rules()
-            self.update_rules_management()
-            self.update_rules_preview()
             QMessageBox.information(self, "重置完成", "规则已重置为默认设置")
 
-    def update_rules_management(self):
-        """更新规则管理区域"""
-        # 清除现有控件
-        # while self.rules_layout.count(): self.rules_layout.takeAt(0).widget().deleteLater()
-        for i in reversed(range(self.rules_layout.count())):
-            child = self.rules_layout.itemAt(i).widget()
-            if child:
-                child.setParent(None)
-
-        # 按分类组织规则
-        categories_dict = {}
-        for ext, category in self.classifier.categories.items():
-            # categories_dict.setdefault(category, []).append(ext)
-            if category not in categories_dict:
-                categories_dict[category] = []
-            categories_dict[category].append(ext)
-
-        # 为每个分类创建折叠面板
-        for category, extensions in sorted(categories_dict.items()):
-            group = QCollapsibleGroupBox(f"{category} ({len(extensions)}条规则)", category_name=category)
-            group.rule_toggled.connect(self.on_rule_toggled)
-            group_layout = QVBoxLayout(group)
-            # 扩展名显示
-            ext_text = ', '.join(sorted(extensions))
-            ext_label = QLabel(f"扩展名: {ext_text}")
-            ext_label.setWordWrap(True)
-            group_layout.addWidget(ext_label)
-            # 操作按钮
-            button_layout = QHBoxLayout()
-            edit_btn = QPushButton("编辑")
-            edit_btn.clicked.connect(lambda checked, c=category, e=ext_text: self.edit_rule(c, e))
-            edit_btn.setStyleSheet("QPushButton { background-color: #212121; color: white; }")
-            button_layout.addWidget(edit_btn)
-            delete_btn = QPushButton("删除")
-            delete_btn.clicked.connect(lambda checked, c=category: self.delete_category(c))
-            delete_btn.setStyleSheet("QPushButton { background-color: #f44336; color: white; }")
-            button_layout.addWidget(delete_btn)
-            button_layout.addStretch()
-            group_layout.addLayout(button_layout)
-            self.rules_layout.addWidget(group)
+    def selected_category(self):
+        """规则树中选中的分类, 选中规则时为其所属分类"""
+        category, _ = self.rules_model.item_at(self.rules_view.currentIndex())
+        return category
+
+    def show_rules_menu(self, pos):
+        """规则树的右键菜单"""
+        if self.selected_category() is None:
+            return
+        menu = QMenu(self)
+        menu.addAction("编辑", self.edit_selected_rule)
+        menu.addAction("删除", self.delete_selected_rule)
+        menu.exec_(self.rules_view.viewport().mapToGlobal(pos))
+
+    def edit_selected_rule(self):
+        """编辑选中的分类"""
+        category = self.selected_category()
+        if category is not None:
+            self.edit_rule(category, ', '.join(self.rules_model.rule_index.rules(category)))
+
+    def delete_selected_rule(self):
+        """删除选中的分类"""
+        category = self.selected_category()
+        if category is not None:
+            self.delete_category(category)
 
     def edit_rule(self, category, extensions):
         """编辑规则"""
@@ -1577,31 +1263,12 @@ class FileClassifierGUI(QMainWindow):
                 new_ext_list = [ext.strip() for ext in new_extensions.split(',') if ext.strip()]
                 for ext in new_ext_list:
                     self.classifier.add_category_rule(ext, new_category)
-                self.update_rules_management()
-                self.update_rules_preview()
                 QMessageBox.information(self, "编辑成功", "规则已更新")
 
     def on_rule_toggled(self, category_name, enabled):
         """处理规则组的启用/禁用"""
-        if enabled:
-            # 重新启用该分类的规则
-            # 从默认规则中恢复该分类的规则
-            for ext, cat in self.classifier.default_categories.items():
-                if cat == category_name:
-                    self.classifier.categories[ext] = cat
-
-            self.log_text.append(f"已启用分类规则: {category_name}")
-        else:
-            # 禁用该分类的规则(临时移除)
-            extensions_to_remove = [ext for ext, cat in self.classifier.categories.items() if cat == category_name]
-            for ext in extensions_to_remove:
-                del self.classifier.categories[ext]
-
-            self.log_text.append(f"已禁用分类规则: {category_name}")
-
-        # 保存规则并更新预览
-        self.classifier.save_rules()
-        self.update_rules_preview()
+        self.classifier.toggle_category(category_name, enabled)
+        self.append_log(f"已{'启用' if enabled else '禁用'}分类规则: {category_name}")
 
     def delete_category(self, category):
         """删除整个分类"""
@@ -1613,38 +1280,12 @@ class FileClassifierGUI(QMainWindow):
 
         if reply == QMessageBox.Yes:
             # 找到所有属于该分类的扩展名并删除
-            extensions_to_remove = [ext for ext, cat in self.classifier.categories.items() if cat == category]
+            extensions_to_remove = list(self.rules_model.rule_index.rules(category))
             for ext in extensions_to_remove:
                 self.classifier.remove_category_rule(ext)
 
-            self.update_rules_management()
-            self.update_rules_preview()
             QMessageBox.information(self, "删除成功", f"已删除分类 '{category}' 的 {len(extensions_to_remove)} 条规则")
 
-    def update_rules_preview(self):
-        """更新分类规则预览"""
-        # 清除现有控件
-        # while self.preview_layout.count(): self.preview_layout.takeAt(0).widget().deleteLater()
-        for i in reversed(range(self.preview_layout.count())):
-            child = self.preview_layout.itemAt(i).widget()
-            if child:
-                child.setParent(None)
-
-        # 按分类组织显示规则
-        categories_dict = {}
-        for ext, category in self.classifier.categories.items():
-            # categories_dict.setdefault(category, []).append(ext)
-            if category not in categories_dict:
-                categories_dict[category] = []
-            categories_dict[category].append(ext)
-
-        for category, extensions in sorted(categories_dict.items()):
-            rule_text = f"📁 {category}: {', '.join(sorted(extensions))}"
-            rule_label = QLabel(rule_text)
-            rule_label.setWordWrap(True)
-            rule_label.setStyleSheet("padding: 5px; border: 1px solid #ddd; border-radius: 4px; margin: 2px;")
-            self.preview_layout.addWidget(rule_label)
-
     def browse_source_directory(self):
         """选择要分类的源目录"""
         directory = QFileDialog.getExistingDirectory(self, "选择要分类的源目录")
@@ -1657,42 +1298,15 @@ class FileClassifierGUI(QMainWindow):
         if directory:
             self.output_dir_input.setText(directory)
 
-    def _get_files_to_classify(self, src_dir, recursive):
-        """获取分类的文件列表"""
-        files_to_check = []
-        if self.settings_manager.get_bool('exclude_output_dirs'):
-            # 启用排除选项
-            if recursive:
-                for root, dirs, files in os.walk(src_dir):
-                    if self.classifier.is_output_directory(root):
-                        dirs[:] = []
-                        continue
-                    for file in files:
-                        files_to_check.append(os.path.join(root, file))
-            else:
-                # 只遍历当前目录
-                for f_name in os.listdir(src_dir):
-                    file_path = os.path.join(src_dir, f_name)
-                    if self.classifier.is_output_directory(file_path):
-                        continue
-                    if os.path.isfile(file_path):
-                        files_to_check.append(file_path)
-        else:
-            # 未启用排除选项
-            if recursive:
-                for root, _, files in os.walk(src_dir):
-                    for file in files:
-                        files_to_check.append(os.path.join(root, file))
-            else:
-                for f_name in os.listdir(src_dir):
-                    file_path = os.path.join(src_dir, f_name)
-                    if os.path.isfile(file_path):
-                        files_to_check.append(file_path)
-
-        return files_to_check
+    def is_busy(self):
+        """是否有扫描、分类或撤销正在进行"""
+        return any(thread and thread.isRunning() for thread in (self.planning_thread, self.classification_thread))
 
     def start_classification(self):
         """开始文件分类"""
+        if self.is_busy():
+            QMessageBox.warning(self, "警告", "扫描或分类正在进行中")
+            return
         src_dir = self.dir_input.text().strip()
         output_dir = self.output_dir_input.text().strip() or None
 
@@ -1704,53 +1318,53 @@ class FileClassifierGUI(QMainWindow):
             return
 
         # 获取选项
-        # recursive = self.recursive_cb.isChecked()
-        # preserve_structure = self.preserve_structure_cb.isChecked()
-        # backup_and_verify = self.backup_and_verify_cb.isChecked()
         recursive = self.settings_manager.get_bool('recursive')
         preserve_structure = self.settings_manager.get_bool('preserve_structure')
-        backup_and_verify = self.settings_manager.get_bool('backup_and_verify_source')
+        move_files = self.settings_manager.get_bool('move_files')
 
-        # 检查目录中是否有文件
-        # if recursive:
-        #     # 递归检查所有子目录
-        #     files = []
-        #     for root, dirs, file_list in os.walk(src_dir):
-        #         files.extend([os.path.join(root, f) for f in file_list])
-        # else:
-        #     # 只检查当前目录
-        #     files = [f for f in os.listdir(src_dir)
-        #              if os.path.isfile(os.path.join(src_dir, f))]
-        files = self._get_files_to_classify(src_dir, recursive)
-        if not files:
+        # 在后台线程中扫描源目录并生成分类计划, 扫描结果直接用于分类
+        self.classify_btn.setEnabled(False)
+        self.status_label.setText("正在扫描源目录...")
+        self.planning_thread = PlanningThread(
+            self.classifier, src_dir, output_dir, move_files, recursive, preserve_structure
+        )
+        self.planning_thread.planning_finished.connect(self.planning_complete)
+        self.planning_thread.start()
+
+    def planning_complete(self, plan, error):
+        """扫描完成, 确认后开始分类"""
+        self.classify_btn.setEnabled(True)
+        self.status_label.setText("就绪")
+        if plan is None:
+            QMessageBox.warning(self, "警告", f"扫描源目录失败: {error}")
+            return
+        if not len(plan):
             QMessageBox.information(self, "信息", "选择的目录中没有文件需要分类")
             return
 
-        # 确认操作
-        # move_files = self.move_files_cb.isChecked()
-        move_files = self.settings_manager.get_bool('move_files')
-        action = "移动" if move_files else "复制"
-        recursive_text = "(包含子文件夹)" if recursive else ""
+        backup_and_verify = self.settings_manager.get_bool('backup_and_verify_source')
+        action = "移动" if plan.move_files else "复制"
+        recursive_text = "(包含子文件夹)" if plan.recursive else ""
 
         # 检查设置中是否需要确认
         if self.settings_manager.get_bool('confirm_action'):
             reply = QMessageBox.question(
                 self,
                 "确认操作",
-                f"确定要{action}目录中的 {len(files)} 个文件吗？{recursive_text}",
+                f"确定要{action}目录中的 {len(plan)} 个文件吗？{recursive_text}",
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply != QMessageBox.Yes:
                 return
 
         # 开始分类
-        self.log_text.clear()
-        self.log_text.append(f"开始{action}文件...")
-        self.log_text.append(f"源目录: {src_dir}")
-        self.log_text.append(f"输出目录: {'自动创建' if not output_dir else output_dir}")
-        self.log_text.append(f"递归处理: {'是' if recursive else '否'}")
-        self.log_text.append(f"文件数量: {len(files)}")
-        self.log_text.append("-" * 50)
+        self.clear_log_view()
+        self.append_log(f"开始{action}文件...")
+        self.append_log(f"源目录: {plan.src_dir}")
+        self.append_log(f"输出目录: {plan.output_dir}")
+        self.append_log(f"递归处理: {'是' if plan.recursive else '否'}")
+        self.append_log(f"文件数量: {len(plan)}")
+        self.append_log("-" * 50)
 
         # 设置UI状态
         self.classify_btn.setEnabled(False)
@@ -1761,58 +1375,156 @@ class FileClassifierGUI(QMainWindow):
 
         # 创建并启动分类线程
         self.classification_thread = ClassificationThread(
-            self.classifier, src_dir, output_dir, move_files, recursive, preserve_structure, backup_and_verify
+            self.classifier, plan, backup_and_verify, self.settings_manager.get_int('progress_updates_per_second'),
+            cprofile_path=self.take_cprofile_path()
         )
         self.classification_thread.progress_updated.connect(self.update_progress)
         self.classification_thread.classification_finished.connect(self.classification_complete)
         self.classification_thread.start()
 
     def stop_classification(self):
-        """停止文件分类"""
+        """停止文件分类, 等待正在进行的文件操作安全结束"""
         if self.classification_thread and self.classification_thread.isRunning():
-            self.classification_thread.terminate()
-            self.classification_thread.wait()
-            self.reset_ui_state()
-            self.log_text.append("\n分类已被用户取消")
-            self.status_label.setText("已取消")
-
-    def update_progress(self, current, total, filename):
-        """更新进度"""
-        if total > 0:
-            progress = int((current / total) * 100)
+            self.classification_thread.cancel_token.cancel()
+            self.stop_btn.setEnabled(False)
+            self.append_log("正在取消, 等待当前文件操作结束...", level=WARNING)
+            self.status_label.setText("正在取消...")
+
+    def resume_classification(self):
+        """从检查点恢复被中断的分类"""
+        if self.is_busy():
+            QMessageBox.warning(self, "警告", "扫描或分类正在进行中")
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "选择被中断分类的输出目录")
+        if not output_dir:
+            return
+        if not Checkpoint.exists(output_dir):
+            QMessageBox.information(self, "信息", "该目录中没有可恢复的分类检查点")
+            return
+
+        self.clear_log_view()
+        self.append_log(f"恢复分类: {output_dir}")
+        self.append_log("-" * 50)
+        self.classify_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.status_label.setText("正在恢复分类...")
+
+        self.classification_thread = ClassificationThread(
+            self.classifier, updates_per_second=self.settings_manager.get_int('progress_updates_per_second'),
+            resume_dir=output_dir, cprofile_path=self.take_cprofile_path()
+        )
+        self.classification_thread.progress_updated.connect(self.update_progress)
+        self.classification_thread.classification_finished.connect(self.classification_complete)
+        self.classification_thread.start()
+
+    def compact_cache(self):
+        """删除分类缓存中失效的条目并压缩"""
+        try:
+            with self.classifier.open_cache() as cache:
+                removed = cache.compact()
+                remaining = cache.count()
+            self.append_log(f"分类缓存已压缩: 删除 {removed} 条, 剩余 {remaining} 条")
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"压缩分类缓存失败: {str(e)}")
+
+    def undo_classification(self):
+        """按操作日志撤销一次分类"""
+        if self.is_busy():
+            QMessageBox.warning(self, "警告", "扫描或分类正在进行中")
+            return
+        journal_path, _ = QFileDialog.getOpenFileName(
+            self, "选择分类操作日志 (输出目录下的 _journal 文件夹)", "", "操作日志 (*.jsonl)")
+        if not journal_path:
+            return
+        if self.settings_manager.get_bool('confirm_action'):
+            reply = QMessageBox.question(
+                self, "确认撤销",
+                f"确定要撤销该次分类吗？\n移动的文件将移回原位置, 复制的文件将被删除\n\n{journal_path}",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+
+        self.clear_log_view()
+        self.append_log(f"撤销分类: {journal_path}")
+        self.append_log("-" * 50)
+        self.reset_ui_state(classifying=True)
+        self.status_label.setText("正在撤销分类...")
+
+        # 与分类共用停止按钮和退出时的等待逻辑
+        self.classification_thread = UndoThread(
+            self.classifier, journal_path,
+            updates_per_second=self.settings_manager.get_int('progress_updates_per_second')
+        )
+        self.classification_thread.progress_updated.connect(self.update_progress)
+        self.classification_thread.undo_finished.connect(self.undo_complete)
+        self.classification_thread.start()
+
+    def undo_complete(self, success_count, failed_files, total_files):
+        """撤销完成"""
+        self.reset_ui_state()
+        cancelled = self.classifier.run_stats.get('cancelled', False)
+        self.append_log("-" * 50)
+        self.append_log("撤销已被用户取消, 可再次撤销剩余的操作" if cancelled else "撤销完成")
+        self.append_log(f"总操作数: {total_files}")
+        self.append_log(f"成功撤销: {success_count}")
+        self.append_log(f"失败数量: {len(failed_files)}")
+        self.show_failure_summary(failed_files)
+        self.status_label.setText(
+            f"{'已取消' if cancelled else '撤销完成'} - 成功: {success_count}, 失败: {len(failed_files)}")
+        if failed_files:
+            QMessageBox.warning(self, "撤销部分完成", f"成功: {success_count}\n失败: {len(failed_files)}\n\n详情请查看日志")
+
+    def update_progress(self, event):
+        """更新进度 (已按时间间隔合并)"""
+        if event.total > 0:
+            progress = int((event.current / event.total) * 100)
             self.progress_bar.setValue(progress)
-            self.status_label.setText(f"正在处理: {filename} ({current}/{total})")
-            # 根据日志级别显示详细信息
-            if self.settings_manager.get('log_level') in ["详细", "调试"]:
-                self.log_text.append(f"处理文件: {filename}")
+            self.status_label.setText(
+                f"正在处理: {event.filename} ({event.current}/{event.total}, "
+                f"{event.rate:.0f} 个/秒, 剩余 {format_eta(event.eta)})")
+            # 低于日志级别时不生成逐个文件的信息
+            if self.classifier.logger.enabled(DETAIL):
+                if event.dropped:
+                    self.classifier.logger.detail("... 另有 %d 个文件", event.dropped)
+                for name in event.recent:
+                    self.classifier.logger.detail("处理文件: %s", name)
 
     def classification_complete(self, success_count, failed_files, total_files, output_dir, backup_dir, verified):
         """分类完成"""
         self.reset_ui_state()
+        cancelled = self.classifier.run_stats.get('cancelled', False)
 
         # 显示结果
-        self.log_text.append("-" * 50)
-        self.log_text.append(f"分类完成")
-        self.log_text.append(f"文件已分类至: {output_dir}")
+        self.append_log("-" * 50)
+        self.append_log("分类已被用户取消" if cancelled else "分类完成")
+        self.append_log(f"文件已分类至: {output_dir}")
         if backup_dir:
-            self.log_text.append(f"文件已备份至: {backup_dir}")
+            self.append_log(f"文件已备份至: {backup_dir}")
         if verified is not None:
-            self.log_text.append(f"校验结果: {'成功' if verified else '失败'}")
-        self.log_text.append(f"总文件数: {total_files}")
-        self.log_text.append(f"成功分类: {success_count}")
-        self.log_text.append(f"失败数量: {len(failed_files)}")
+            self.append_log(f"校验结果: {'成功' if verified else '失败'}")
+        self.append_log(f"总文件数: {total_files}")
+        self.append_log(f"成功分类: {success_count}")
+        self.append_log(f"失败数量: {len(failed_files)}")
+        if self.classification_thread.cprofile_path:
+            self.append_log(f"cProfile 结果已保存到: {self.classification_thread.cprofile_path}")
 
-        if failed_files:
-            self.log_text.append("\n失败详情:")
-            for failed in failed_files:
-                self.log_text.append(f"  - {failed}")
+        self.show_failure_summary(failed_files)
 
-        self.status_label.setText(f"完成 - 成功: {success_count}, 失败: {len(failed_files)}")
+        self.status_label.setText(
+            f"{'已取消' if cancelled else '完成'} - 成功: {success_count}, 失败: {len(failed_files)}")
 
         # 保存规则
         if self.settings_manager.get_bool('auto_save_rules'):
             self.classifier.save_rules()
 
+        if cancelled:
+            if Checkpoint.exists(output_dir):
+                self.append_log("已完成的操作已记录, 可通过 工具 -> 恢复中断的分类 继续")
+            return
+
         # 显示完成对话框
         msg_title = "分类部分完成" if failed_files else "分类成功"
         msg_text = f"分类完成\n成功: {success_count}\n失败: {len(failed_files)}\n输出目录:\n{output_dir}\n\n详情请查看日志" if failed_files else f"所有文件分类成功\n共处理 {success_count} 个文件"
@@ -1831,15 +1543,22 @@ class FileClassifierGUI(QMainWindow):
         # self.status_label.setText("就绪")
 
     def closeEvent(self, event):
-        """关闭事件处理"""
-        if self.classification_thread and self.classification_thread.isRunning():
+        """关闭事件处理, 取消并等待扫描、分类和撤销线程结束"""
+        running = [thread for thread in (self.planning_thread, self.classification_thread)
+                   if thread and thread.isRunning()]
+        if running:
             reply = QMessageBox.question(
                 self, "确认退出",
-                "分类正在进行中, 确定要退出吗？",
+                "扫描或分类正在进行中, 确定要退出吗？",
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
-                self.stop_classification()
+                for thread in running:
+                    thread.cancel_token.cancel()
+                for thread in running:
+                    thread.wait()
+                self.classifier.flush_rules()
+                self.classifier.close_logging()
                 event.accept()
             else:
                 event.ignore()
@@ -1849,6 +1568,9 @@ class FileClassifierGUI(QMainWindow):
 
             if self.settings_manager.get_bool('auto_save_rules'):
                 self.classifier.save_rules()
+            # 写入尚未落盘的规则变更
+            self.classifier.flush_rules()
+            self.classifier.close_logging()
 
             event.accept()
 
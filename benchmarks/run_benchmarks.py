@@ -0,0 +1,422 @@
+"""
+性能基准
+
+在本地磁盘或 tmpfs 上生成合成目录树, 以无界面方式运行分类 (移动/复制),
+并对规则匹配 (get_file_category) 和输出目录判断 (is_output_directory) 做微基准。
+每次运行在独立的子进程中进行, 峰值内存互不影响; 结果以 JSON 输出, 可与其他版本的结果比较。
+
+用法:
+    python benchmarks/run_benchmarks.py --files 20000 --depth 3 --output results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --output results.json
+
+主要指标:
+    files_per_sec           每秒处理的文件数 (计划 + 执行)
+    rw_syscalls_per_file    每个文件的读写类系统调用数 (Linux /proc/self/io 中的 syscr + syscw)
+    fs_ops_per_file         每个文件的文件系统操作数 (open、rename、mkdir 等审计事件, 需 --trace-ops)
+    peak_rss_kb             子进程的峰值内存
+    phases                  各阶段耗时 (秒), 微基准为每次调用的纳秒数;
+                            --profile 时加入运行剖析记录的细分阶段, 并在 profile 中给出各类操作的 p50/p99
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_EXTENSIONS = 'jpg:25,png:10,txt:15,pdf:10,docx:8,mp4:5,py:5,tar.gz:4,zip:4,x0:4,zzz:5,:5'
+
+
+def parse_extensions(spec):
+    """解析扩展名分布, 如 ``jpg:30,txt:20,:5`` (空扩展名表示没有扩展名的文件)"""
+    extensions, weights = [], []
+    for item in spec.split(','):
+        ext, _, weight = item.rpartition(':')
+        extensions.append(ext.strip().lstrip('.'))
+        weights.append(float(weight))
+    return extensions, weights
+
+
+def default_root():
+    """优先使用 tmpfs, 排除磁盘的影响"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def generate_tree(src_dir, files, depth, fanout, collision_ratio, extensions, file_size, seed):
+    """
+    生成合成目录树
+
+    文件均匀分布在深度为 depth、每层 fanout 个子目录的树中。collision_ratio 比例的文件复用
+    其他目录中已有的文件名, 分类到同一目录时产生文件名冲突。
+
+    Returns:
+        dict: 目录树信息
+    """
+    rng = random.Random(seed)
+    dirs = ['']
+    level = ['']
+    for d in range(depth):
+        level = [os.path.join(parent, f"d{d}_{i}") for parent in level for i in range(fanout)]
+        dirs.extend(level)
+    for rel_dir in dirs:
+        os.makedirs(os.path.join(src_dir, rel_dir), exist_ok=True)
+
+    names_in_dir = {}
+    used = []
+    ext_names, ext_weights = extensions
+    payload = b'\0' * file_size
+    collisions = 0
+    for i in range(files):
+        rel_dir = dirs[i % len(dirs)]
+        taken = names_in_dir.setdefault(rel_dir, set())
+        name = None
+        if used and rng.random() < collision_ratio:
+            candidate = used[rng.randrange(len(used))]
+            if candidate not in taken:
+                name = candidate
+                collisions += 1
+        if name is None:
+            ext = rng.choices(ext_names, ext_weights)[0]
+            name = f"file_{i}.{ext}" if ext else f"file_{i}"
+            used.append(name)
+        taken.add(name)
+        with open(os.path.join(src_dir, rel_dir, name), 'wb') as f:
+            f.write(payload)
+    return {'files': files, 'dirs': len(dirs), 'collisions': collisions, 'bytes': files * file_size}
+
+
+def synthetic_rules(count, glob_count):
+    """合成规则: count 条扩展名规则 (x0, x1, ...) 和 glob_count 条通配符规则"""
+    rules = {f"x{i}": f"Bench{i % 50}" for i in range(count)}
+    rules.update({f"IMG_{i}_*": f"Glob{i % 10}" for i in range(glob_count)})
+    return rules
+
+
+def read_proc_io():
+    """读写类系统调用计数, 非 Linux 时为None"""
+    try:
+        with open('/proc/self/io') as f:
+            values = dict(line.split(': ') for line in f.read().splitlines())
+        return int(values['syscr']) + int(values['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位为字节
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+class OperationCounter:
+    """按审计事件统计文件系统操作 (open、rename、mkdir、scandir 等)"""
+
+    EVENTS = ('open', 'os.rename', 'os.mkdir', 'os.remove', 'os.rmdir', 'os.scandir', 'os.listdir',
+              'os.link', 'os.symlink', 'os.utime', 'os.chmod', 'shutil.copyfile', 'shutil.copymode',
+              'shutil.copystat', 'shutil.move', 'os.truncate')
+
+    def __init__(self):
+        self.counts = Counter()
+        self.enabled = False
+        events = frozenset(self.EVENTS)
+
+        def hook(event, args):
+            if self.enabled and event in events:
+                self.counts[event] += 1
+        sys.addaudithook(hook)
+
+
+def make_classifier(work_dir, config):
+    from file_classifier import FileClassifier, SettingsManager
+
+    settings = SettingsManager()
+    settings.set('enable_journal', config['journal'])
+    settings.set('enable_checkpoint', config['checkpoint'])
+    settings.set('io_workers', config['workers'])
+    settings.set('log_level', '简洁')
+    # 默认测量不带剖析的代码路径
+    settings.set('enable_profiling', config.get('profile', False))
+    classifier = FileClassifier(settings, config_file=os.path.join(work_dir, 'rules.yaml'),
+                                backup_dir=os.path.join(work_dir, 'rule_backups'))
+    classifier.categories.update(synthetic_rules(config['rules'], config['glob_rules']))
+    return classifier
+
+
+def run_classification(config):
+    """子进程: 对已生成的目录树运行一次分类"""
+    work_dir = config['work_dir']
+    src_dir = os.path.join(work_dir, 'src')
+    output_dir = os.path.join(work_dir, 'out')
+    counter = OperationCounter() if config['trace_ops'] else None
+
+    classifier = make_classifier(work_dir, config)
+    syscalls_before = read_proc_io()
+    if counter:
+        counter.enabled = True
+    start = time.perf_counter()
+    plan = classifier.plan_classification(src_dir, output_dir, move_files=config['mode'] == 'move',
+                                          recursive=True, preserve_structure=False)
+    plan.sort_by_directory()
+    planned = time.perf_counter()
+    success, failed, total, _, _, _ = classifier.execute_plan(plan, max_workers=config['workers'])
+    finished = time.perf_counter()
+    if counter:
+        counter.enabled = False
+    syscalls_after = read_proc_io()
+
+    files = max(total, 1)
+    result = {
+        'files': total,
+        'success': success,
+        'failed': len(failed),
+        'elapsed': finished - start,
+        'files_per_sec': total / (finished - start) if finished > start else None,
+        'phases': {'plan': planned - start, 'execute': finished - planned},
+        'rw_syscalls_per_file': ((syscalls_after - syscalls_before) / files
+                                 if syscalls_before is not None and syscalls_after is not None else None),
+        'peak_rss_kb': peak_rss_kb(),
+        'stats': {key: value for key, value in classifier.run_stats.items()
+                  if isinstance(value, (int, float, str, bool))},
+    }
+    if config.get('profile'):
+        report = classifier.profiler.report()
+        result['phases'].update((f"profile.{name}", phase['wall']) for name, phase in report['phases'].items())
+        result['profile'] = report
+    if counter:
+        result['fs_ops_per_file'] = sum(counter.counts.values()) / files
+        result['fs_ops'] = dict(counter.counts)
+    return result
+
+
+def run_matching(config):
+    """子进程: get_file_category 与 is_output_directory 的微基准"""
+    work_dir = config['work_dir']
+    src_dir = os.path.join(work_dir, 'src')
+    classifier = make_classifier(work_dir, config)
+    classifier.settings_manager.set('exclude_output_dirs', True)
+
+    names, dirs = [], []
+    for dir_path, dir_names, file_names in os.walk(src_dir):
+        dirs.append(dir_path)
+        names.extend(file_names)
+    # 输出目录历史: 与源目录树无关的目录, 判断结果均为否
+    for i in range(config['history']):
+        classifier.output_dirs_history.add(os.path.join(work_dir, 'history', f"{i}_output", 'x'))
+
+    phases = {}
+    classifier.get_file_category(names[0] if names else 'a.txt')  # 编译匹配器
+    start = time.perf_counter()
+    for _ in range(config['match_rounds']):
+        for name in names:
+            classifier.get_file_category(name)
+    calls = max(len(names) * config['match_rounds'], 1)
+    phases['get_file_category_ns'] = (time.perf_counter() - start) / calls * 1e9
+
+    start = time.perf_counter()
+    for _ in range(config['match_rounds']):
+        for path in dirs:
+            classifier.is_output_directory(path)
+    calls = max(len(dirs) * config['match_rounds'], 1)
+    phases['is_output_directory_ns'] = (time.perf_counter() - start) / calls * 1e9
+
+    return {'names': len(names), 'dirs': len(dirs), 'phases': phases, 'peak_rss_kb': peak_rss_kb()}
+
+
+def run_in_subprocess(kind, config):
+    """在新的 Python 进程中运行, 返回其 JSON 结果"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', kind, json.dumps(config)],
+        capture_output=True, text=True, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{kind} 运行失败:\n{completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def summarize(runs):
+    """多次运行取中位数, 同时给出最小值和最大值"""
+    summary = {}
+    numeric = [key for key, value in runs[0].items() if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    for key in numeric:
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if values:
+            summary[key] = statistics.median(values)
+    for key in ('phases', 'fs_ops'):
+        if key in runs[0]:
+            summary[key] = {name: statistics.median(run[key].get(name, 0) for run in runs) for name in runs[0][key]}
+    if 'files_per_sec' in summary:
+        rates = [run['files_per_sec'] for run in runs if run.get('files_per_sec')]
+        summary['files_per_sec_min'] = min(rates)
+        summary['files_per_sec_max'] = max(rates)
+    summary['stats'] = runs[-1].get('stats', {})
+    if 'profile' in runs[-1]:
+        summary['profile'] = runs[-1]['profile']
+    summary['runs'] = len(runs)
+    return summary
+
+
+def git_revision():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                   capture_output=True, text=True, check=False)
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(args):
+    from file_classifier import __version__
+
+    extensions = parse_extensions(args.extensions)
+    base = tempfile.mkdtemp(prefix='fc_bench_', dir=args.root)
+    config = {
+        'rules': args.rules,
+        'glob_rules': args.glob_rules,
+        'workers': args.workers,
+        'journal': args.journal,
+        'checkpoint': args.checkpoint,
+        'trace_ops': args.trace_ops,
+        'profile': args.profile,
+        'history': args.history,
+        'match_rounds': args.match_rounds,
+    }
+    results = []
+    try:
+        for mode in args.modes:
+            runs = []
+            tree = None
+            for repeat in range(args.repeat):
+                work_dir = os.path.join(base, f"{mode}_{repeat}")
+                tree = generate_tree(os.path.join(work_dir, 'src'), args.files, args.depth, args.fanout,
+                                     args.collision_ratio, extensions, args.file_size, args.seed)
+                runs.append(run_in_subprocess('classify', dict(config, work_dir=work_dir, mode=mode)))
+                shutil.rmtree(work_dir, ignore_errors=True)
+                print(f"{mode} #{repeat + 1}: {runs[-1]['files_per_sec']:.0f} 个/秒", file=sys.stderr)
+            results.append(dict(name=f"classify_{mode}", tree=tree, **summarize(runs)))
+
+        work_dir = os.path.join(base, 'match')
+        tree = generate_tree(os.path.join(work_dir, 'src'), args.files, args.depth, args.fanout,
+                             args.collision_ratio, extensions, 0, args.seed)
+        runs = [run_in_subprocess('match', dict(config, work_dir=work_dir)) for _ in range(args.repeat)]
+        results.append(dict(name='matching', tree=tree, **summarize(runs)))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    return {
+        'meta': {
+            'version': __version__,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'root': args.root,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'params': {
+            'files': args.files, 'depth': args.depth, 'fanout': args.fanout,
+            'collision_ratio': args.collision_ratio, 'extensions': args.extensions,
+            'file_size': args.file_size, 'seed': args.seed, 'repeat': args.repeat, **config,
+        },
+        'results': results,
+    }
+
+
+# 比较时关注的指标, True 表示越大越好
+COMPARED_METRICS = {
+    'files_per_sec': True,
+    'rw_syscalls_per_file': False,
+    'fs_ops_per_file': False,
+    'peak_rss_kb': False,
+}
+
+
+def compare(current, baseline):
+    """与基准结果比较, 返回文本行"""
+    old_results = {result['name']: result for result in baseline.get('results', [])}
+    lines = [f"对比基准: {baseline.get('meta', {}).get('revision')} -> {current['meta'].get('revision')}"]
+    for result in current['results']:
+        old = old_results.get(result['name'])
+        if old is None:
+            continue
+        metrics = [(metric, higher_better) for metric, higher_better in COMPARED_METRICS.items()]
+        metrics += [(f"phases.{phase}", False) for phase in result.get('phases', {})]
+        for metric, higher_better in metrics:
+            new_value, old_value = _metric(result, metric), _metric(old, metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            better = change > 0 if higher_better else change < 0
+            lines.append(f"  {result['name']:<16} {metric:<32} {old_value:>14.4g} -> {new_value:<14.4g} "
+                         f"{change:+7.1f}% {('较好' if better else '较差') if change else ''}")
+    return lines
+
+
+def _metric(result, metric):
+    if metric.startswith('phases.'):
+        return result.get('phases', {}).get(metric[len('phases.'):])
+    return result.get(metric)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='文件分类器性能基准')
+    parser.add_argument('--root', default=default_root(), help='生成目录树的位置 (默认优先 /dev/shm)')
+    parser.add_argument('--files', type=int, default=10000, help='文件数量')
+    parser.add_argument('--depth', type=int, default=2, help='目录深度')
+    parser.add_argument('--fanout', type=int, default=8, help='每层子目录数量')
+    parser.add_argument('--collision-ratio', type=float, default=0.1, help='与其他目录中文件重名的比例')
+    parser.add_argument('--extensions', default=DEFAULT_EXTENSIONS,
+                        help='扩展名分布, 如 jpg:30,txt:20,:5 (空扩展名为无扩展名的文件)')
+    parser.add_argument('--file-size', type=int, default=1024, help='每个文件的大小 (字节)')
+    parser.add_argument('--rules', type=int, default=0, help='额外的合成扩展名规则数量 (x0, x1, ...)')
+    parser.add_argument('--glob-rules', type=int, default=0, help='额外的合成通配符规则数量')
+    parser.add_argument('--history', type=int, default=1000, help='微基准中输出目录历史的数量')
+    parser.add_argument('--match-rounds', type=int, default=5, help='微基准的重复轮数')
+    parser.add_argument('--modes', nargs='+', choices=['move', 'copy'], default=['move', 'copy'])
+    parser.add_argument('--workers', type=int, default=0, help='文件操作线程数, 0 为按设备自动选择')
+    parser.add_argument('--journal', action=argparse.BooleanOptionalAction, default=True, help='写入操作日志')
+    parser.add_argument('--checkpoint', action=argparse.BooleanOptionalAction, default=True, help='写入检查点')
+    parser.add_argument('--trace-ops', action='store_true', help='统计文件系统操作 (有少量额外开销)')
+    parser.add_argument('--profile', action='store_true', help='启用运行剖析, 输出细分阶段及各类操作的耗时分布')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数, 结果取中位数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--output', help='结果写入的 JSON 文件, 默认输出到标准输出')
+    parser.add_argument('--compare', metavar='BASELINE', help='与之前保存的结果比较')
+    parser.add_argument('--worker', nargs=2, metavar=('KIND', 'CONFIG'), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.worker:
+        kind, config = args.worker
+        runner = run_classification if kind == 'classify' else run_matching
+        print(json.dumps(runner(json.loads(config))))
+        return 0
+
+    report = run_suite(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(report, baseline)), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,13 @@
+"""
+文件自动分类器 - 核心引擎
+
+不依赖PyQt5, 可在无界面的服务器/容器中通过 python -m file_classifier 运行
+"""
+from file_classifier.settings import SettingsManager, MemorySettings
+from file_classifier.core import FileClassifier
+from file_classifier.plan import ClassificationPlan, PlannedOperation
+
+__version__ = '1.0.2'
+
+__all__ = ['SettingsManager', 'MemorySettings', 'FileClassifier', 'ClassificationPlan',
+           'PlannedOperation', '__version__']
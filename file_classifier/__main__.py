@@ -0,0 +1,5 @@
+import sys
+
+from file_classifier.cli import main
+
+sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+分类缓存
+
+以 SQLite 保存此前复制过的文件: (输出目录, 设备号, inode) -> (大小, 修改时间, 分类, 目标路径)。
+再次分类到同一输出目录时, 大小和修改时间未变且目标文件仍完好的文件直接跳过,
+目标文件不存在时沿用缓存的分类, 不再匹配规则或读取文件内容。
+按最近使用时间淘汰超出上限的条目
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+CACHE_FILE_NAME = 'classification_cache.sqlite3'
+CACHE_SCHEMA_VERSION = 2
+
+CacheEntry = namedtuple('CacheEntry', ['category', 'destination', 'fresh'])
+
+
+def default_cache_path():
+    """默认缓存位置: 用户缓存目录下的 file_classifier 目录"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'file_classifier', CACHE_FILE_NAME)
+
+
+def rules_fingerprint(categories, disabled_categories=()):
+    """规则表指纹, 规则变更后缓存的分类不再使用"""
+    data = json.dumps([sorted(categories.items()), sorted(disabled_categories)], ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def file_key(st):
+    """缓存键及校验字段: (设备号, inode, 大小, 修改时间)"""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class ClassificationCache:
+    """
+    分类缓存, 每个线程各自打开 (sqlite3 连接不能跨线程使用)
+
+    Args:
+        path: 缓存文件路径, 为None时使用默认位置
+        max_entries: 最多保留的条目数, 超出后淘汰最久未使用的条目
+        rules: 当前规则表指纹
+        output_dir: 本次运行的输出目录, 只有复制到该目录的记录才会被查到
+    """
+
+    def __init__(self, path=None, max_entries=1000000, rules='', output_dir=''):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.rules = rules
+        self.output_dir = os.path.abspath(output_dir) if output_dir else ''
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._touched = []
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None or int(row[0]) != CACHE_SCHEMA_VERSION:
+            self._db.execute('DROP TABLE IF EXISTS files')
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(CACHE_SCHEMA_VERSION),))
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                output_dir TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                rules TEXT NOT NULL,
+                category TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (output_dir, dev, ino)
+            ) WITHOUT ROWID
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)')
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, st):
+        """
+        查找文件的缓存
+
+        Args:
+            st: 源文件的 os.stat_result
+
+        Returns:
+            CacheEntry 或 None; fresh 表示目标文件与源文件一致, 可以直接跳过
+        """
+        dev, ino, size, mtime_ns = file_key(st)
+        row = self._db.execute(
+            'SELECT size, mtime_ns, rules, category, destination FROM files '
+            'WHERE output_dir = ? AND dev = ? AND ino = ?',
+            (self.output_dir, dev, ino)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns or row[2] != self.rules:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append((dev, ino))
+        _, _, _, category, destination = row
+        try:
+            dst = os.stat(destination)
+            fresh = dst.st_size == size and dst.st_mtime_ns == mtime_ns
+        except OSError:
+            fresh = False
+        if fresh:
+            self.skipped += 1
+        return CacheEntry(category, destination, fresh)
+
+    def record(self, entries):
+        """
+        批量记录分类结果
+
+        Args:
+            entries: 可迭代的 (源文件 os.stat_result, 分类, 目标路径)
+        """
+        now = time.time_ns()
+        self._db.executemany(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((self.output_dir,) + file_key(st) + (self.rules, category, destination, now)
+             for st, category, destination in entries))
+        self._db.commit()
+        self.evict()
+
+    def evict(self):
+        """淘汰超出上限的最久未使用条目, 返回淘汰数量"""
+        count = self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self._db.execute(
+            'DELETE FROM files WHERE (output_dir, dev, ino) IN '
+            '(SELECT output_dir, dev, ino FROM files ORDER BY last_used LIMIT ?)',
+            (excess,))
+        self._db.commit()
+        return excess
+
+    def compact(self):
+        """删除目标文件已不存在或规则已变更的条目并压缩数据库, 返回删除数量"""
+        stale = [(output_dir, dev, ino) for output_dir, dev, ino, rules, destination
+                 in self._db.execute('SELECT output_dir, dev, ino, rules, destination FROM files')
+                 if rules != self.rules or not os.path.exists(destination)]
+        self._db.executemany('DELETE FROM files WHERE output_dir = ? AND dev = ? AND ino = ?', stale)
+        self._db.commit()
+        self._db.execute('VACUUM')
+        return len(stale)
+
+    def invalidate(self):
+        """清空缓存"""
+        self._db.execute('DELETE FROM files')
+        self._db.commit()
+        self._db.execute('VACUUM')
+
+    def count(self):
+        """缓存条目数"""
+        return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def close(self):
+        """更新命中条目的使用时间并关闭"""
+        if self._db is None:
+            return
+        if self._touched:
+            now = time.time_ns()
+            self._db.executemany('UPDATE files SET last_used = ? WHERE output_dir = ? AND dev = ? AND ino = ?',
+                                 ((now, self.output_dir, dev, ino) for dev, ino in self._touched))
+            self._db.commit()
+            self._touched = []
+        self._db.close()
+        self._db = None
@@ -0,0 +1,125 @@
+"""
+分类检查点
+
+执行计划时把计划本身和已完成的操作定期写入输出目录下的检查点目录,
+分类被取消或进程崩溃后可以从中断处继续, 不必重新扫描和处理已完成的文件。
+运行信息 (操作日志位置等) 另存一个小文件, 恢复时沿用
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from file_classifier.journal import BatchedAppendFile
+from file_classifier.plan import ClassificationPlan
+
+CHECKPOINT_DIR_NAME = '_checkpoint'
+PLAN_FILE = 'plan.jsonl'
+DONE_FILE = 'done.txt'
+RUN_FILE = 'run.json'
+# done.txt 中以此开头的行撤销之前的完成记录 (路径中不会出现NUL)
+FAILED_PREFIX = '\0'
+
+
+class Checkpoint:
+    """分类检查点"""
+
+    def __init__(self, output_dir, flush_every=1000, flush_interval=2.0):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, CHECKPOINT_DIR_NAME)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # 已完成操作的相对源路径
+        self.completed = set()
+        # 运行信息, 如 {'journal': 相对输出目录的操作日志路径}
+        self.info = {}
+        self._log = None
+
+    @staticmethod
+    def exists(output_dir):
+        """输出目录下是否有未完成的检查点"""
+        return os.path.isfile(os.path.join(output_dir, CHECKPOINT_DIR_NAME, PLAN_FILE))
+
+    @classmethod
+    def create(cls, plan, **kwargs):
+        """为计划创建检查点"""
+        checkpoint = cls(plan.output_dir, **kwargs)
+        os.makedirs(checkpoint.path, exist_ok=True)
+        plan.save(os.path.join(checkpoint.path, PLAN_FILE))
+        checkpoint._open(os.path.join(checkpoint.path, DONE_FILE), 'w')
+        return checkpoint
+
+    @classmethod
+    def load(cls, output_dir, **kwargs):
+        """加载输出目录下的检查点"""
+        checkpoint = cls(output_dir, **kwargs)
+        try:
+            with open(os.path.join(checkpoint.path, RUN_FILE), 'r', encoding='utf-8') as f:
+                checkpoint.info = json.load(f)
+        except (OSError, ValueError):
+            pass
+        done_file = os.path.join(checkpoint.path, DONE_FILE)
+        if os.path.exists(done_file):
+            with open(done_file, 'r', encoding='utf-8') as f:
+                # 崩溃时最后一行可能不完整, 只取以换行结尾的行
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    if line.startswith(FAILED_PREFIX):
+                        checkpoint.completed.discard(line[1:-1])
+                    else:
+                        checkpoint.completed.add(line[:-1])
+        checkpoint._open(done_file, 'a')
+        return checkpoint
+
+    def _open(self, path, mode):
+        self._log = BatchedAppendFile(path, mode, self.flush_every, self.flush_interval)
+
+    def update_info(self, **fields):
+        """更新运行信息, 写入临时文件后重命名"""
+        self.info.update(fields)
+        fd, tmp_path = tempfile.mkstemp(prefix='.run_', suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.info, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, RUN_FILE))
+
+    @property
+    def journal_path(self):
+        """被中断运行的操作日志, 没有时为None"""
+        journal = self.info.get('journal')
+        return os.path.join(self.output_dir, journal) if journal else None
+
+    def remaining_plan(self):
+        """读取计划并去掉已完成的操作"""
+        plan = ClassificationPlan.load(os.path.join(self.path, PLAN_FILE))
+        plan.operations = [op for op in plan if op.rel_path not in self.completed]
+        return plan
+
+    def record(self, rel_path):
+        """记录一个已完成的操作, 按数量或时间间隔批量落盘"""
+        self.completed.add(rel_path)
+        self._log.append(rel_path)
+
+    def mark_failed(self, rel_path):
+        """把已记录完成的操作标记为失败 (如内容校验不一致), 恢复时重新执行"""
+        self.completed.discard(rel_path)
+        self._log.append(f"{FAILED_PREFIX}{rel_path}")
+
+    def flush(self):
+        """写入尚未落盘的记录"""
+        if self._log is not None:
+            self._log.flush()
+
+    def close(self):
+        """落盘并关闭, 保留检查点用于恢复"""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def complete(self):
+        """分类全部完成, 删除检查点"""
+        if self._log is not None:
+            self._log.discard()
+            self._log.close()
+            self._log = None
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,322 @@
+"""
+命令行入口
+
+用法: python -m file_classifier <源目录> [选项]
+"""
+import argparse
+import json
+import signal
+import sys
+import time
+from contextlib import nullcontext
+
+from file_classifier import __version__
+from file_classifier.core import FileClassifier
+from file_classifier.executor import CancellationToken
+from file_classifier.fileops import BACKUP_STRATEGIES
+from file_classifier.logs import SETTING_LEVELS, failure_summary_lines, summarize_failures
+from file_classifier.plan import ClassificationPlan
+from file_classifier.profiling import cprofile_to, format_report
+from file_classifier.progress import ProgressThrottle, format_eta
+from file_classifier.verify import HASH_ALGORITHMS
+from file_classifier.settings import SettingsManager
+
+
+def build_parser(settings_manager):
+    """构建命令行参数解析器, 默认值取自设置管理器"""
+    parser = argparse.ArgumentParser(
+        prog='python -m file_classifier',
+        description='文件自动分类器 (无界面模式)',
+    )
+    parser.add_argument('src_dir', nargs='?', help='要分类的源目录 (使用 --plan 时可省略)')
+    parser.add_argument('-o', '--output', dest='output_dir', default=None,
+                        help='输出目录, 留空则按输出路径模式在源目录下自动创建')
+    parser.add_argument('--pattern', default=None,
+                        help='输出路径模式, 支持 {date} {time} {datetime} {id} {uuid}')
+    parser.add_argument('--copy', dest='move_files', action='store_false',
+                        default=settings_manager.get_bool('move_files'),
+                        help='复制文件 (默认移动)')
+    parser.add_argument('--move', dest='move_files', action='store_true',
+                        help='移动文件')
+    parser.add_argument('-r', '--recursive', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('recursive'),
+                        help='是否递归处理子文件夹')
+    parser.add_argument('--preserve-structure', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('preserve_structure'),
+                        help='是否保持原有子目录结构')
+    parser.add_argument('--backup-and-verify', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('backup_and_verify_source'),
+                        help='分类前备份源文件并校验')
+    parser.add_argument('--backup-strategy', choices=BACKUP_STRATEGIES,
+                        default=settings_manager.get('backup_strategy'),
+                        help='备份方式, auto 会按文件系统自动选择开销最小的方式')
+    parser.add_argument('--verify-checksum', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('verify_checksum'),
+                        help='校验时比对文件内容哈希 (需配合 --backup-and-verify)')
+    parser.add_argument('--checksum-algorithm', choices=sorted(HASH_ALGORITHMS),
+                        default=settings_manager.get('checksum_algorithm'),
+                        help='内容校验哈希算法')
+    parser.add_argument('--remove-empty-folders', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('remove_empty_folders'),
+                        help='移动后删除源目录中的空文件夹')
+    parser.add_argument('--exclude-output-dirs', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('exclude_output_dirs'),
+                        help='排除历史输出目录, 防止重复分类')
+    parser.add_argument('--sniff', dest='content_sniffing', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('content_sniffing'),
+                        help='扩展名无法识别的文件按文件头内容识别分类')
+    parser.add_argument('--sniff-bytes', dest='sniff_max_bytes', type=int,
+                        default=settings_manager.get_int('sniff_max_bytes'),
+                        help='内容识别时每个文件最多读取的字节数')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量分类 (复制模式, 需指定 -o): 只处理与上次相比新增或修改的文件')
+    parser.add_argument('--propagate-deletions', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('propagate_deletions'),
+                        help='增量分类时, 源文件已删除则删除其副本')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视源目录, 分类新写入的文件, 按 Ctrl+C 停止')
+    parser.add_argument('--settle', type=float, default=settings_manager.get_int('watch_settle_seconds'),
+                        help='监视模式下文件多少秒内不再变化视为写入完成')
+    parser.add_argument('--poll', action='store_true', help='监视模式下使用定期扫描代替 inotify')
+    parser.add_argument('--cache', dest='enable_cache', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('enable_cache'),
+                        help='复制模式下缓存已分类的文件, 再次分类时跳过未变更的文件')
+    parser.add_argument('--cache-path', default=settings_manager.get('cache_path') or None,
+                        help='分类缓存文件路径 (默认在用户缓存目录)')
+    parser.add_argument('--cache-compact', action='store_true',
+                        help='删除缓存中目标文件已不存在或规则已变更的条目并压缩, 然后退出')
+    parser.add_argument('--cache-clear', action='store_true', help='清空分类缓存, 然后退出')
+    parser.add_argument('-j', '--workers', dest='io_workers', type=int,
+                        default=settings_manager.get_int('io_workers'),
+                        help='并发执行文件操作的线程数, 0为按目标设备自动选择')
+    parser.add_argument('--rules', dest='config_file', default=None,
+                        help='分类规则文件 (默认 classifier_rules.yaml)')
+    parser.add_argument('--save-rules', action=argparse.BooleanOptionalAction, default=None,
+                        help='分类完成后保存规则及输出目录历史 (默认仅在指定 --rules 时按设置保存, '
+                             '避免无人值守运行时在当前目录写入规则文件)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='只生成分类计划并输出统计, 不移动/复制任何文件')
+    parser.add_argument('--save-plan', metavar='FILE', default=None,
+                        help='将分类计划保存为JSON Lines文件')
+    parser.add_argument('--plan', dest='load_plan', metavar='FILE', default=None,
+                        help='执行之前保存的分类计划, 忽略源目录及扫描相关选项')
+    parser.add_argument('--progress', action='store_true', help='在标准错误输出中显示进度 (每秒一次)')
+    parser.add_argument('--resume', metavar='OUTPUT_DIR', default=None,
+                        help='从输出目录中的检查点恢复被中断的分类')
+    parser.add_argument('--checkpoint', dest='enable_checkpoint', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('enable_checkpoint'),
+                        help='分类时在输出目录保存检查点, 中断后可用 --resume 恢复')
+    parser.add_argument('--journal', dest='enable_journal', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('enable_journal'),
+                        help='分类时在输出目录写入操作日志, 可用 --undo 撤销')
+    parser.add_argument('--undo', metavar='JOURNAL', default=None,
+                        help='按操作日志撤销分类, 可指定日志文件或输出目录 (撤销最近一次)')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出分类结果')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不输出日志')
+    parser.add_argument('--log-level', choices=list(SETTING_LEVELS), default=settings_manager.get('log_level'),
+                        help='日志级别, 简洁不输出逐个文件的信息')
+    parser.add_argument('--log-file', default=settings_manager.get('log_file') or None,
+                        help='同时写入日志文件 (超过大小后滚动)')
+    parser.add_argument('--profile', dest='enable_profiling', action=argparse.BooleanOptionalAction,
+                        default=settings_manager.get_bool('enable_profiling'),
+                        help='记录各阶段及各类操作的耗时, 写入JSON结果的 profile')
+    parser.add_argument('--report', action='store_true', help='分类结束后输出各阶段及各类操作的耗时')
+    parser.add_argument('--cprofile', metavar='FILE', default=None,
+                        help='用 cProfile 剖析本次运行 (仅主线程), 结果写入 FILE, 可用 pstats 查看')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    return parser
+
+
+def _print_progress(event):
+    """输出进度"""
+    print(f"进度: {event.current}/{event.total} ({event.rate:.0f} 个/秒, 剩余 {format_eta(event.eta)})",
+          file=sys.stderr)
+
+
+def _print_summary(summary):
+    """输出可读的分类结果"""
+    if summary['undo']:
+        print(f"已撤销分类: {summary['output_dir']}")
+    else:
+        print(f"文件已分类至: {summary['output_dir']}")
+    if summary['backup_dir']:
+        print(f"文件已备份至: {summary['backup_dir']}")
+    if summary['verified'] is not None:
+        print(f"校验结果: {'成功' if summary['verified'] else '失败'}")
+    print(f"总文件数: {summary['total']}")
+    print(f"成功分类: {summary['success']}")
+    print(f"失败数量: {len(summary['failed'])}")
+    for line in failure_summary_lines(summary['failed']):
+        print(line)
+    print(f"耗时: {summary['elapsed']:.3f}s")
+
+
+def _print_report(report):
+    """输出运行剖析"""
+    lines = format_report(report)
+    if lines:
+        print()
+        print("运行统计:")
+        for line in lines:
+            print(f"  {line}" if line else line)
+
+
+def main(argv=None):
+    settings_manager = SettingsManager()
+    args = build_parser(settings_manager).parse_args(argv)
+
+    settings_manager.set('move_files', args.move_files)
+    settings_manager.set('recursive', args.recursive)
+    settings_manager.set('preserve_structure', args.preserve_structure)
+    settings_manager.set('backup_and_verify_source', args.backup_and_verify)
+    settings_manager.set('backup_strategy', args.backup_strategy)
+    settings_manager.set('verify_checksum', args.verify_checksum)
+    settings_manager.set('checksum_algorithm', args.checksum_algorithm)
+    settings_manager.set('remove_empty_folders', args.remove_empty_folders)
+    settings_manager.set('exclude_output_dirs', args.exclude_output_dirs)
+    settings_manager.set('io_workers', args.io_workers)
+    settings_manager.set('content_sniffing', args.content_sniffing)
+    settings_manager.set('sniff_max_bytes', args.sniff_max_bytes)
+    settings_manager.set('enable_cache', args.enable_cache)
+    settings_manager.set('cache_path', args.cache_path or '')
+    settings_manager.set('enable_checkpoint', args.enable_checkpoint)
+    settings_manager.set('enable_journal', args.enable_journal)
+    settings_manager.set('log_level', args.log_level)
+    settings_manager.set('log_file', args.log_file or '')
+    settings_manager.set('enable_profiling', args.enable_profiling)
+    if args.pattern:
+        settings_manager.set('default_output_pattern', args.pattern)
+    if args.save_rules is None:
+        args.save_rules = args.config_file is not None and settings_manager.get_bool('auto_save_rules')
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    def note(message):
+        """提示信息, -q 时不输出"""
+        if not args.quiet:
+            log(message)
+
+    classifier = FileClassifier(settings_manager, log_callback=None if args.quiet else log,
+                                config_file=args.config_file)
+    if args.cache_compact or args.cache_clear:
+        with classifier.open_cache() as cache:
+            if args.cache_clear:
+                cache.invalidate()
+                note(f"分类缓存已清空: {cache.path}")
+            else:
+                removed = cache.compact()
+                note(f"分类缓存已压缩: {cache.path}, 删除 {removed} 条, 剩余 {cache.count()} 条")
+        return 0
+
+    # Ctrl+C / SIGTERM 时协作式取消, 已完成的操作保留在检查点中
+    cancel_token = CancellationToken()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: cancel_token.cancel())
+
+    start = time.perf_counter()
+    progress = ProgressThrottle(_print_progress, interval=1.0) if args.progress else None
+    profile = cprofile_to(args.cprofile) if args.cprofile else nullcontext()
+    try:
+        with profile:
+            if args.undo:
+                success, failed, total = classifier.undo_run(args.undo, callback=progress,
+                                                             max_workers=args.io_workers, cancel_token=cancel_token)
+                result = (success, failed, total, args.undo, None, None)
+            elif args.watch:
+                if not args.src_dir:
+                    log("错误: 监视模式需要指定源目录")
+                    return 2
+                result = classifier.watch(
+                    args.src_dir, args.output_dir,
+                    move_files=args.move_files,
+                    recursive=args.recursive,
+                    preserve_structure=args.preserve_structure,
+                    settle=args.settle,
+                    polling=args.poll,
+                    cancel_token=cancel_token,
+                )
+            elif args.incremental:
+                if not args.src_dir or not args.output_dir:
+                    log("错误: 增量分类需要指定源目录和 -o 输出目录")
+                    return 2
+                result = classifier.incremental_classification(
+                    args.src_dir, args.output_dir,
+                    callback=progress,
+                    recursive=args.recursive,
+                    preserve_structure=args.preserve_structure,
+                    propagate_deletions=args.propagate_deletions,
+                    max_workers=args.io_workers,
+                    cancel_token=cancel_token,
+                )
+            elif args.resume:
+                result = classifier.resume_classification(args.resume, callback=progress,
+                                                           max_workers=args.io_workers, cancel_token=cancel_token)
+            else:
+                if args.load_plan:
+                    plan = ClassificationPlan.load(args.load_plan)
+                elif args.src_dir:
+                    plan = classifier.plan_classification(
+                        args.src_dir,
+                        output_dir=args.output_dir,
+                        move_files=args.move_files,
+                        recursive=args.recursive,
+                        preserve_structure=args.preserve_structure,
+                    ).sort_by_directory()
+                else:
+                    log("错误: 需要指定源目录、--plan 或 --resume")
+                    return 2
+                if args.save_plan:
+                    plan.save(args.save_plan)
+                    note(f"分类计划已保存到: {args.save_plan}")
+                if args.dry_run:
+                    summary = dict(plan.summary(), output_dir=plan.output_dir,
+                                   elapsed=time.perf_counter() - start)
+                    print(json.dumps(summary, ensure_ascii=False, indent=2))
+                    return 0
+
+                result = classifier.execute_plan(
+                    plan,
+                    callback=progress,
+                    backup_and_verify=args.backup_and_verify,
+                    max_workers=args.io_workers,
+                    cancel_token=cancel_token,
+                )
+            if progress:
+                progress.flush()
+    except (ValueError, IOError) as e:
+        log(f"严重错误: {e}")
+        return 2
+    if args.cprofile:
+        note(f"cProfile 结果已保存到: {args.cprofile}")
+    return _finish(args, classifier, start, result)
+
+
+def _finish(args, classifier, start, result):
+    """保存规则并输出分类结果, 返回退出码"""
+    success, failed, total, out_dir, backup_dir, verified = result
+    if args.save_rules:
+        classifier.save_rules(immediate=True)
+
+    summary = {
+        'success': success,
+        'failed': failed,
+        'total': total,
+        'output_dir': out_dir,
+        'backup_dir': backup_dir,
+        'verified': verified,
+        'failure_summary': [group._asdict() for group in summarize_failures(failed)],
+        'elapsed': time.perf_counter() - start,
+        'undo': args.undo is not None,
+        'stats': classifier.run_stats,
+        'profile': classifier.profiler.report(),
+    }
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        _print_summary(summary)
+        if args.report:
+            _print_report(summary['profile'])
+    if classifier.run_stats.get('cancelled'):
+        return 130
+    return 0 if not failed and verified is not False else 1
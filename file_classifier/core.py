@@ -0,0 +1,1367 @@
+"""
+分类核心
+
+不依赖Qt的文件分类引擎, 供GUI、命令行及无界面环境共用
+"""
+import os
+import yaml
+import time
+import uuid
+from datetime import datetime
+
+from file_classifier.cache import ClassificationCache, rules_fingerprint
+from file_classifier.checkpoint import Checkpoint
+from file_classifier.executor import ClassificationCancelled, FileOperationExecutor, device_workers
+from file_classifier.fileops import DirectoryCache, FileTransfer, TransferResult
+from file_classifier.incremental import DirectorySnapshot
+from file_classifier.journal import RunJournal, needs_undo
+from file_classifier.logs import DETAIL, ERROR, INFO, WARNING, RotatingFileSink, RunLog, level_from_setting
+from file_classifier.naming import DestinationNameIndex
+from file_classifier.pathindex import PathPrefixIndex
+from file_classifier.plan import ClassificationPlan, OP_MOVE, OP_SKIP
+from file_classifier.profiling import RunProfiler
+from file_classifier.rulecache import load_rules_file, write_rule_cache
+from file_classifier.rules import RuleDict, RuleMatcher, normalize_rule
+from file_classifier.rulestore import RuleStore
+from file_classifier.scanner import scan_files
+from file_classifier.sniff import ContentSniffer
+from file_classifier.verify import ChecksumVerifier
+from file_classifier.watch import IDLE_TIMEOUT, StabilityTracker, create_watcher, scan_entries
+
+
+def _inode(scanned):
+    """扫描条目的inode, 无法获取时为0"""
+    try:
+        return scanned.entry.inode()
+    except OSError:
+        return 0
+
+
+def _remove_empty_parents(directories, root):
+    """从深到浅删除变空的目录, 不超出 root"""
+    root = os.path.normpath(root)
+    for directory in sorted(directories, key=len, reverse=True):
+        directory = os.path.normpath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+class FileClassifier:
+    """文件分类器核心类"""
+
+    # 每批预写到操作日志的计划记录数
+    JOURNAL_BATCH_SIZE = 256
+
+    def __init__(self, settings_manager, log_callback=None, config_file=None, backup_dir=None):
+        self.settings_manager = settings_manager
+        self.config_file = config_file or "classifier_rules.yaml"
+        self.backup_dir = backup_dir or "rule_backups"
+        # 禁用分类
+        self.disabled_categories = set()
+        # 记录输出目录历史
+        self.output_dirs_history = PathPrefixIndex()
+        # 回调函数, 参数为已达到日志级别的消息
+        self.log_callback = log_callback
+        # 结构化日志: 环形缓冲区, 可选的日志文件
+        self.logger = RunLog()
+        self._log_file = None
+        self.configure_logging()
+        # 规则文件的写入与备份
+        self.rule_store = RuleStore(self.config_file, self.backup_dir, log=self._log)
+        # 最近一次运行的统计信息
+        self.run_stats = {}
+        # 最近一次运行各阶段及各类操作的耗时
+        self.profiler = RunProfiler(False)
+        # 最近一次生成、尚未执行的计划, 执行它时沿用规划阶段的统计与耗时
+        self._planned = None
+        # 默认分类规则
+        self.default_categories = {
+            # 文档类
+            'txt': 'Text',
+            'doc': 'Documents',
+            'docx': 'Documents',
+            'pdf': 'PDF',
+            'rtf': 'Documents',
+            'odt': 'Documents',
+            'pages': 'Documents',
+            'wpd': 'Documents',
+            'wps': 'Documents',
+            'md': 'Text',
+            'markdown': 'Text',
+            'tex': 'Text',
+            'text': 'Text',
+            'nfo': 'Text',
+            'log': 'Text',
+            'wri': 'Documents',
+            'xps': 'Documents',
+
+            # 电子表格类
+            'xlsx': 'Spreadsheets',
+            'xls': 'Spreadsheets',
+            'csv': 'Spreadsheets',
+            'ods': 'Spreadsheets',
+            'numbers': 'Spreadsheets',
+            'tsv': 'Spreadsheets',
+            'gsheet': 'Spreadsheets',
+
+            # 演示文稿
+            'ppt': 'Presentations',
+            'pptx': 'Presentations',
+            'odp': 'Presentations',
+            'key': 'Presentations',
+            'gslide': 'Presentations',
+
+            # 电子书
+            'epub': 'eBooks',
+            'mobi': 'eBooks',
+            'azw': 'eBooks',
+            'azw3': 'eBooks',
+            'fb2': 'eBooks',
+            'lit': 'eBooks',
+            'lrf': 'eBooks',
+            'prc': 'eBooks',
+            'kpf': 'eBooks',
+
+            # 图片类
+            'jpg': 'Images',
+            'jpeg': 'Images',
+            'png': 'Images',
+            'gif': 'Images',
+            'bmp': 'Images',
+            'svg': 'Images',
+            'ico': 'Images',
+            'webp': 'Images',
+            'tga': 'Images',
+            'psd': 'Images',
+            'ai': 'Images',
+            'eps': 'Images',
+            'raw': 'Images',
+            'cr2': 'Images',
+            'nef': 'Images',
+            'heic': 'Images',
+            'heif': 'Images',
+            'avif': 'Images',
+            'jxl': 'Images',
+            'wmf': 'Images',
+            'emf': 'Images',
+
+            # 视频类
+            'mp4': 'Videos',
+            'avi': 'Videos',
+            'mkv': 'Videos',
+            'mov': 'Videos',
+            'wmv': 'Videos',
+            'flv': 'Videos',
+            'webm': 'Videos',
+            'm4v': 'Videos',
+            'mpg': 'Videos',
+            'mpeg': 'Videos',
+            '3gp': 'Videos',
+            '3g2': 'Videos',
+            'rmvb': 'Videos',
+            'rm': 'Videos',
+            'asf': 'Videos',
+            'vob': 'Videos',
+            'm2ts': 'Videos',
+
+            # 音频类
+            'mp3': 'Audio',
+            'wav': 'Audio',
+            'flac': 'Audio',
+            'aac': 'Audio',
+            'ogg': 'Audio',
+            'oga': 'Audio',
+            'wma': 'Audio',
+            'm4a': 'Audio',
+            'ape': 'Audio',
+            'alac': 'Audio',
+            'opus': 'Audio',
+            'aiff': 'Audio',
+            'aif': 'Audio',
+            'au': 'Audio',
+            'ra': 'Audio',
+            'amr': 'Audio',
+
+            # 压缩包类
+            'zip': 'Archives',
+            'rar': 'Archives',
+            '7z': 'Archives',
+            'tar': 'Archives',
+            'gz': 'Archives',
+            'bz2': 'Archives',
+            'xz': 'Archives',
+            'dmg': 'Archives',
+            'cab': 'Archives',
+            'z': 'Archives',
+            'arj': 'Archives',
+            'lzh': 'Archives',
+
+            # 代码类
+            'py': 'Code',
+            'js': 'Code',
+            'html': 'Code',
+            'htm': 'Code',
+            'css': 'Code',
+            'cpp': 'Code',
+            'cxx': 'Code',
+            'cc': 'Code',
+            'c': 'Code',
+            'h': 'Code',
+            'hpp': 'Code',
+            'java': 'Code',
+            'kt': 'Code',
+            'swift': 'Code',
+            'go': 'Code',
+            'rs': 'Code',
+            'php': 'Code',
+            'rb': 'Code',
+            'pl': 'Code',
+            'sh': 'Code',
+            'bat': 'Code',
+            'ps1': 'Code',
+            'vbs': 'Code',
+            'sql': 'Code',
+            'r': 'Code',
+            'scala': 'Code',
+            'clj': 'Code',
+            'hs': 'Code',
+            'elm': 'Code',
+            'dart': 'Code',
+            'vue': 'Code',
+            'jsx': 'Code',
+            'tsx': 'Code',
+            'ts': 'Code',
+            'json': 'Code',
+            'xml': 'Code',
+            'yaml': 'Code',
+            'yml': 'Code',
+            'toml': 'Code',
+            'conf': 'Code',
+            'cjs': 'Code',
+            'mjs': 'Code',
+            'ejs': 'Code',
+            'hbs': 'Code',
+            'pug': 'Code',
+            'haml': 'Code',
+            'slim': 'Code',
+            'mts': 'Code',
+            'scss': 'Code',
+            'sass': 'Code',
+            'less': 'Code',
+            'coffee': 'Code',
+            'cljs': 'Code',
+            'fs': 'Code',
+            'jl': 'Code',
+            'lua': 'Code',
+            'groovy': 'Code',
+            's': 'Code',
+            'pas': 'Code',
+            'for': 'Code',
+            'f90': 'Code',
+            'cob': 'Code',
+            'bas': 'Code',
+            'vb': 'Code',
+            'csproj': 'Code',
+            'vcproj': 'Code',
+            'sln': 'Code',
+            'gradle': 'Code',
+            'pom': 'Code',
+            'Makefile': 'Code',
+            'makefile': 'Code',
+            'Dockerfile': 'Code',
+            'dockerfile': 'Code',
+            'gitignore': 'Code',
+            'npmrc': 'Code',
+            'nvmrc': 'Code',
+
+            # 字体类
+            'ttf': 'Fonts',
+            'otf': 'Fonts',
+            'woff': 'Fonts',
+            'woff2': 'Fonts',
+            'eot': 'Fonts',
+            'fon': 'Fonts',
+            'fnt': 'Fonts',
+
+            # 可执行文件
+            'exe': 'Executables',
+            'msi': 'Executables',
+            'app': 'Executables',
+            'pkg': 'Executables',
+            'run': 'Executables',
+            'deb': 'Executables',
+            'rpm': 'Executables',
+            'apk': 'Executables',
+            'ipa': 'Executables',
+            'jar': 'Executables',
+            'com': 'Executables',
+            'drv': 'Executables',
+            'vmdk': 'Executables',
+            'vhd': 'Executables',
+
+            # 3D模型
+            'obj': '3D_Models',
+            'fbx': '3D_Models',
+            '3ds': '3D_Models',
+            'dae': '3D_Models',
+            'blend': '3D_Models',
+            'max': '3D_Models',
+            'ma': '3D_Models',
+            'mb': '3D_Models',
+
+            # 数据库文件
+            'db': 'Database',
+            'sqlite': 'Database',
+            'sqlite3': 'Database',
+            'mdb': 'Database',
+            'accdb': 'Database',
+            'dbf': 'Database',
+            'sqlitedb': 'Database',
+            'frm': 'Database',
+            'myd': 'Database',
+            'myi': 'Database',
+            'ibd': 'Database',
+
+            # 应用文件
+            'asar': 'App_Data',
+            'blockmap': 'App_Data',
+            'pak': 'App_Data',
+            'dat': 'App_Data',
+            'config': 'App_Data',
+            'settings': 'App_Data',
+            'pref': 'App_Data',
+
+            # Flash文件
+            'swf': 'Flash',
+            'fla': 'Flash',
+
+            # 种子文件
+            'torrent': 'Torrents',
+
+            # 快捷方式
+            'lnk': 'Shortcuts',
+            'url': 'Shortcuts',
+            'webloc': 'Shortcuts',
+            'desktop': 'Shortcuts',
+
+            # CAD文件
+            'dwg': 'CAD',
+            'dxf': 'CAD',
+            'dgn': 'CAD',
+            'iges': 'CAD',
+            'step': 'CAD',
+            'stp': 'CAD',
+            'sldprt': 'CAD',
+            'sldasm': 'CAD',
+            'prt': 'CAD',
+            'asm': 'CAD',
+
+            # GIS文件
+            'shp': 'GIS',
+            'shx': 'GIS',
+            'geojson': 'GIS',
+            'kml': 'GIS',
+            'kmz': 'GIS',
+            'gpx': 'GIS',
+            'tiff': 'GIS',
+
+            # 光盘镜像
+            'iso': 'Disc_Images',
+            'img': 'Disc_Images',
+            'nrg': 'Disc_Images',
+            'ccd': 'Disc_Images',
+            'bin': 'Disc_Images',
+            'cue': 'Disc_Images',
+
+            # 临时文件
+            'tmp': 'Temporary',
+            'temp': 'Temporary',
+            'bak': 'Temporary',
+
+            # 系统文件
+            'dll': 'System',
+            'sys': 'System',
+            'cfg': 'System',
+            'ini': 'System',
+            'inf': 'System',
+            'reg': 'System',
+            'dmp': 'System',
+        }
+
+        # 编译后的规则匹配器, 规则表变更后在下次匹配时重新编译
+        self._matcher = None
+        self._matcher_version = None
+        self.categories = self.default_categories.copy()
+        self.load_rules()
+
+    @property
+    def categories(self):
+        """分类规则表 (扩展名/通配符/正则 -> 分类)"""
+        return self._categories
+
+    @categories.setter
+    def categories(self, rules):
+        previous = getattr(self, '_categories', None)
+        self._categories = RuleDict(rules)
+        self._matcher = None
+        if previous is not None:
+            # 整个规则表被替换, 通知原规则表的监听者
+            self._categories.listeners = previous.listeners
+            self._categories._changed(None)
+
+    def _log(self, message, level=INFO, *args, **fields):
+        """
+        记录日志, 逐个文件的消息用 % 占位符和 args 传入参数,
+        低于日志级别时不格式化
+        """
+        record = self.logger.log(level, message, *args, **fields)
+        if record is not None and self.log_callback:
+            self.log_callback(record.message)
+
+    def configure_logging(self):
+        """按当前设置调整日志级别、缓冲区大小和日志文件"""
+        self.logger.level = level_from_setting(self.settings_manager.get('log_level'))
+        self.logger.capacity = self.settings_manager.get_int('log_buffer_size')
+        path = self.settings_manager.get('log_file') or None
+        if self._log_file is not None and (path is None or self._log_file.path != path):
+            self.logger.sinks.remove(self._log_file)
+            self._log_file.close()
+            self._log_file = None
+        if path and self._log_file is None:
+            try:
+                self._log_file = RotatingFileSink(
+                    path,
+                    max_bytes=self.settings_manager.get_int('log_file_max_mb') * 1024 * 1024,
+                    backups=self.settings_manager.get_int('log_file_backups'))
+                self.logger.sinks.append(self._log_file)
+            except OSError as e:
+                self._log(f"无法打开日志文件: {e}", WARNING)
+
+    def close_logging(self):
+        """写完日志文件中的记录后关闭"""
+        if self._log_file is not None:
+            self.logger.sinks.remove(self._log_file)
+            self._log_file.close()
+            self._log_file = None
+
+    @property
+    def matcher(self):
+        """返回与当前规则表一致的匹配器"""
+        if self._matcher is None or self._matcher_version != self._categories.version:
+            self._matcher = RuleMatcher(
+                self._categories,
+                on_error=lambda rule, e: self._log(f"忽略无效的规则 {rule}: {e}", WARNING))
+            self._matcher_version = self._categories.version
+        return self._matcher
+
+    def generate_output_path(self, base_dir, pattern=None):
+        """生成输出路径"""
+        if pattern is None:
+            pattern = self.settings_manager.get('default_output_pattern')
+
+        # 替换模式中的变量
+        now = datetime.now()
+        unique_id = str(uuid.uuid4())[:8]
+        # 支持的变量
+        variables = {
+            'date': now.strftime('%Y%m%d'),
+            'time': now.strftime('%H%M%S'),
+            'datetime': now.strftime('%Y%m%d_%H%M%S'),
+            'id': unique_id,
+            'uuid': str(uuid.uuid4()),
+        }
+        # 替换变量
+        output_path = pattern
+        for var, value in variables.items():
+            output_path = output_path.replace(f'{{{var}}}', value)
+        # 如果是相对路径, 基于base_dir
+        if not os.path.isabs(output_path):
+            output_path = os.path.join(base_dir, output_path)
+        # 记录输出目录
+        self.output_dirs_history.add(os.path.abspath(output_path))
+        return output_path
+
+    def is_output_directory(self, path):
+        """检查路径是否为输出目录"""
+        if not self.settings_manager.get_bool('exclude_output_dirs'):
+            return False
+        # 检查是否是已知的输出目录或位于其中
+        if self.output_dirs_history.covers(path):
+            return True
+        # 检查目录名是否匹配输出目录模式
+        dir_name = os.path.basename(os.path.abspath(path))
+        if '分类' in dir_name and ('_' in dir_name or any(char.isdigit() for char in dir_name)):
+            return True
+        return False
+
+    def toggle_category(self, category, enabled):
+        """切换分类的启用状态"""
+        # 禁用的分类保留其规则, 匹配时跳过, 重新启用后自定义规则不会丢失
+        if enabled:
+            self.disabled_categories.discard(category)
+        else:
+            self.disabled_categories.add(category)
+        self.save_rules()
+
+    def backup_rules(self):
+        """备份规则文件"""
+        if not self.settings_manager.get_bool('backup_rules'):
+            return
+        self.rule_store.backup()
+
+    def load_rules(self):
+        """从YAML文件加载规则, 规则缓存有效时直接使用缓存"""
+        try:
+            if os.path.exists(self.config_file):
+                data, cached = load_rules_file(self.config_file, self.default_categories)
+                if data:
+                    self.categories.update(data.get('categories', {}))
+                    self.output_dirs_history.update(data.get('output_dirs_history', []))
+                    self.disabled_categories.update((data.get('metadata') or {}).get('disabled_categories') or [])
+                    if self.settings_manager.get_bool('prune_output_history'):
+                        pruned = self.output_dirs_history.prune()
+                        if pruned:
+                            self._log(f"已从输出目录历史中移除 {len(pruned)} 个不存在的目录")
+                if not cached and self.settings_manager.get_bool('rule_cache'):
+                    self._write_rule_cache(data or {})
+                self._log("分类规则已成功加载" + (" (缓存)" if cached else ""))
+        except Exception as e:
+            self._log(f"加载规则失败: {e}", ERROR)
+
+    def _write_rule_cache(self, data):
+        """写入规则缓存, 可在后台线程中调用"""
+        try:
+            write_rule_cache(self.config_file, self.default_categories, data)
+        except Exception as e:
+            self._log(f"写入规则缓存失败: {e}", WARNING)
+
+    def save_rules(self, immediate=False):
+        """
+        保存规则到YAML文件
+
+        短时间内的多次保存会合并为一次, 由后台线程写入; immediate为True时立即写入
+        """
+        data = {
+            'categories': dict(self.categories),
+            'output_dirs_history': sorted(self.output_dirs_history),
+            'metadata': {
+                'version': '1.0.2',
+                'created': datetime.now().isoformat(),
+                'disabled_categories': list(self.disabled_categories)
+            }
+        }
+        store = self.rule_store
+        store.delay = self.settings_manager.get_int('rule_save_delay_ms') / 1000
+        store.retention = self.settings_manager.get_int('rule_backup_retention') \
+            if self.settings_manager.get_bool('backup_rules') else 0
+        store.on_written = self._write_rule_cache if self.settings_manager.get_bool('rule_cache') else None
+        store.schedule(data)
+        if immediate:
+            store.flush()
+
+    def flush_rules(self):
+        """立即写入尚未保存的规则变更"""
+        self.rule_store.flush()
+
+    def add_category_rule(self, extension, category):
+        """添加新的分类规则"""
+        self.categories[normalize_rule(extension)] = category
+        self.save_rules()
+
+    def remove_category_rule(self, extension):
+        """移除分类规则"""
+        extension = normalize_rule(extension)
+        if extension in self.categories:
+            del self.categories[extension]
+            self.save_rules()
+
+    def open_cache(self, output_dir=''):
+        """打开分类缓存, 以当前规则表作为校验, 只查找复制到 output_dir 的记录"""
+        return ClassificationCache(
+            self.settings_manager.get('cache_path') or None,
+            max_entries=self.settings_manager.get_int('cache_max_entries'),
+            rules=rules_fingerprint(self.categories, self.disabled_categories),
+            output_dir=output_dir,
+        )
+
+    def get_file_category(self, filename):
+        """根据文件名获取分类 (支持多段扩展名、通配符和正则规则)"""
+        category = self.matcher.match(filename)
+        # 检查分类是否被禁用
+        if category and category in self.disabled_categories:
+            return None
+        return category
+
+    def remove_empty_folders(self, path):
+        """递归删除空文件夹"""
+        if not os.path.exists(path) or not os.path.isdir(path):
+            return
+
+        for item in os.listdir(path):
+            item_path = os.path.join(path, item)
+            if os.path.isdir(item_path):
+                self.remove_empty_folders(item_path)
+        # 如果目录为空则删除
+        try:
+            if not os.listdir(path):
+                os.rmdir(path)
+                self._log("已删除空文件夹: %s", DETAIL, path)
+        except OSError:
+            # 目录不为空或无法删除
+            pass
+
+    def scan_files(self, src_dir, recursive=False):
+        """流式获取待分类文件, 产出 ScanEntry"""
+        exclude = None
+        if self.settings_manager.get_bool('exclude_output_dirs'):
+            exclude = self.profiler.timed('is_output_directory', self.is_output_directory)
+        return self.profiler.iterate('scan', scan_files(
+            src_dir, recursive, exclude=exclude,
+            on_error=lambda e: self._log("无法读取目录: %s", WARNING, e)))
+
+    def _reset_profiler(self):
+        """开始新一次运行的剖析"""
+        self.profiler = RunProfiler(self.settings_manager.get_bool('enable_profiling'))
+
+    def plan_classification(self, src_dir, output_dir=None, move_files=True,
+                            recursive=False, preserve_structure=None, entries=None, cancel_token=None):
+        """
+        生成分类计划, 只读取文件系统, 不做任何修改
+
+        Args:
+            src_dir: 源目录
+            output_dir: 输出目录, 如果为None则自动生成
+            move_files: True移动文件, False复制文件
+            recursive: 是否递归处理子文件夹
+            preserve_structure: 是否保持目录结构
+            entries: 待分类的文件 (ScanEntry), 为None时扫描源目录
+            cancel_token: 取消标记, 取消后抛出 ClassificationCancelled
+
+        Returns:
+            ClassificationPlan: 分类计划
+        """
+        if not os.path.exists(src_dir):
+            raise ValueError(f"目录不存在: {src_dir}")
+
+        # 生成输出目录
+        if output_dir is None:
+            output_dir = self.generate_output_path(src_dir)
+        if preserve_structure is None:
+            preserve_structure = self.settings_manager.get_bool('preserve_structure')
+
+        plan = ClassificationPlan(src_dir, output_dir, move_files, recursive, preserve_structure)
+        self.run_stats = {}
+        self._reset_profiler()
+        self._planned = plan
+        profiler = self.profiler
+        # 目标目录文件名索引, 每个目录只列出一次
+        name_index = DestinationNameIndex()
+        claim = profiler.timed('name_claim', name_index.claim)
+        get_file_category = profiler.timed('get_file_category', self.get_file_category)
+
+        def place(scanned, category):
+            # 构建目标目录
+            target_dir = os.path.join(output_dir, category)
+            if preserve_structure and recursive:
+                # 保持原有的子目录结构
+                rel_dir = os.path.dirname(scanned.rel_path)
+                if rel_dir and rel_dir != '.':
+                    target_dir = os.path.join(target_dir, rel_dir)
+
+            # 处理文件名冲突
+            dst_file = claim(target_dir, scanned.name)
+            plan.add(scanned.rel_path, category, dst_file, source=scanned.path)
+
+        sniffing = self.settings_manager.get_bool('content_sniffing')
+        # 复制模式下, 缓存中未变更且已复制到位的文件直接跳过
+        cache = None
+        if not move_files and self.settings_manager.get_bool('enable_cache'):
+            cache = self.open_cache(output_dir)
+            lookup = profiler.timed('cache_lookup', cache.lookup)
+        unplaced = []
+        try:
+            if entries is None:
+                entries = self.scan_files(src_dir, recursive)
+            with profiler.phase('plan'):
+                for scanned in entries:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    cached = None
+                    if cache:
+                        try:
+                            cached = lookup(scanned.entry.stat())
+                        except OSError:
+                            pass
+                    if cached is None:
+                        # 获取文件分类
+                        category = get_file_category(scanned.name)
+                    elif cached.fresh:
+                        continue
+                    else:
+                        category = cached.category
+                    if category:
+                        place(scanned, category)
+                    elif sniffing:
+                        unplaced.append(scanned)
+                    else:
+                        plan.add(scanned.rel_path, source=scanned.path)
+        finally:
+            if cache:
+                cache.close()
+                self.run_stats.update({
+                    'cache_hits': cache.hits,
+                    'cache_misses': cache.misses,
+                    'cache_skipped': cache.skipped,
+                })
+        if cache and cache.skipped:
+            self._log(f"跳过 {cache.skipped} 个未变更且已分类的文件")
+
+        if unplaced:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            with profiler.phase('sniff'):
+                sniffed = self._sniff_files(unplaced, src_dir)
+            # 按扫描顺序分配目标文件名, 结果与线程调度无关
+            for scanned in unplaced:
+                category = sniffed.get(scanned.path)
+                if category:
+                    place(scanned, category)
+                else:
+                    plan.add(scanned.rel_path, source=scanned.path)
+
+        self.run_stats.update({
+            'name_listings': name_index.listings,
+            'name_conflicts': name_index.conflicts,
+        })
+        return plan
+
+    def _sniff_files(self, entries, src_dir):
+        """
+        按文件头内容识别扩展名无法识别的文件
+
+        Returns:
+            dict: 文件路径 -> 分类
+        """
+        sniffer = ContentSniffer(
+            self.settings_manager.get_int('sniff_max_bytes'),
+            allowed=set(self.categories.values()) - self.disabled_categories,
+        )
+        # 按inode顺序读取, 减少机械硬盘的寻道
+        entries = sorted(entries, key=_inode)
+        max_workers = self.settings_manager.get_int('io_workers')
+        if max_workers <= 0:
+            max_workers = device_workers(src_dir)
+        executor = FileOperationExecutor(max_workers)
+
+        categories = {}
+        read_bytes = 0
+        errors = 0
+        tasks = ((scanned, sniffer.sniff, (scanned.path,)) for scanned in entries)
+        for scanned, result, error in executor.run(tasks):
+            if error is not None:
+                errors += 1
+                continue
+            category, size = result
+            read_bytes += size
+            if category:
+                categories[scanned.path] = category
+        self._log(f"内容识别: {len(entries)} 个文件, 识别出 {len(categories)} 个")
+        self.run_stats.update({
+            'sniffed_files': len(entries),
+            'sniffed_bytes': read_bytes,
+            'sniff_matches': len(categories),
+            'sniff_errors': errors,
+        })
+        return categories
+
+    @staticmethod
+    def _transfer(operation, dir_cache, transfer, algorithm=None, resuming=False, profiler=None):
+        """执行单个移动/复制操作, 不覆盖已存在的文件, 返回 TransferResult"""
+        if profiler is None:
+            profiler = RunProfiler(False)
+        dst_file = operation.destination
+        with profiler.measure('makedirs', threadsafe=True):
+            dir_cache.ensure(os.path.dirname(dst_file))
+        if resuming and os.path.lexists(dst_file):
+            # 中断前已完成但尚未写入检查点的操作
+            if operation.op == OP_MOVE and not os.path.lexists(operation.source):
+                return TransferResult('resumed', None, False)
+            if operation.op != OP_MOVE and os.path.getsize(dst_file) == os.path.getsize(operation.source):
+                return TransferResult('resumed', None, False)
+            # 中断时留下的不完整文件, 该文件名在生成计划时由本计划占用
+            os.unlink(dst_file)
+        # 计划可能在别处或较早前生成, 目标已存在时报错而不是覆盖
+        if operation.op == OP_MOVE:
+            with profiler.measure('move', threadsafe=True):
+                return transfer.move(operation.source, dst_file, algorithm)
+        with profiler.measure('copy', threadsafe=True):
+            return transfer.copy(operation.source, dst_file, algorithm)
+
+    def execute_plan(self, plan, callback=None, backup_and_verify=False, max_workers=None,
+                     cancel_token=None, checkpoint=None):
+        """
+        执行分类计划
+
+        Args:
+            plan: 分类计划
+            callback: 进度回调函数
+            backup_and_verify: 是否备份和校验
+            max_workers: 并发执行文件操作的线程数, 为None时读取设置, 小于等于0时按目标设备自动选择
+            cancel_token: 取消标记, 取消后已完成的操作保留在检查点中
+            checkpoint: 恢复时传入已加载的检查点, 为None时按设置新建; 恢复时沿用被中断运行的备份与校验设置
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果)
+        """
+        # 执行已有的计划 (从文件加载、从检查点恢复或再次执行) 时重新开始统计
+        if plan is not self._planned:
+            self.run_stats = {}
+            self._reset_profiler()
+        self._planned = None
+        output_dir = plan.output_dir
+        profiler = self.profiler
+        # 确保输出目录存在
+        os.makedirs(output_dir, exist_ok=True)
+        # 本次运行已创建的目录, 分类目录及子目录只创建一次
+        dir_cache = DirectoryCache()
+        dir_cache.add(os.path.normpath(output_dir))
+        # 按源/目标设备选择 rename、reflink、copy_file_range 等最快的方式
+        transfer = FileTransfer(plan.src_dir, output_dir, cancel_token)
+        # 检查点: 记录已完成的操作, 用于中断后恢复
+        resuming = checkpoint is not None
+        if resuming:
+            backup_and_verify = checkpoint.info.get('backup_and_verify', backup_and_verify)
+        elif self.settings_manager.get_bool('enable_checkpoint') and plan.transfers:
+            checkpoint = Checkpoint.create(plan)
+            checkpoint.update_info(backup_and_verify=backup_and_verify)
+        # 操作日志: 预写计划记录, 用于撤销本次分类
+        journal = None
+        if self.settings_manager.get_bool('enable_journal') and plan.transfers:
+            previous = checkpoint.journal_path if resuming else None
+            if previous and os.path.isfile(previous):
+                # 恢复的分类接着写被中断运行的日志, 一次撤销即可还原
+                journal = RunJournal.resume(previous)
+            else:
+                journal = RunJournal.create(plan)
+                if checkpoint:
+                    checkpoint.update_info(journal=os.path.relpath(journal.path, output_dir))
+            self.run_stats['journal'] = journal.path
+
+        total_files = len(plan)
+        success_count = 0
+        failed_files = []
+        # 记录成功的操作
+        successful_ops = {}
+        backup_path = None
+
+        # 文件读写交给执行器并发处理
+        if max_workers is None:
+            max_workers = self.settings_manager.get_int('io_workers')
+        if max_workers <= 0:
+            max_workers = device_workers(output_dir)
+        executor = FileOperationExecutor(max_workers)
+
+        # 备份: 被中断的运行已完成备份时沿用, 否则 (包括备份中途取消) 重新备份剩余的文件
+        previous_backup = checkpoint.info.get('backup') if resuming else None
+        if backup_and_verify and previous_backup:
+            backup_path = os.path.join(output_dir, previous_backup)
+            self._log(f"沿用被中断运行的备份: {backup_path}")
+        elif backup_and_verify and total_files > 0:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            backup_path = os.path.join(output_dir, f"_backup_{timestamp}")
+            suffix = 1
+            while os.path.exists(backup_path):  # 同一秒内恢复时不与被取消的备份重名
+                suffix += 1
+                backup_path = os.path.join(output_dir, f"_backup_{timestamp}_{suffix}")
+            methods = transfer.backup_methods(self.settings_manager.get('backup_strategy'), plan.move_files)
+            self._log(f"开始备份 {total_files} 个文件到: {backup_path} (备份方式: {' > '.join(methods)})")
+
+            snapshot = profiler.timed('backup', transfer.snapshot, threadsafe=True)
+
+            def backup_operations():
+                for operation in plan:
+                    backup_file = os.path.join(backup_path, operation.rel_path)
+                    dir_cache.ensure(os.path.dirname(backup_file))
+                    yield operation, snapshot, (operation.source, backup_file, methods)
+
+            with profiler.phase('backup'):
+                backup_errors = [(operation, error) for operation, _, error
+                                 in executor.run(backup_operations(), cancel_token)
+                                 if error is not None and not isinstance(error, ClassificationCancelled)]
+            self.run_stats['backup_methods'] = dict(transfer.backup_stats)
+            if backup_errors:
+                operation, error = backup_errors[0]
+                self._log(f"错误: 文件备份失败: {operation.rel_path}: {error} (共 {len(backup_errors)} 个)", ERROR)
+                # 备份失败，可以选择停止操作
+                raise IOError(f"文件备份失败: {operation.rel_path}: {error}")
+            if cancel_token is not None and cancel_token.cancelled:
+                self._log("备份已取消, 恢复时将重新备份")
+            else:
+                self._log("文件备份完成")
+                if checkpoint:
+                    checkpoint.update_info(backup=os.path.relpath(backup_path, output_dir))
+
+        processed = 0
+
+        def report(rel_path):
+            nonlocal processed
+            processed += 1
+            # 调用进度回调
+            if callback:
+                callback(processed, total_files, rel_path)
+
+        def submit(batch):
+            # 计划记录落盘之后才开始执行这一批操作
+            if journal:
+                with profiler.measure('journal_batch'):
+                    journal.log_planned(batch)
+            for operation in batch:
+                # 移动或复制文件
+                yield operation, self._transfer, (operation, dir_cache, transfer, algorithm, resuming, profiler)
+
+        def operations():
+            batch = []
+            for operation in plan:
+                if operation.op == OP_SKIP:
+                    failed_files.append(f"无法识别: {operation.rel_path}")
+                    report(operation.rel_path)
+                    continue
+                batch.append(operation)
+                if len(batch) >= self.JOURNAL_BATCH_SIZE:
+                    yield from submit(batch)
+                    batch = []
+            yield from submit(batch)
+
+        # 内容校验在独立线程池中进行, 与后续文件操作重叠
+        verifier = None
+        algorithm = None
+        if backup_and_verify and self.settings_manager.get_bool('verify_checksum'):
+            algorithm = self.settings_manager.get('checksum_algorithm')
+            verifier = ChecksumVerifier(algorithm, max(2, max_workers // 2))
+
+        with profiler.phase('transfer'):
+            for operation, result, error in executor.run(operations(), cancel_token):
+                if error is None:
+                    successful_ops[operation.destination] = operation.source
+                    success_count += 1
+                    if checkpoint:
+                        checkpoint.record(operation.rel_path)
+                    if journal:
+                        journal.log_done(operation)
+                    if verifier:
+                        verifier.submit(operation, operation.source, operation.destination, result)
+                elif isinstance(error, ClassificationCancelled):
+                    # 中途取消的操作已清理不完整的目标文件, 恢复时重新执行
+                    continue
+                else:
+                    failed_files.append(f"{operation.rel_path}: {str(error)}")
+                report(operation.rel_path)
+
+        # 内容校验在检查点和操作日志收尾之前完成, 校验失败的操作不算完成
+        mismatches = []
+        if verifier:
+            self._log(f"等待内容校验完成 ({algorithm})...")
+            with profiler.phase('checksum_wait'):
+                mismatches = verifier.results()
+            for operation, mismatch in mismatches:
+                self._log("校验失败: %s %s", WARNING, mismatch.reason, operation.destination)
+                failed_files.append(f"{operation.rel_path}: 校验失败: {mismatch.reason}")
+                successful_ops.pop(operation.destination, None)
+                success_count -= 1
+                # 源文件仍在时删除内容有误的目标文件, 恢复时可以重新执行
+                if os.path.lexists(operation.source) and os.path.lexists(operation.destination):
+                    try:
+                        os.unlink(operation.destination)
+                    except OSError as e:
+                        self._log("无法删除校验失败的目标文件: %s %s", WARNING, operation.destination, e)
+                if checkpoint:
+                    checkpoint.mark_failed(operation.rel_path)
+                if journal:
+                    journal.log_failed(operation)
+            self.run_stats.update({
+                'verify_hashed_files': verifier.hashed_files,
+                'verify_hashed_bytes': verifier.hashed_bytes,
+                'verify_mismatches': len(mismatches),
+            })
+
+        cancelled = cancel_token is not None and cancel_token.cancelled
+        self.run_stats['cancelled'] = cancelled
+        if journal:
+            journal.close()
+            self._log(f"操作日志已保存到: {journal.path}")
+        if checkpoint:
+            if cancelled:
+                checkpoint.close()
+                self._log(f"分类已取消, 已完成 {processed}/{total_files}, 检查点已保存到: {checkpoint.path}")
+            elif mismatches:
+                checkpoint.close()
+                self._log(f"{len(mismatches)} 个文件校验失败, 检查点已保存到: {checkpoint.path}, 可恢复以重新执行", WARNING)
+            else:
+                checkpoint.complete()
+
+        self.run_stats.update({
+            'mkdir_calls': dir_cache.mkdir_calls,
+            'mkdir_saved': dir_cache.saved,
+            'transfer_methods': dict(transfer.stats),
+        })
+        # 记录已复制的文件, 再次分类时跳过
+        if not plan.move_files and successful_ops and self.settings_manager.get_bool('enable_cache'):
+            with profiler.phase('cache_record'):
+                self._record_cache(plan, successful_ops)
+
+        # 校验
+        verification_passed = None
+        if backup_and_verify and total_files > 0:
+            self._log("开始校验分类结果...")
+            errors = 0
+            with profiler.phase('verify'):
+                for dst_file, src_file in successful_ops.items():
+                    if not os.path.exists(dst_file):
+                        errors += 1
+                        self._log("校验失败: 目标文件不存在 %s", WARNING, dst_file)
+                    if plan.move_files and os.path.exists(src_file):
+                        errors += 1
+                        self._log("校验失败: 源文件未被移动 %s", WARNING, src_file)
+
+            if verifier and mismatches:
+                errors += len(mismatches)
+
+            if errors == 0:
+                verification_passed = True
+                self._log(f"校验成功: {len(successful_ops)} 个文件的操作已确认")
+            else:
+                verification_passed = False
+                self._log(f"校验失败: 发现 {errors} 个错误, 详情请查看日志", ERROR)
+
+        # 清理空文件夹
+        if plan.move_files and not cancelled and self.settings_manager.get_bool('remove_empty_folders'):
+            with profiler.phase('remove_empty_folders'):
+                self.remove_empty_folders(plan.src_dir)
+
+        return success_count, failed_files, total_files, output_dir, backup_path, verification_passed
+
+    def resume_classification(self, output_dir, callback=None, max_workers=None, cancel_token=None):
+        """
+        从输出目录下的检查点恢复被中断的分类, 沿用其备份与校验设置
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果)
+        """
+        if not Checkpoint.exists(output_dir):
+            raise ValueError(f"没有可恢复的检查点: {output_dir}")
+        checkpoint = Checkpoint.load(output_dir)
+        plan = checkpoint.remaining_plan()
+        self._log(f"从检查点恢复: 已完成 {len(checkpoint.completed)} 个, 剩余 {len(plan.transfers)} 个")
+        return self.execute_plan(plan, callback=callback, max_workers=max_workers,
+                                 cancel_token=cancel_token, checkpoint=checkpoint)
+
+    @staticmethod
+    def _undo(entry, dir_cache, transfer):
+        """撤销单个操作: 移动的文件移回原处, 复制的文件删除"""
+        if entry.op != OP_MOVE:
+            os.unlink(entry.destination)
+            return
+        dir_cache.ensure(os.path.dirname(entry.source))
+        transfer.move(entry.destination, entry.source)
+
+    def _record_cache(self, plan, successful_ops):
+        """把成功复制的文件写入分类缓存"""
+        def entries():
+            for operation in plan:
+                if operation.destination not in successful_ops:
+                    continue
+                try:
+                    yield os.stat(operation.source), operation.category, os.path.abspath(operation.destination)
+                except OSError:
+                    continue
+
+        with self.open_cache(plan.output_dir) as cache:
+            cache.record(entries())
+            self.run_stats['cache_entries'] = cache.count()
+
+    def undo_run(self, path, callback=None, max_workers=None, cancel_token=None):
+        """
+        按操作日志撤销一次分类
+
+        Args:
+            path: 操作日志文件, 或输出目录 (撤销其中最近一次分类)
+            callback: 进度回调函数
+            max_workers: 并发执行文件操作的线程数, 为None时读取设置, 小于等于0时按设备自动选择
+            cancel_token: 取消标记, 取消后可再次撤销剩余的操作
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量)
+        """
+        self._reset_profiler()
+        journal, entries, done, undone = RunJournal.read(RunJournal.find(path))
+        # 逆序撤销, 跳过已撤销的操作; 恢复后重新计划的同一目标只按最新的记录撤销
+        latest = []
+        seen = set()
+        for entry in reversed(entries):
+            if entry.destination not in seen:
+                seen.add(entry.destination)
+                latest.append(entry)
+        entries = [entry for entry in latest if entry.seq not in undone and needs_undo(entry, done)]
+        total = len(entries)
+        self._log(f"撤销分类: {journal.path}, 共 {total} 个操作")
+
+        os.makedirs(journal.src_dir, exist_ok=True)
+        dir_cache = DirectoryCache()
+        dir_cache.add(os.path.normpath(journal.src_dir))
+        transfer = FileTransfer(journal.output_dir, journal.src_dir, cancel_token)
+        if max_workers is None:
+            max_workers = self.settings_manager.get_int('io_workers')
+        if max_workers <= 0:
+            max_workers = device_workers(journal.src_dir)
+        executor = FileOperationExecutor(max_workers)
+
+        success_count = 0
+        failed_files = []
+        processed = 0
+        # 撤销后可能变空的分类目录
+        parents = set()
+        journal.open_for_undo()
+        undo = self.profiler.timed('undo', self._undo, threadsafe=True)
+        tasks = ((entry, undo, (entry, dir_cache, transfer)) for entry in entries)
+        with self.profiler.phase('undo'):
+            try:
+                for entry, _, error in executor.run(tasks, cancel_token):
+                    if isinstance(error, ClassificationCancelled):
+                        continue
+                    processed += 1
+                    rel_path = os.path.relpath(entry.destination, journal.output_dir)
+                    if error is None:
+                        success_count += 1
+                        journal.log_undone(entry)
+                        parents.add(os.path.dirname(entry.destination))
+                    else:
+                        failed_files.append(f"{rel_path}: {str(error)}")
+                    if callback:
+                        callback(processed, total, rel_path)
+            finally:
+                journal.close()
+
+        # 删除撤销后变空的分类目录
+        _remove_empty_parents(parents, journal.output_dir)
+
+        self.run_stats.update({
+            'cancelled': cancel_token is not None and cancel_token.cancelled,
+            'transfer_methods': dict(transfer.stats),
+        })
+        self._log(f"撤销完成: 成功 {success_count} 个, 失败 {len(failed_files)} 个")
+        return success_count, failed_files, total
+
+    def incremental_classification(self, src_dir, output_dir, callback=None, recursive=False,
+                                   preserve_structure=None, propagate_deletions=None,
+                                   max_workers=None, cancel_token=None):
+        """
+        增量分类 (复制模式): 只处理与输出目录中快照相比新增或修改的文件
+
+        首次运行时处理全部文件并建立快照。修改过的文件会先删除原来的副本再重新复制
+
+        Args:
+            src_dir: 源目录
+            output_dir: 输出目录, 快照保存在其中
+            callback: 进度回调函数
+            recursive: 是否递归处理子文件夹
+            preserve_structure: 是否保持目录结构
+            propagate_deletions: 源文件已删除时是否删除其副本, 为None时读取设置
+            max_workers: 并发执行文件操作的线程数
+            cancel_token: 取消标记
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果)
+        """
+        if not os.path.exists(src_dir):
+            raise ValueError(f"目录不存在: {src_dir}")
+        if propagate_deletions is None:
+            propagate_deletions = self.settings_manager.get_bool('propagate_deletions')
+        os.makedirs(output_dir, exist_ok=True)
+
+        with DirectorySnapshot(output_dir, src_dir) as snapshot:
+            first_run = snapshot.empty
+            output_root = os.path.abspath(output_dir)
+            scan_start = time.perf_counter()
+            changes = snapshot.scan(
+                recursive,
+                exclude=lambda path: os.path.abspath(path) == output_root or self.is_output_directory(path),
+                on_error=lambda e: self._log("无法读取目录: %s", WARNING, e))
+            scan_elapsed = time.perf_counter() - scan_start
+            self._log(f"增量扫描: 列出 {len(changes.dirs)} 个目录, 跳过 {changes.skipped_dirs} 个未变化的目录, "
+                      f"新增/修改 {len(changes.changed)} 个文件, 删除 {len(changes.deleted)} 个文件"
+                      + (" (首次运行, 建立快照)" if first_run else ""))
+
+            # 删除过期的副本: 修改过的文件总是重新复制, 已删除的文件按设置处理
+            stale = list(changes.previous.values())
+            parents = set()
+            if propagate_deletions:
+                stale.extend(destination for destination in changes.deleted.values() if destination)
+            removed = 0
+            for destination in stale:
+                try:
+                    os.unlink(destination)
+                    parents.add(os.path.dirname(destination))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    self._log("无法删除过期的副本: %s: %s", WARNING, destination, e)
+            # 复制新文件之前删除变空的分类目录, 需要时会重新创建
+            _remove_empty_parents(parents, output_dir)
+
+            plan = self.plan_classification(src_dir, output_dir, move_files=False, recursive=recursive,
+                                             preserve_structure=preserve_structure, entries=changes.changed)
+            plan.sort_by_directory()
+            result = self.execute_plan(plan, callback=callback, max_workers=max_workers,
+                                       cancel_token=cancel_token)
+            # 快照扫描在生成计划之前, 计划开始时剖析数据已重置
+            self.profiler.add_phase('incremental_scan', scan_elapsed)
+
+            # 以目标文件是否完整判断每个文件是否处理成功
+            completed = {}
+            failed_dirs = set()
+            for operation in plan:
+                try:
+                    st = os.stat(operation.source)
+                    if operation.destination is not None and \
+                            os.stat(operation.destination).st_size != st.st_size:
+                        raise OSError
+                except OSError:
+                    failed_dirs.add(os.path.dirname(operation.rel_path))
+                    continue
+                completed[operation.rel_path] = (st.st_size, st.st_mtime_ns, operation.destination)
+            snapshot.update(changes, completed, failed_dirs)
+
+        self.run_stats.update({
+            'incremental_dirs_listed': len(changes.dirs),
+            'incremental_dirs_skipped': changes.skipped_dirs,
+            'incremental_changed': len(changes.changed),
+            'incremental_modified': len(changes.previous),
+            'incremental_deleted': len(changes.deleted),
+            'incremental_removed_copies': removed,
+        })
+        return result
+
+    def watch(self, src_dir, output_dir=None, move_files=True, recursive=False, preserve_structure=None,
+              settle=None, batch_delay=1.0, max_batch=1000, polling=False, cancel_token=None, on_batch=None):
+        """
+        监视源目录, 持续分类新写入的文件, 直到被取消
+
+        Args:
+            src_dir: 源目录
+            output_dir: 输出目录, 如果为None则自动生成 (整个监视期间使用同一个目录)
+            move_files: True移动文件, False复制文件
+            recursive: 是否递归处理子文件夹
+            preserve_structure: 是否保持目录结构
+            settle: 文件大小和修改时间保持不变多少秒后视为写入完成, 为None时读取设置
+            batch_delay: 第一个文件就绪后最多等待多少秒再凑成一批
+            max_batch: 每批最多的文件数
+            polling: 强制使用定期扫描
+            cancel_token: 取消标记, 取消后处理完当前批次即返回
+            on_batch: 每批分类完成后的回调, 参数为 execute_plan 的返回值
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果), 为所有批次的合计
+        """
+        if not os.path.isdir(src_dir):
+            raise ValueError(f"目录不存在: {src_dir}")
+        if output_dir is None:
+            output_dir = self.generate_output_path(src_dir)
+        if settle is None:
+            settle = self.settings_manager.get_int('watch_settle_seconds')
+        output_root = os.path.abspath(output_dir)
+
+        def exclude(path):
+            path = os.path.abspath(path)
+            return path == output_root or path.startswith(output_root + os.sep) or self.is_output_directory(path)
+
+        watcher = create_watcher(src_dir, recursive, exclude, polling)
+        tracker = StabilityTracker(settle)
+        self._log(f"开始监视: {src_dir} ({watcher.method}), 输出目录: {output_dir}")
+
+        batches = 0
+        success_count = 0
+        failed_files = []
+        total_files = 0
+        ready = []
+        first_ready = None
+
+        try:
+            for path in watcher.initial_files():
+                tracker.touch(path)
+            while not (cancel_token is not None and cancel_token.cancelled):
+                # 空闲时阻塞等待事件, 只按最近的到期时间唤醒
+                now = time.monotonic()
+                deadlines = [due for due in (tracker.next_due(),
+                                             first_ready + batch_delay if first_ready is not None else None)
+                             if due is not None]
+                timeout = min([IDLE_TIMEOUT] + [max(0.0, due - now) for due in deadlines])
+                for path in watcher.wait(timeout):
+                    tracker.touch(path)
+
+                done = tracker.ready()
+                if done:
+                    ready.extend(done)
+                    if first_ready is None:
+                        first_ready = time.monotonic()
+                if not ready:
+                    continue
+                # 凑满一批, 或等待已久, 或没有其他正在写入的文件时开始分类
+                if len(ready) < max_batch and len(tracker) and time.monotonic() - first_ready < batch_delay:
+                    continue
+
+                batch, ready = ready[:max_batch], ready[max_batch:]
+                first_ready = time.monotonic() if ready else None
+                entries = scan_entries(src_dir, batch)
+                if not entries:
+                    continue
+                plan = self.plan_classification(src_dir, output_dir, move_files, recursive,
+                                                preserve_structure, entries=entries).sort_by_directory()
+                result = self.execute_plan(plan, cancel_token=cancel_token)
+                batches += 1
+                success_count += result[0]
+                failed_files.extend(result[1])
+                total_files += result[2]
+                self._log(f"第 {batches} 批: 成功 {result[0]} 个, 失败 {len(result[1])} 个")
+                if on_batch:
+                    on_batch(result)
+        finally:
+            watcher.close()
+
+        self.run_stats.update({
+            'watch_method': watcher.method,
+            'watch_batches': batches,
+            # 监视模式以取消结束是正常退出
+            'cancelled': False,
+        })
+        self._log(f"停止监视: 共 {batches} 批, 成功 {success_count} 个, 失败 {len(failed_files)} 个")
+        return success_count, failed_files, total_files, output_dir, None, None
+
+    def classify_files(self, src_dir, output_dir=None, move_files=True, callback=None,
+                       recursive=False, preserve_structure=None, backup_and_verify=False,
+                       max_workers=None, cancel_token=None):
+        """
+        分类文件 (生成计划并立即执行)
+
+        Args:
+            src_dir: 源目录
+            output_dir: 输出目录, 如果为None则自动生成
+            move_files: True移动文件, False复制文件
+            callback: 进度回调函数
+            recursive: 是否递归处理子文件夹
+            preserve_structure: 是否保持目录结构
+            backup_and_verify: 是否备份和校验
+            max_workers: 并发执行文件操作的线程数, 为None时读取设置, 小于等于0时按目标设备自动选择
+            cancel_token: 取消标记
+
+        Returns:
+            tuple: (成功数量, 失败列表, 总数量, 输出目录, 备份目录, 校验结果)
+        """
+        plan = self.plan_classification(src_dir, output_dir, move_files, recursive, preserve_structure)
+        plan.sort_by_directory()
+        return self.execute_plan(plan, callback=callback, backup_and_verify=backup_and_verify,
+                                 max_workers=max_workers, cancel_token=cancel_token)
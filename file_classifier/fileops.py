@@ -0,0 +1,342 @@
+"""
+文件操作工具
+
+分类执行阶段使用的底层文件系统操作
+"""
+import errno
+import os
+import shutil
+import stat
+import sys
+import threading
+from collections import namedtuple
+
+from file_classifier.verify import new_hasher
+
+if sys.platform.startswith('linux'):
+    import fcntl
+else:
+    fcntl = None
+
+
+class DirectoryCache:
+    """
+    已创建目录缓存
+
+    一次运行中反复用到的分类目录/子目录只创建一次, 父目录按需逐级创建
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._created = set()
+        # 统计: 实际调用mkdir的次数, 命中缓存而省去的makedirs次数
+        self.mkdir_calls = 0
+        self.saved = 0
+
+    def add(self, path):
+        """登记已知存在的目录"""
+        with self._lock:
+            self._created.add(path)
+
+    def ensure(self, path):
+        """确保目录存在"""
+        if path in self._created:
+            with self._lock:
+                self.saved += 1
+            return
+        self._create(path)
+
+    def _create(self, path):
+        if path in self._created:
+            return
+        parent = os.path.dirname(path)
+        if parent and parent != path:
+            self._create(parent)
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not os.path.isdir(path):
+                raise
+        with self._lock:
+            self.mkdir_calls += 1
+            self._created.add(path)
+
+
+# Linux FICLONE ioctl, 在btrfs/XFS等文件系统上以写时复制方式克隆文件
+FICLONE = 0x40049409
+# 表示当前文件系统/内核不支持某种复制方式的错误码
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTTY,
+                       errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM}
+# 只影响单个文件的硬链接错误: 跨设备 (源目录下挂载了其他文件系统)、链接数超限、
+# 无权链接该文件 (如 protected_hardlinks 限制他人的文件)
+_HARDLINK_FILE_ERRNOS = {errno.EXDEV, errno.EMLINK, errno.EPERM}
+# 以非阻塞方式打开源文件, 命名管道不会在打开时等待写入方
+_OPEN_SOURCE_FLAGS = os.O_RDONLY | getattr(os, 'O_NONBLOCK', 0) | getattr(os, 'O_BINARY', 0)
+COPY_BUFSIZE = 1024 * 1024
+# 内核复制每次调用的最大字节数, 分块以便及时响应取消
+KERNEL_COPY_CHUNK = 64 * 1024 * 1024
+
+# 备份策略
+BACKUP_AUTO = 'auto'
+BACKUP_HARDLINK = 'hardlink'
+BACKUP_REFLINK = 'reflink'
+BACKUP_COPY = 'copy'
+BACKUP_STRATEGIES = (BACKUP_AUTO, BACKUP_HARDLINK, BACKUP_REFLINK, BACKUP_COPY)
+
+# method: 实际使用的方式, digest: 复制时顺带计算的源文件哈希,
+# pending_unlink: 跨设备移动时源文件暂未删除, 等待校验通过后再删除
+TransferResult = namedtuple('TransferResult', ['method', 'digest', 'pending_unlink'])
+
+
+class FileTransfer:
+    """
+    文件移动/复制
+
+    - 移动: 源目录与输出目录在同一设备时直接 os.rename, 跨设备时复制后删除源文件
+    - 复制: 依次尝试 reflink克隆、copy_file_range、sendfile, 均不可用时回退为普通读写
+    各种方式是否可用按 (源设备, 目标设备) 记录, 只探测一次
+    """
+
+    def __init__(self, src_dir, output_dir, cancel_token=None):
+        self._lock = threading.Lock()
+        # 取消标记, 分块复制时检查
+        self.cancel_token = cancel_token
+        self._output_dev = os.stat(output_dir).st_dev
+        try:
+            self._same_device = os.stat(src_dir).st_dev == self._output_dev
+        except OSError:
+            self._same_device = False
+        # 方式名 -> {(源设备, 目标设备): 是否可用}
+        self._supported = {'reflink': {}, 'copy_file_range': {}, 'sendfile': {}, 'hardlink': {}}
+        # 各种方式的使用次数
+        self.stats = {}
+        self.backup_stats = {}
+
+    @property
+    def same_device(self):
+        """源目录与输出目录是否在同一设备"""
+        return self._same_device
+
+    def _count(self, method, stats=None):
+        stats = self.stats if stats is None else stats
+        with self._lock:
+            stats[method] = stats.get(method, 0) + 1
+
+    def _enabled(self, method, key):
+        return self._supported[method].get(key, True)
+
+    def _disable(self, method, key):
+        self._supported[method][key] = False
+
+    def move(self, src, dst, algorithm=None):
+        """
+        移动文件, 不覆盖已存在的目标文件
+
+        指定哈希算法时, 跨设备移动在复制过程中计算源文件哈希, 并保留源文件等待校验
+
+        Returns:
+            TransferResult
+        """
+        if os.path.lexists(dst):
+            raise FileExistsError(f"目标文件已存在: {dst}")
+        if self._same_device:
+            try:
+                os.rename(src, dst)
+                self._count('rename')
+                return TransferResult('rename', None, False)
+            except OSError as e:
+                # 源目录下挂载了其他文件系统
+                if e.errno != errno.EXDEV:
+                    raise
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), dst)
+            self._count('symlink')
+            os.unlink(src)
+            return TransferResult('symlink', None, False)
+        result = self.copy(src, dst, algorithm)
+        if algorithm:
+            return result._replace(pending_unlink=True)
+        os.unlink(src)
+        return result
+
+    def copy(self, src, dst, algorithm=None):
+        """
+        复制文件内容及元数据, 不覆盖已存在的目标文件
+
+        Returns:
+            TransferResult
+        """
+        method, digest = self._copy(src, dst, algorithm)
+        self._count(method)
+        return TransferResult(method, digest, False)
+
+    def backup_methods(self, strategy, move_files):
+        """
+        按备份策略给出依次尝试的备份方式
+
+        自动策略下, 同一文件系统上的移动操作优先使用硬链接: 重命名不改变inode,
+        硬链接即是零数据成本的完整快照; 复制模式优先使用reflink克隆
+        """
+        if strategy == BACKUP_HARDLINK:
+            return [BACKUP_HARDLINK, BACKUP_COPY]
+        if strategy == BACKUP_REFLINK:
+            return [BACKUP_REFLINK, BACKUP_COPY]
+        if strategy == BACKUP_COPY:
+            return [BACKUP_COPY]
+        if not self._same_device:
+            # 硬链接和reflink都无法跨文件系统
+            return [BACKUP_COPY]
+        if move_files:
+            return [BACKUP_HARDLINK, BACKUP_REFLINK, BACKUP_COPY]
+        return [BACKUP_REFLINK, BACKUP_HARDLINK, BACKUP_COPY]
+
+    def snapshot(self, src, dst, methods):
+        """按顺序尝试各备份方式创建 dst, 返回实际使用的方式"""
+        for method in methods:
+            if method == BACKUP_HARDLINK and self._enabled('hardlink', None):
+                try:
+                    os.link(src, dst)
+                    self._count(BACKUP_HARDLINK, self.backup_stats)
+                    return BACKUP_HARDLINK
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS | {errno.EMLINK}:
+                        raise
+                    # 文件系统不支持硬链接时不再尝试, 其他错误只让当前文件改用后续方式
+                    if e.errno not in _HARDLINK_FILE_ERRNOS:
+                        self._disable('hardlink', None)
+            elif method == BACKUP_REFLINK and self._clone(src, dst):
+                self._count(BACKUP_REFLINK, self.backup_stats)
+                return BACKUP_REFLINK
+            elif method == BACKUP_COPY:
+                self._count(self._copy(src, dst)[0], self.backup_stats)
+                return BACKUP_COPY
+        raise OSError(errno.ENOTSUP, f"没有可用的备份方式: {src}")
+
+    def _clone(self, src, dst):
+        """仅尝试reflink克隆, 不支持时返回False且不留下目标文件"""
+        if fcntl is None:
+            return False
+        with _open_source(src) as fsrc:
+            key = (os.fstat(fsrc.fileno()).st_dev, self._output_dev)
+            if not self._enabled('reflink', key):
+                return False
+            with open(dst, 'xb') as fdst:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    cloned = True
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        fdst.close()
+                        os.unlink(dst)
+                        raise
+                    self._disable('reflink', key)
+                    cloned = False
+        if not cloned:
+            os.unlink(dst)
+            return False
+        shutil.copystat(src, dst)
+        return True
+
+    def _copy(self, src, dst, algorithm=None):
+        """复制文件内容及元数据, 返回 (使用的方式, 源文件哈希)"""
+        with _open_source(src) as fsrc:
+            st = os.fstat(fsrc.fileno())
+            # 'x' 模式: 目标已存在时报错, 避免覆盖
+            with open(dst, 'xb') as fdst:
+                try:
+                    method, digest = self._copy_data(fsrc, fdst, st.st_size,
+                                                     (st.st_dev, self._output_dev), algorithm)
+                except BaseException:
+                    fdst.close()
+                    os.unlink(dst)
+                    raise
+        shutil.copystat(src, dst)
+        return method, digest
+
+    def _copy_data(self, fsrc, fdst, size, key, algorithm=None):
+        """
+        复制文件数据, 返回 (使用的方式, 源文件哈希)
+
+        需要哈希时跳过内核复制, 直接在读写过程中计算, 避免事后再读一遍源文件;
+        reflink克隆与源文件共享数据块, 不需要计算哈希
+        """
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+
+        if fcntl is not None and self._enabled('reflink', key):
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                return 'reflink', None
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._disable('reflink', key)
+
+        if algorithm:
+            return 'stream', self._stream_copy(fsrc, fdst, new_hasher(algorithm))
+
+        if size > 0 and hasattr(os, 'copy_file_range') and self._enabled('copy_file_range', key):
+            try:
+                self._copy_loop(os.copy_file_range, src_fd, dst_fd, size)
+                return 'copy_file_range', None
+            except _FallbackError:
+                self._disable('copy_file_range', key)
+
+        if size > 0 and fcntl is not None and self._enabled('sendfile', key):
+            try:
+                self._copy_loop(lambda i, o, n: os.sendfile(o, i, None, n), src_fd, dst_fd, size)
+                return 'sendfile', None
+            except _FallbackError:
+                self._disable('sendfile', key)
+
+        self._stream_copy(fsrc, fdst)
+        return 'copy', None
+
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+    def _stream_copy(self, fsrc, fdst, hasher=None):
+        """读写复制, 可同时计算哈希"""
+        buffer = bytearray(COPY_BUFSIZE)
+        view = memoryview(buffer)
+        while True:
+            self._check_cancelled()
+            n = fsrc.readinto(buffer)
+            if not n:
+                break
+            if hasher is not None:
+                hasher.update(view[:n])
+            fdst.write(view[:n])
+        return hasher.hexdigest() if hasher is not None else None
+
+    def _copy_loop(self, copy_func, src_fd, dst_fd, size):
+        """在内核中分块复制, 首块即不支持时抛出 _FallbackError"""
+        copied = 0
+        while True:
+            self._check_cancelled()
+            try:
+                sent = copy_func(src_fd, dst_fd, min(max(size - copied, COPY_BUFSIZE), KERNEL_COPY_CHUNK))
+            except OSError as e:
+                if copied == 0 and e.errno in _UNSUPPORTED_ERRNOS:
+                    raise _FallbackError() from e
+                raise
+            if sent == 0:
+                break
+            copied += sent
+
+
+def _open_source(src):
+    """
+    打开要复制的源文件
+
+    与 shutil 一致, 拒绝命名管道、设备等特殊文件: 读取它们可能永远阻塞
+    """
+    fsrc = open(os.open(src, _OPEN_SOURCE_FLAGS), 'rb')
+    if not stat.S_ISREG(os.fstat(fsrc.fileno()).st_mode):
+        fsrc.close()
+        raise shutil.SpecialFileError(f"不是普通文件 (命名管道、设备等): {src}")
+    return fsrc
+
+
+class _FallbackError(Exception):
+    """当前复制方式不可用, 需要换用下一种"""
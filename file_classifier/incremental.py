@@ -0,0 +1,201 @@
+"""
+增量分类
+
+在输出目录中保存源目录的快照 (每个目录的修改时间及其中文件的大小、修改时间和目标路径)。
+再次分类时逐个目录比对修改时间: 未变化的目录不再列出, 子目录直接取自快照;
+只有修改时间变化的目录才重新列出, 找出新增、修改和删除的文件。
+
+目录的修改时间只在目录项增删或改名时变化, 原地改写文件内容不会被发现,
+需要时可做一次完整分类重建快照
+"""
+import os
+import sqlite3
+from collections import namedtuple
+
+from file_classifier.scanner import ScanEntry
+
+SNAPSHOT_DIR_NAME = '_incremental'
+SNAPSHOT_FILE_NAME = 'snapshot.sqlite3'
+# 目录中有文件处理失败时记录的修改时间, 下次一定重新列出
+DIRTY_MTIME = -1
+
+# changed: 新增或修改的文件 (ScanEntry), previous: 修改的文件 -> 原目标路径,
+# deleted: 已删除的文件 -> 原目标路径, dirs: 列出过的目录 -> 修改时间,
+# removed_dirs: 已删除的目录, skipped_dirs: 未变化而跳过列出的目录数
+ChangeSet = namedtuple('ChangeSet', ['changed', 'previous', 'deleted', 'dirs', 'removed_dirs', 'skipped_dirs'])
+
+
+class DirectorySnapshot:
+    """源目录快照"""
+
+    def __init__(self, output_dir, src_dir):
+        self.src_dir = os.path.abspath(src_dir)
+        self.path = os.path.join(output_dir, SNAPSHOT_DIR_NAME, SNAPSHOT_FILE_NAME)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript('''
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS dirs (
+                rel_dir TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                rel_path TEXT PRIMARY KEY,
+                rel_dir TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                destination TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_rel_dir ON files (rel_dir);
+        ''')
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'src_dir'").fetchone()
+        if row is None or row[0] != self.src_dir:
+            # 快照属于其他源目录, 重新开始
+            self._db.executescript('DELETE FROM dirs; DELETE FROM files;')
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('src_dir', ?)", (self.src_dir,))
+            self._db.commit()
+        # 目录数量远少于文件数量, 全部载入内存
+        self._dirs = {}
+        self._children = {}
+        for rel_dir, parent, mtime_ns in self._db.execute('SELECT rel_dir, parent, mtime_ns FROM dirs'):
+            self._dirs[rel_dir] = mtime_ns
+            if parent is not None:
+                self._children.setdefault(parent, []).append(rel_dir)
+
+    @property
+    def empty(self):
+        return not self._dirs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _files_in(self, rel_dir):
+        """快照中目录下的文件: 相对路径 -> (大小, 修改时间, 目标路径)"""
+        return {rel_path: (size, mtime_ns, destination) for rel_path, size, mtime_ns, destination
+                in self._db.execute('SELECT rel_path, size, mtime_ns, destination FROM files WHERE rel_dir = ?',
+                                    (rel_dir,))}
+
+    def _descendants(self, rel_dir):
+        """快照中的目录及其全部子目录"""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(self._children.get(current, ()))
+
+    def scan(self, recursive=False, exclude=None, on_error=None):
+        """
+        比对源目录与快照
+
+        Args:
+            recursive: 是否递归处理子文件夹
+            exclude: 判断目录是否需要排除的函数
+            on_error: 目录无法读取时的回调, 参数为 OSError
+
+        Returns:
+            ChangeSet
+        """
+        changed, previous, deleted = [], {}, {}
+        dirs, removed_dirs = {}, []
+        skipped_dirs = 0
+
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            dir_path = os.path.join(self.src_dir, rel_dir) if rel_dir else self.src_dir
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError as e:
+                if on_error:
+                    on_error(e)
+                continue
+
+            if self._dirs.get(rel_dir) == mtime_ns:
+                # 目录项未变化, 子目录取自快照, 仍需逐个检查其修改时间
+                skipped_dirs += 1
+                if recursive:
+                    stack.extend(self._children.get(rel_dir, ()))
+                continue
+
+            known = self._files_in(rel_dir)
+            subdirs = []
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                        try:
+                            is_dir = entry.is_dir()
+                            if is_dir and entry.is_symlink():
+                                # 与 os.walk 一致, 不进入符号链接指向的目录
+                                continue
+                            if not is_dir and not recursive and not entry.is_file():
+                                continue
+                        except OSError:
+                            continue
+                        if is_dir:
+                            if recursive and not (exclude and exclude(entry.path)):
+                                subdirs.append(rel_path)
+                            continue
+                        old = known.pop(rel_path, None)
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                            continue
+                        changed.append(ScanEntry(entry.path, entry.name, rel_path, entry))
+                        if old is not None and old[2]:
+                            previous[rel_path] = old[2]
+            except OSError as e:
+                if on_error:
+                    on_error(e)
+                continue
+
+            dirs[rel_dir] = mtime_ns
+            # 快照中有而现在没有的文件
+            for rel_path, (_, _, destination) in known.items():
+                deleted[rel_path] = destination
+            # 快照中有而现在没有的子目录
+            present = set(subdirs)
+            for child in self._children.get(rel_dir, ()):
+                if child not in present:
+                    for gone in self._descendants(child):
+                        removed_dirs.append(gone)
+                        for rel_path, (_, _, destination) in self._files_in(gone).items():
+                            deleted[rel_path] = destination
+            stack.extend(reversed(subdirs))
+
+        return ChangeSet(changed, previous, deleted, dirs, removed_dirs, skipped_dirs)
+
+    def update(self, changes, completed, failed_dirs):
+        """
+        分类完成后更新快照
+
+        Args:
+            changes: scan 返回的 ChangeSet
+            completed: 已处理的文件: 相对路径 -> (大小, 修改时间, 目标路径), 无法识别的文件目标路径为None
+            failed_dirs: 有文件处理失败的目录, 下次重新列出
+        """
+        db = self._db
+        db.executemany('DELETE FROM files WHERE rel_path = ?', ((rel_path,) for rel_path in changes.deleted))
+        db.executemany('DELETE FROM dirs WHERE rel_dir = ?', ((rel_dir,) for rel_dir in changes.removed_dirs))
+        db.executemany('DELETE FROM files WHERE rel_path = ?',
+                       ((scanned.rel_path,) for scanned in changes.changed if scanned.rel_path not in completed))
+        db.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                       ((rel_path, os.path.dirname(rel_path), size, mtime_ns, destination)
+                        for rel_path, (size, mtime_ns, destination) in completed.items()))
+        db.executemany('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)',
+                       ((rel_dir, os.path.dirname(rel_dir) if rel_dir else None,
+                         DIRTY_MTIME if rel_dir in failed_dirs else mtime_ns)
+                        for rel_dir, mtime_ns in changes.dirs.items()))
+        db.commit()
@@ -0,0 +1,235 @@
+"""
+操作日志
+
+每次分类运行在输出目录的 _journal 目录下写一个只追加的操作日志 (JSON Lines):
+文件操作开始前先批量写入并落盘计划记录, 完成后追加完成记录, 撤销时追加撤销记录;
+内容校验失败的操作追加失败记录, 撤销时不再视为已完成。
+从检查点恢复的分类继续追加到被中断运行的日志, 一次撤销即可还原整个分类。
+撤销分类时按日志逆序回放, 移动的文件移回原处, 复制的文件直接删除
+"""
+import json
+import os
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from file_classifier.plan import OP_MOVE
+
+JOURNAL_DIR_NAME = '_journal'
+JOURNAL_FORMAT_VERSION = 1
+
+# 记录类型: 计划 / 完成 / 校验失败 / 已撤销
+RECORD_PLANNED = 'P'
+RECORD_DONE = 'D'
+RECORD_FAILED = 'F'
+RECORD_UNDONE = 'U'
+
+# 日志中的一个操作, source/destination 为完整路径
+JournalEntry = namedtuple('JournalEntry', ['seq', 'source', 'destination', 'op'])
+
+
+class BatchedAppendFile:
+    """只追加的文本文件, 按数量或时间间隔批量写入并 fsync"""
+
+    def __init__(self, path, mode='a', flush_every=1000, flush_interval=2.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._file = open(path, mode, encoding='utf-8')
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def append(self, line):
+        """追加一行, 达到批量条件时落盘"""
+        self._pending.append(line)
+        if (len(self._pending) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """写入尚未落盘的行"""
+        if self._file is None or not self._pending:
+            return
+        self._file.write(''.join(f"{line}\n" for line in self._pending))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def discard(self):
+        """丢弃尚未落盘的行"""
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _dumps(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def _created_order(path):
+    """按日志头中的创建时间排序, 无法读取的日志排在最前"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+        created_ns = header.get('created_ns')
+        if created_ns is None:
+            created_ns = int(datetime.fromisoformat(header['created']).timestamp() * 1e9)
+        return created_ns, path
+    except (OSError, ValueError, KeyError, TypeError):
+        return -1, path
+
+
+class RunJournal:
+    """一次分类运行的操作日志"""
+
+    def __init__(self, path, src_dir, output_dir, move_files, run_id=None, created=None):
+        self.path = path
+        self.src_dir = src_dir
+        self.output_dir = output_dir
+        self.move_files = move_files
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.created = created or datetime.now().isoformat()
+        # 操作 -> 序号
+        self._seqs = {}
+        self._next_seq = 0
+        self._log = None
+
+    @classmethod
+    def create(cls, plan):
+        """为计划新建操作日志"""
+        journal_dir = os.path.join(plan.output_dir, JOURNAL_DIR_NAME)
+        os.makedirs(journal_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        journal = cls(None, plan.src_dir, plan.output_dir, plan.move_files)
+        journal.path = os.path.join(journal_dir, f"journal_{timestamp}_{journal.run_id}.jsonl")
+        journal._log = BatchedAppendFile(journal.path, 'w')
+        journal._log.append(_dumps({
+            'version': JOURNAL_FORMAT_VERSION,
+            'run_id': journal.run_id,
+            'src_dir': journal.src_dir,
+            'output_dir': journal.output_dir,
+            'move_files': journal.move_files,
+            'created': journal.created,
+            # 同一秒内创建的日志按纳秒时间排序
+            'created_ns': time.time_ns(),
+        }))
+        return journal
+
+    @classmethod
+    def resume(cls, path):
+        """继续追加到被中断运行的日志, 新的计划记录接着已有的序号"""
+        journal, entries, _, _ = cls.read(path)
+        journal._next_seq = max((entry.seq for entry in entries), default=-1) + 1
+        # 崩溃时最后一行可能不完整, 截掉后再追加
+        with open(path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+        journal._log = BatchedAppendFile(path, 'a')
+        return journal
+
+    def log_planned(self, operations):
+        """在执行之前写入一批计划记录并立即落盘 (预写)"""
+        for operation in operations:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs[operation] = seq
+            self._log.append(_dumps([
+                RECORD_PLANNED, seq,
+                os.path.relpath(operation.source, self.src_dir),
+                os.path.relpath(operation.destination, self.output_dir),
+                operation.op,
+            ]))
+        self._log.flush()
+
+    def log_done(self, operation):
+        """记录一个已完成的操作"""
+        self._log.append(_dumps([RECORD_DONE, self._seqs[operation]]))
+
+    def log_failed(self, operation):
+        """记录一个已完成但校验失败的操作"""
+        self._log.append(_dumps([RECORD_FAILED, self._seqs[operation]]))
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    @staticmethod
+    def find(path):
+        """
+        定位日志文件
+
+        path 可以是日志文件, 也可以是输出目录 (取其中最新的日志)
+        """
+        if os.path.isfile(path):
+            return path
+        journal_dir = os.path.join(path, JOURNAL_DIR_NAME)
+        if os.path.isdir(journal_dir):
+            journals = [os.path.join(journal_dir, name) for name in os.listdir(journal_dir) if name.endswith('.jsonl')]
+            if journals:
+                return max(journals, key=_created_order)
+        raise ValueError(f"找不到分类操作日志: {path}")
+
+    @classmethod
+    def read(cls, path):
+        """
+        读取日志
+
+        Returns:
+            tuple: (RunJournal, 计划的操作列表, 已完成序号集合, 已撤销序号集合)
+        """
+        entries = []
+        done, undone = set(), set()
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != JOURNAL_FORMAT_VERSION:
+                raise ValueError(f"不支持的操作日志版本: {header.get('version')}")
+            journal = cls(path, header['src_dir'], header['output_dir'], header['move_files'],
+                          header['run_id'], header['created'])
+            for line in f:
+                # 崩溃时最后一行可能不完整
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                kind = record[0]
+                if kind == RECORD_PLANNED:
+                    _, seq, rel_src, rel_dst, op = record
+                    entries.append(JournalEntry(seq, os.path.join(journal.src_dir, rel_src),
+                                                os.path.join(journal.output_dir, rel_dst), op))
+                elif kind == RECORD_DONE:
+                    done.add(record[1])
+                elif kind == RECORD_FAILED:
+                    done.discard(record[1])
+                elif kind == RECORD_UNDONE:
+                    undone.add(record[1])
+        return journal, entries, done, undone
+
+    def open_for_undo(self):
+        """以追加方式打开日志, 用于记录撤销"""
+        self._log = BatchedAppendFile(self.path, 'a')
+
+    def log_undone(self, entry):
+        """记录一个已撤销的操作"""
+        self._log.append(_dumps([RECORD_UNDONE, entry.seq]))
+
+
+def needs_undo(entry, done):
+    """
+    判断计划记录是否需要撤销
+
+    已完成的操作需要撤销; 没有完成记录的移动 (崩溃时正在进行或完成记录尚未落盘)
+    在目标存在且源文件已不在时撤销。没有完成记录的复制不撤销: 目标文件可能并非本次运行创建
+    (如执行时因目标已存在而失败), 至多留下一个多余的副本
+    """
+    if entry.seq in done:
+        return True
+    if entry.op != OP_MOVE:
+        return False
+    return os.path.lexists(entry.destination) and not os.path.lexists(entry.source)
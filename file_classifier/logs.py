@@ -0,0 +1,269 @@
+"""
+结构化日志
+
+日志记录为 (序号, 时间, 级别, 消息, 字段), 低于当前级别的记录在产生处直接丢弃, 不格式化消息。
+记录保存在固定大小的环形缓冲区中, 界面按序号分批取出新记录显示;
+可选的滚动日志文件由后台线程写入, 不阻塞分类流程。
+大量失败的文件按原因汇总显示, 不逐条写入日志
+"""
+import atexit
+import itertools
+import os
+import queue
+import re
+import threading
+import time
+import weakref
+from collections import deque, namedtuple
+
+DEBUG = 10
+DETAIL = 15
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', DETAIL: 'DETAIL', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# 设置中的日志级别 -> 记录的最低级别
+SETTING_LEVELS = {'简洁': INFO, '详细': DETAIL, '调试': DEBUG}
+
+DEFAULT_CAPACITY = 10000
+
+LogRecord = namedtuple('LogRecord', ['seq', 'time', 'level', 'message', 'fields'])
+
+# 尚未关闭的日志文件, 退出时写完队列中的记录
+_open_sinks = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all():
+    for sink in list(_open_sinks):
+        sink.close()
+
+
+def level_from_setting(name):
+    """设置中的日志级别名称转换为级别, 未知名称按 '详细' 处理"""
+    return SETTING_LEVELS.get(name, DETAIL)
+
+
+def format_record(record):
+    """日志文件中的一行"""
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.time))
+    line = f"{timestamp} {LEVEL_NAMES.get(record.level, record.level)} {record.message}"
+    if record.fields:
+        line += ' ' + ' '.join(f"{key}={value}" for key, value in record.fields.items())
+    return line
+
+
+class RunLog:
+    """
+    日志记录器
+
+    Args:
+        level: 最低记录级别
+        capacity: 环形缓冲区保留的记录数
+    """
+
+    def __init__(self, level=DETAIL, capacity=DEFAULT_CAPACITY):
+        self.level = level
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+        # 每条记录的回调 (日志文件等), 在产生记录的线程中调用
+        self.sinks = []
+
+    @property
+    def capacity(self):
+        return self._records.maxlen
+
+    @capacity.setter
+    def capacity(self, capacity):
+        with self._lock:
+            if capacity != self._records.maxlen:
+                self._records = deque(self._records, maxlen=capacity)
+
+    @property
+    def last_seq(self):
+        """最新一条记录的序号"""
+        return self._seq
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args, **fields):
+        """
+        记录一条日志, 低于当前级别时直接返回None
+
+        message 中的 % 占位符用 args 填充, 只在需要记录时格式化
+        """
+        if level < self.level:
+            return None
+        if args:
+            message = message % args
+        with self._lock:
+            self._seq += 1
+            record = LogRecord(self._seq, time.time(), level, message, fields)
+            self._records.append(record)
+        for sink in self.sinks:
+            sink(record)
+        return record
+
+    def debug(self, message, *args, **fields):
+        return self.log(DEBUG, message, *args, **fields)
+
+    def detail(self, message, *args, **fields):
+        return self.log(DETAIL, message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        return self.log(INFO, message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        return self.log(WARNING, message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        return self.log(ERROR, message, *args, **fields)
+
+    def since(self, seq):
+        """
+        取出序号大于 seq 的记录
+
+        Returns:
+            tuple: (记录列表, 已被环形缓冲区覆盖而无法取出的记录数)
+        """
+        with self._lock:
+            if not self._records or self._seq <= seq:
+                return [], 0
+            first = self._records[0].seq
+            # 缓冲区中的序号是连续的
+            records = list(itertools.islice(self._records, max(seq + 1 - first, 0), None))
+        return records, max(first - seq - 1, 0)
+
+    def records(self, level=None):
+        """缓冲区中的全部记录, 可按最低级别过滤"""
+        with self._lock:
+            records = list(self._records)
+        if level is None:
+            return records
+        return [record for record in records if record.level >= level]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+class RotatingFileSink:
+    """
+    滚动日志文件, 由后台线程写入
+
+    文件超过 max_bytes 后改名为 .1 (已有的依次后移), 最多保留 backups 个旧文件
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        _open_sinks.add(self)
+
+    def __call__(self, record):
+        self._queue.put(record)
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            # 一次写入队列中已有的全部记录
+            batch = [record]
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = None in batch
+            try:
+                for record in batch:
+                    if record is None:
+                        continue
+                    self._file.write(format_record(record) + '\n')
+                    if self.max_bytes and self._file.tell() >= self.max_bytes:
+                        self._rotate()
+                self._file.flush()
+            except OSError:
+                pass
+            if stop:
+                self._file.close()
+                return
+
+    def close(self):
+        """写入队列中的记录后关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        _open_sinks.discard(self)
+
+
+FailureGroup = namedtuple('FailureGroup', ['reason', 'count', 'examples'])
+
+_ERRNO_REASON = re.compile(r"(\[(?:Errno|WinError) -?\d+\] [^:']+)")
+
+
+def _failure_reason(failure):
+    """从失败记录 ("路径: 原因" 或 "无法识别: 路径") 中取出原因, 去掉其中的具体路径"""
+    if failure.startswith('无法识别: '):
+        return '无法识别'
+    _, sep, reason = failure.partition(': ')
+    if not sep:
+        return failure
+    match = _ERRNO_REASON.match(reason)
+    if match:
+        return match.group(1).strip()
+    return reason.split(": '", 1)[0]
+
+
+def summarize_failures(failed_files, examples=3):
+    """
+    按原因汇总失败的文件
+
+    Returns:
+        list: FailureGroup 列表, 按数量从多到少排列
+    """
+    groups = {}
+    for failure in failed_files:
+        reason = _failure_reason(failure)
+        group = groups.get(reason)
+        if group is None:
+            groups[reason] = group = [0, []]
+        group[0] += 1
+        if len(group[1]) < examples:
+            group[1].append(failure)
+    return sorted((FailureGroup(reason, count, found) for reason, (count, found) in groups.items()),
+                  key=lambda group: -group.count)
+
+
+def failure_summary_lines(failed_files, max_groups=10, examples=3):
+    """失败汇总的文本行"""
+    groups = summarize_failures(failed_files, examples)
+    lines = []
+    for group in groups[:max_groups]:
+        lines.append(f"  {group.reason}: {group.count} 个")
+        lines.extend(f"    - {failure}" for failure in group.examples)
+    if len(groups) > max_groups:
+        rest = sum(group.count for group in groups[max_groups:])
+        lines.append(f"  其他 {len(groups) - max_groups} 种原因: {rest} 个")
+    return lines
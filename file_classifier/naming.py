@@ -0,0 +1,64 @@
+"""
+目标文件名冲突处理
+
+每个目标目录只列出一次已有文件, 之后在内存中记录已占用的文件名,
+并为每个基础文件名维护下一个可用序号, 使冲突处理与同名文件数量无关
+"""
+import os
+import threading
+
+
+class DestinationNameIndex:
+    """目标目录文件名索引, 可在多个线程间共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 目录 -> 已存在或已占用的文件名(normcase后)
+        self._names = {}
+        # (目录, 文件名主体, 扩展名) -> 下一个尝试的序号
+        self._counters = {}
+        # 统计: 列出的目录数, 发生冲突的文件数
+        self.listings = 0
+        self.conflicts = 0
+
+    def _names_in(self, directory):
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                names = {os.path.normcase(name) for name in os.listdir(directory)}
+                self.listings += 1
+            except OSError:
+                # 目录尚未创建时其中不会有已存在的文件; 无权限等其他错误也不中断生成计划,
+                # 执行时以独占方式创建目标文件, 与未知的已有文件冲突时报错而不会覆盖
+                names = set()
+            self._names[directory] = names
+        return names
+
+    def claim(self, directory, filename):
+        """
+        占用目录下的一个文件名
+
+        文件名已被占用时按 name_1.ext, name_2.ext ... 的规则顺延
+
+        Returns:
+            str: 目标文件完整路径
+        """
+        with self._lock:
+            names = self._names_in(directory)
+            key = os.path.normcase(filename)
+            if key not in names:
+                names.add(key)
+                return os.path.join(directory, filename)
+
+            self.conflicts += 1
+            base_name, ext = os.path.splitext(filename)
+            counter_key = (directory, os.path.normcase(base_name), os.path.normcase(ext))
+            counter = self._counters.get(counter_key, 1)
+            while True:
+                new_filename = f"{base_name}_{counter}{ext}"
+                counter += 1
+                if os.path.normcase(new_filename) not in names:
+                    break
+            self._counters[counter_key] = counter
+            names.add(os.path.normcase(new_filename))
+            return os.path.join(directory, new_filename)
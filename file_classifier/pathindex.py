@@ -0,0 +1,83 @@
+"""
+路径前缀索引
+
+按路径分量组织的字典树, 判断一个路径是否位于某个已记录的目录之内 (或就是该目录),
+耗时只与路径深度有关, 与记录的目录数量无关
+"""
+import os
+
+# 字典树中标记"此处是一个已记录目录"的键
+_END = None
+
+
+def _components(path):
+    """规范化后的路径分量, 不区分大小写的系统上统一为小写"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path))).split(os.sep)
+
+
+class PathPrefixIndex:
+    """目录集合, 支持 add/update/discard/in/迭代, 并可按前缀快速判断"""
+
+    def __init__(self, paths=()):
+        self._trie = {}
+        self._paths = set()
+        self.update(paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._paths
+
+    def add(self, path):
+        """记录目录 (转换为绝对路径)"""
+        path = os.path.abspath(path)
+        if path in self._paths:
+            return
+        self._paths.add(path)
+        node = self._trie
+        for part in _components(path):
+            node = node.setdefault(part, {})
+        node[_END] = path
+
+    def update(self, paths):
+        for path in paths:
+            self.add(path)
+
+    def discard(self, path):
+        """移除目录, 并清理不再使用的树节点"""
+        path = os.path.abspath(path)
+        if path not in self._paths:
+            return
+        self._paths.discard(path)
+        trail = []
+        node = self._trie
+        for part in _components(path):
+            trail.append((node, part))
+            node = node[part]
+        node.pop(_END, None)
+        for parent, part in reversed(trail):
+            if parent[part]:
+                break
+            del parent[part]
+
+    def covers(self, path):
+        """路径是否为已记录的目录或位于其中"""
+        node = self._trie
+        for part in _components(path):
+            node = node.get(part)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def prune(self):
+        """移除已不存在的目录, 返回移除的目录"""
+        missing = [path for path in self._paths if not os.path.isdir(path)]
+        for path in missing:
+            self.discard(path)
+        return missing
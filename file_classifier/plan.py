@@ -0,0 +1,121 @@
+"""
+分类计划
+
+扫描与规则匹配的结果, 记录每个文件的 (源文件, 分类, 目标路径, 操作类型),
+可序列化为JSON Lines文件, 用于预演、比对以及在其他机器上执行
+"""
+import os
+import json
+from collections import namedtuple, Counter
+from datetime import datetime
+
+# 操作类型
+OP_MOVE = 'move'
+OP_COPY = 'copy'
+# 无法识别, 不做处理
+OP_SKIP = 'skip'
+
+PLAN_FORMAT_VERSION = 1
+
+# source/destination 为绝对路径(或相对当前目录), rel_path 为相对源目录的路径
+PlannedOperation = namedtuple('PlannedOperation', ['source', 'rel_path', 'category', 'destination', 'op'])
+
+
+class ClassificationPlan:
+    """分类计划"""
+
+    def __init__(self, src_dir, output_dir, move_files=True, recursive=False,
+                 preserve_structure=False, operations=None, created=None):
+        self.src_dir = src_dir
+        self.output_dir = output_dir
+        self.move_files = move_files
+        self.recursive = recursive
+        self.preserve_structure = preserve_structure
+        self.operations = operations if operations is not None else []
+        self.created = created or datetime.now().isoformat()
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def add(self, rel_path, category=None, destination=None, source=None):
+        """添加一个文件的处理计划, 没有分类时记为跳过"""
+        if category is None:
+            op = OP_SKIP
+        else:
+            op = OP_MOVE if self.move_files else OP_COPY
+        if source is None:
+            source = os.path.join(self.src_dir, rel_path)
+        self.operations.append(PlannedOperation(source, rel_path, category, destination, op))
+
+    @property
+    def transfers(self):
+        """需要实际移动/复制的操作"""
+        return [op for op in self.operations if op.op != OP_SKIP]
+
+    @property
+    def skipped(self):
+        """无法识别的文件"""
+        return [op for op in self.operations if op.op == OP_SKIP]
+
+    def sort_by_directory(self):
+        """按目标目录、源目录排序, 让同一目录下的操作相邻以提高局部性"""
+        self.operations.sort(key=lambda op: (
+            os.path.dirname(op.destination) if op.destination else '',
+            os.path.dirname(op.rel_path),
+            op.rel_path,
+        ))
+        return self
+
+    def summary(self):
+        """统计各分类的文件数量"""
+        counts = Counter(op.category for op in self.operations if op.op != OP_SKIP)
+        return {
+            'total': len(self.operations),
+            'transfers': sum(counts.values()),
+            'skipped': len(self.operations) - sum(counts.values()),
+            'categories': dict(sorted(counts.items())),
+        }
+
+    def _header(self):
+        return {
+            'version': PLAN_FORMAT_VERSION,
+            'src_dir': self.src_dir,
+            'output_dir': self.output_dir,
+            'move_files': self.move_files,
+            'recursive': self.recursive,
+            'preserve_structure': self.preserve_structure,
+            'created': self.created,
+        }
+
+    def save(self, path):
+        """
+        保存为JSON Lines
+
+        第一行为计划头, 之后每行为 [相对源路径, 分类, 相对输出目录的目标路径, 操作类型]
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self._header(), ensure_ascii=False) + '\n')
+            for op in self.operations:
+                rel_dst = os.path.relpath(op.destination, self.output_dir) if op.destination else None
+                f.write(json.dumps([op.rel_path, op.category, rel_dst, op.op], ensure_ascii=False) + '\n')
+
+    @classmethod
+    def load(cls, path):
+        """从JSON Lines文件加载计划"""
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != PLAN_FORMAT_VERSION:
+                raise ValueError(f"不支持的计划文件版本: {header.get('version')}")
+            plan = cls(header['src_dir'], header['output_dir'], header['move_files'],
+                       header['recursive'], header['preserve_structure'], created=header['created'])
+            for line in f:
+                if not line.strip():
+                    continue
+                rel_path, category, rel_dst, op = json.loads(line)
+                destination = os.path.join(plan.output_dir, rel_dst) if rel_dst else None
+                plan.operations.append(PlannedOperation(
+                    os.path.join(plan.src_dir, rel_path), rel_path, category, destination, op))
+        return plan
@@ -0,0 +1,235 @@
+"""
+运行剖析
+
+记录一次分类中各阶段的耗时, 以及每类操作 (规则匹配、输出目录判断、文件名冲突处理、
+创建目录、移动/复制、备份等) 的次数和耗时分布 (p50/p99)。
+耗时分布用对数分桶的直方图统计, 每条记录只做几次整数运算, 内存占用与记录数无关。
+需要函数级的细节时可以用 cProfile 剖析单次运行
+"""
+import cProfile
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager, nullcontext
+
+# 每个二进制数量级分为 4 个桶, 相对误差不超过 25%
+_SUB_BUCKET_BITS = 2
+
+
+def _bucket_upper(bucket):
+    """桶的上界 (纳秒)"""
+    limit = 1 << (_SUB_BUCKET_BITS + 1)
+    if bucket < limit:
+        return bucket
+    shift = (bucket >> _SUB_BUCKET_BITS) - 1
+    mantissa = bucket - (shift << _SUB_BUCKET_BITS)
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    操作耗时的直方图
+
+    只在一个线程中记录的操作不加锁; 在多个工作线程中记录时 threadsafe 应为True。
+    记录数由各桶合计得出, 每条记录只更新一个桶
+    """
+
+    def __init__(self, threadsafe=False):
+        self.total_ns = 0
+        self.max_ns = 0
+        # 64 位纳秒数的全部桶
+        self._buckets = [0] * ((64 << _SUB_BUCKET_BITS) + 8)
+        self._lock = None
+        if threadsafe:
+            self._lock = threading.Lock()
+            self.record = self._record_locked
+
+    def record(self, ns):
+        # 桶号: 低位直接对应, 其余按最高的 3 位二进制分桶
+        bits = ns.bit_length()
+        if bits > _SUB_BUCKET_BITS + 1:
+            shift = bits - _SUB_BUCKET_BITS - 1
+            bucket = (shift << _SUB_BUCKET_BITS) + (ns >> shift)
+        else:
+            bucket = ns
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self._buckets[bucket] += 1
+
+    def _record_locked(self, ns):
+        with self._lock:
+            LatencyHistogram.record(self, ns)
+
+    def _snapshot(self):
+        if self._lock is None:
+            return list(self._buckets)
+        with self._lock:
+            return list(self._buckets)
+
+    @property
+    def count(self):
+        return sum(self._buckets)
+
+    def percentile(self, q, buckets=None):
+        """第 q 百分位的耗时 (纳秒, 取所在桶的上界)"""
+        if buckets is None:
+            buckets = self._snapshot()
+        count = sum(buckets)
+        if not count:
+            return 0
+        rank = q / 100 * count
+        seen = 0
+        for bucket, n in enumerate(buckets):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper(bucket), self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        buckets = self._snapshot()
+        count = sum(buckets)
+        return {
+            'count': count,
+            'total': self.total_ns / 1e9,
+            'mean_us': self.total_ns / count / 1e3 if count else 0,
+            'p50_us': self.percentile(50, buckets) / 1e3,
+            'p99_us': self.percentile(99, buckets) / 1e3,
+            'max_us': self.max_ns / 1e3,
+        }
+
+
+class RunProfiler:
+    """
+    一次运行的剖析数据
+
+    phase() 记录阶段的墙钟时间, timed() / measure() 记录单个操作的耗时;
+    未启用时 timed() 直接返回原函数, measure() 返回空的上下文, 几乎没有开销
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # 阶段 -> [墙钟时间 (秒), 次数]
+        self.phases = {}
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, operation, threadsafe=False):
+        histogram = self.operations.get(operation)
+        if histogram is None:
+            with self._lock:
+                histogram = self.operations.setdefault(operation, LatencyHistogram(threadsafe))
+        return histogram
+
+    def add_phase(self, name, seconds):
+        """记录已在别处计时的阶段"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self.phases.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    @contextmanager
+    def _phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def phase(self, name):
+        """记录阶段耗时的上下文, 同名阶段累加"""
+        return self._phase(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _measure(self, histogram):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            histogram.record(time.perf_counter_ns() - start)
+
+    def measure(self, operation, threadsafe=False):
+        """记录单个操作耗时的上下文"""
+        return self._measure(self.histogram(operation, threadsafe)) if self.enabled else nullcontext()
+
+    def timed(self, operation, func, threadsafe=False):
+        """包装函数 (只传位置参数), 每次调用记录一次耗时; 在工作线程中调用时 threadsafe 应为True"""
+        if not self.enabled:
+            return func
+        record = self.histogram(operation, threadsafe).record
+        clock = time.perf_counter_ns
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return func(*args)
+            finally:
+                record(clock() - start)
+        return wrapper
+
+    def iterate(self, operation, iterable):
+        """逐个产出 iterable 的元素, 记录每次取下一个元素的耗时 (用于流式扫描)"""
+        if not self.enabled:
+            yield from iterable
+            return
+        record = self.histogram(operation).record
+        clock = time.perf_counter_ns
+        iterator = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                record(clock() - start)
+                return
+            record(clock() - start)
+            yield item
+
+    def report(self):
+        """可写入 JSON 的剖析结果"""
+        return {
+            'phases': {name: {'wall': wall, 'count': count} for name, (wall, count) in self.phases.items()},
+            'operations': {name: histogram.summary() for name, histogram in self.operations.items()
+                           if histogram.count},
+        }
+
+
+def _pad(text, width, left=False):
+    """按显示宽度 (中文字符占两列) 补齐"""
+    text = str(text)
+    fill = ' ' * max(width - sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text), 0)
+    return text + fill if left else fill + text
+
+
+def format_report(report):
+    """剖析结果的文本表格"""
+    lines = []
+    phases = report.get('phases') or {}
+    if phases:
+        lines.append(_pad('阶段', 24, True) + _pad('耗时(s)', 12) + _pad('次数', 10))
+        for name, phase in phases.items():
+            lines.append(_pad(name, 24, True) + f"{phase['wall']:>12.3f}{phase['count']:>10}")
+    operations = report.get('operations') or {}
+    if operations:
+        if lines:
+            lines.append('')
+        lines.append(_pad('操作', 24, True) + ''.join(_pad(title, 11) for title in
+                                                    ('次数', '合计(s)', 'p50(us)', 'p99(us)', '最大(us)')))
+        for name, op in sorted(operations.items(), key=lambda item: -item[1]['total']):
+            lines.append(_pad(name, 24, True) + f"{op['count']:>11}{op['total']:>11.3f}{op['p50_us']:>11.1f}"
+                         f"{op['p99_us']:>11.1f}{op['max_us']:>11.1f}")
+    return lines
+
+
+@contextmanager
+def cprofile_to(path):
+    """用 cProfile 剖析代码块 (仅当前线程), 结果写入 path, 可用 pstats 或 snakeviz 查看"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,70 @@
+"""
+进度事件合并
+
+分类时每处理一个文件都会触发进度回调, 直接转发给界面会在海量文件时淹没事件队列;
+这里按时间间隔合并事件, 每次只转发汇总后的进度、速度、剩余时间及最近处理的文件名
+"""
+import time
+from collections import deque, namedtuple
+
+# current/total: 进度, filename: 最近处理的文件, rate: 每秒处理文件数, eta: 预计剩余秒数,
+# recent: 本批次中最近处理的文件名, dropped: 本批次中未列出的文件数量
+ProgressEvent = namedtuple('ProgressEvent', ['current', 'total', 'filename', 'rate', 'eta', 'recent', 'dropped'])
+
+
+class ProgressThrottle:
+    """
+    进度节流器
+
+    可直接作为 classify_files/execute_plan 的 callback 使用,
+    每 interval 秒最多调用一次 handler, 处理完最后一个文件时总会调用
+    """
+
+    def __init__(self, handler, interval=0.1, max_recent=50, clock=time.monotonic):
+        self.handler = handler
+        self.interval = interval
+        self.clock = clock
+        self._recent = deque(maxlen=max_recent)
+        self._batch = 0
+        self._start = None
+        self._last_emit = None
+        self._last = None
+
+    def __call__(self, current, total, filename):
+        now = self.clock()
+        if self._start is None:
+            self._start = self._last_emit = now
+        self._recent.append(filename)
+        self._batch += 1
+        self._last = (current, total, filename)
+        if current >= total or now - self._last_emit >= self.interval:
+            self._emit(now)
+
+    def flush(self):
+        """转发尚未发出的进度"""
+        if self._batch:
+            self._emit(self.clock())
+
+    def _emit(self, now):
+        current, total, filename = self._last
+        elapsed = now - self._start
+        rate = current / elapsed if elapsed > 0 else 0.0
+        eta = (total - current) / rate if rate > 0 else None
+        recent = list(self._recent)
+        dropped = self._batch - len(recent)
+        self._recent.clear()
+        self._batch = 0
+        self._last_emit = now
+        self.handler(ProgressEvent(current, total, filename, rate, eta, recent, dropped))
+
+
+def format_eta(seconds):
+    """格式化剩余时间"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,80 @@
+"""
+规则缓存
+
+规则文件 (YAML) 解析较慢, 规则很多时启动需要数秒。解析后的规则数据以 JSON 保存在
+规则文件旁边, 以规则文件内容的哈希和默认规则的指纹校验, 任何一方变化都会重新解析。
+缓存只含普通的字典、列表和字符串, 不会执行其中的任何内容; 匹配器由规则数据重新编译。
+YAML 文件仍是唯一可编辑的规则来源, 缓存可随时删除
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import yaml
+
+RULE_CACHE_VERSION = 2
+
+# 安装 libyaml 时使用 C 实现的解析器
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def cache_path(config_file):
+    """规则缓存文件路径: 规则文件同目录下的隐藏文件"""
+    directory, name = os.path.split(os.path.abspath(config_file))
+    return os.path.join(directory, f".{name}.cache")
+
+
+def _fingerprint(source, defaults):
+    digest = hashlib.blake2b(source, digest_size=16)
+    digest.update(json.dumps(sorted(defaults.items()), ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_rules_file(config_file, defaults):
+    """
+    读取规则文件, 缓存有效时直接使用缓存
+
+    Args:
+        config_file: 规则文件路径
+        defaults: 默认分类规则, 参与校验
+
+    Returns:
+        tuple: (规则文件数据, 是否命中缓存)
+    """
+    with open(config_file, 'rb') as f:
+        source = f.read()
+    fingerprint = _fingerprint(source, defaults)
+    try:
+        with open(cache_path(config_file), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == RULE_CACHE_VERSION and cached.get('fingerprint') == fingerprint:
+            return cached['data'], True
+    except (OSError, ValueError, AttributeError):
+        # 缓存不存在、损坏或来自不兼容的版本
+        pass
+    data = yaml.load(source.decode('utf-8'), Loader=SafeLoader)
+    return data, False
+
+
+def write_rule_cache(config_file, defaults, data):
+    """按规则文件当前内容写入缓存, 先写临时文件再重命名"""
+    with open(config_file, 'rb') as f:
+        fingerprint = _fingerprint(f.read(), defaults)
+    path = cache_path(config_file)
+    fd, tmp_path = tempfile.mkstemp(prefix='.rules_cache_', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # YAML 中的日期等类型按字符串保存
+            json.dump({
+                'version': RULE_CACHE_VERSION,
+                'fingerprint': fingerprint,
+                'data': data,
+            }, f, ensure_ascii=False, separators=(',', ':'), default=str)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,489 @@
+"""
+分类规则匹配
+
+规则表 (扩展名 -> 分类) 的键支持三种写法:
+    - 扩展名, 可以包含多段: ``jpg``、``tar.gz``、``d.ts``
+    - 通配符: 包含 ``*`` ``?`` ``[`` 的键, 匹配整个文件名, 如 ``*.min.js``、``IMG_*``
+    - 正则表达式: 以 ``re:`` 开头的键, 匹配整个文件名, 如 ``re:^DSC\\d+\\.jpg$``
+
+规则变更后编译为匹配器: 扩展名及 ``*.扩展名`` 形式的通配符放入按后缀倒序的字典树,
+其余通配符和正则按其固定的开头或结尾 (如 ``IMG_*`` 的 ``img_``) 分组, 每组合并为一个正则表达式
+(含捕获组的正则单独编译), 匹配时只运行文件名开头或结尾相符的组。匹配均不区分大小写, 优先级固定为:
+正则 > 通配符 > 最长的扩展名, 同类规则中模式越长越优先, 与规则的添加顺序无关
+"""
+import bisect
+import fnmatch
+import re
+
+try:
+    from re import _parser as _re_parser
+except ImportError:  # Python < 3.11
+    import sre_parse as _re_parser
+
+REGEX_PREFIX = 're:'
+GLOB_CHARS = frozenset('*?[')
+
+# 规则种类, 数值越小优先级越高
+KIND_REGEX = 0
+KIND_GLOB = 1
+KIND_SUFFIX = 2
+
+
+def normalize_rule(pattern):
+    """规范化规则键: 正则保持原样, 其余转为小写并去掉开头的点"""
+    if pattern.startswith(REGEX_PREFIX):
+        return pattern
+    return pattern.lower().lstrip('.')
+
+
+def rule_kind(pattern):
+    """判断规则种类"""
+    if pattern.startswith(REGEX_PREFIX):
+        return KIND_REGEX
+    if GLOB_CHARS.intersection(pattern):
+        return KIND_GLOB
+    return KIND_SUFFIX
+
+
+def _glob_suffix(pattern):
+    """``*.tar.gz`` 形式的通配符等价于扩展名规则, 返回其扩展名, 否则返回None"""
+    if pattern.startswith('*.') and not GLOB_CHARS.intersection(pattern[2:]):
+        return pattern[2:]
+    return None
+
+
+def _glob_anchors(pattern):
+    """通配符中固定的开头和结尾 (小写), 匹配的文件名必定以其开头、结尾"""
+    pattern = pattern.lower()
+    first = min((pattern.find(c) for c in '*?[' if c in pattern), default=len(pattern))
+    last = max(pattern.rfind(c) for c in '*?[]')
+    return pattern[:first], pattern[last + 1:]
+
+
+def _regex_anchors(source):
+    """正则中固定的开头和结尾 (小写), 无法分析时为空"""
+    try:
+        items = list(_re_parser.parse(source))
+    except Exception:
+        return '', ''
+    anchors = []
+    for ops, skip in ((items, (_re_parser.AT_BEGINNING, _re_parser.AT_BEGINNING_STRING)),
+                      (items[::-1], (_re_parser.AT_END, _re_parser.AT_END_STRING))):
+        literal = []
+        for index, (op, value) in enumerate(ops):
+            if op is _re_parser.LITERAL:
+                literal.append(chr(value))
+            elif not (index == 0 and op is _re_parser.AT and value in skip):
+                break
+        anchors.append(''.join(literal).lower())
+    return anchors[0], anchors[1][::-1]
+
+
+def _has_groups(source):
+    """正则是否含有捕获组 (包括命名分组), 无法分析时视为含有"""
+    try:
+        parsed = _re_parser.parse(source)
+    except Exception:
+        return True
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    return state.groups > 1
+
+
+_GLOBAL_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+
+
+def _scoped_flags(source):
+    """开头的全局标志 ``(?i)`` 改写为作用域标志 ``(?i:...)``, 以便与其他规则合并"""
+    m = _GLOBAL_FLAGS.match(source)
+    if not m:
+        return source
+    # 详细模式下行尾的注释不能吞掉右括号
+    return f"(?{m.group(1)}:{source[m.end():]}\n)" if 'x' in m.group(1) else f"(?{m.group(1)}:{source[m.end():]})"
+
+
+class _PatternGroup:
+    """开头或结尾相同的一组通配符/正则, 合并为一个正则表达式"""
+
+    def __init__(self):
+        # [(优先级, 分类, 规则, 正则源)], 按优先级排列
+        self.branches = []
+        self.pattern = None
+        # 合并正则中的分组名 -> (优先级, 分类)
+        self.categories = {}
+        # 单独编译的正则: [(优先级, 分类, 编译后的正则)]
+        # 含捕获组的正则合并后分组编号改变 (反向引用失效), 命名分组还可能与其他规则重名
+        self.solo = []
+
+    def add(self, index, category, key, source, solo=False):
+        if solo:
+            self.solo.append((index, category, re.compile(f"(?:{source})\\Z", re.IGNORECASE)))
+        else:
+            self.branches.append((index, category, key, source))
+
+    def compile(self, on_error=None):
+        branches = [(f"_rule{index}", index, category, key, f"(?P<_rule{index}>(?:{source})\\Z)")
+                    for index, category, key, source in self.branches]
+        self.branches = None
+        if not branches:
+            return
+        try:
+            self.pattern = re.compile('|'.join(wrapped for *_, wrapped in branches), re.IGNORECASE)
+            self.categories = {name: (index, category) for name, index, category, _, _ in branches}
+        except re.error:
+            # 无法合并时逐条单独编译, 出错的规则交给 on_error 并跳过
+            for _, index, category, key, wrapped in branches:
+                try:
+                    self.solo.append((index, category, re.compile(wrapped, re.IGNORECASE)))
+                except re.error as e:
+                    if on_error:
+                        on_error(key, e)
+            self.solo.sort(key=lambda item: item[0])
+
+    def match(self, filename):
+        """组内优先级最高的匹配 (优先级, 分类), 没有时返回None"""
+        best = None
+        if self.pattern is not None:
+            m = self.pattern.match(filename)
+            if m:
+                best = self.categories[m.lastgroup]
+        for index, category, pattern in self.solo:
+            if best is not None and best[0] < index:
+                break
+            if pattern.match(filename):
+                return index, category
+        return best
+
+
+class RuleDict(dict):
+    """
+    分类规则表, 每次修改递增版本号, 用于判断匹配器是否需要重新编译
+
+    listeners 中的回调在每次修改后以变更列表 [(规则, 原分类, 新分类), ...] 调用,
+    新增时原分类为None, 删除时新分类为None; 整个规则表被替换时以None调用
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self.listeners = []
+
+    def _changed(self, changes=()):
+        self.version += 1
+        if changes is None or changes:
+            for listener in self.listeners:
+                listener(changes)
+
+    def __setitem__(self, key, value):
+        old = self.get(key)
+        super().__setitem__(key, value)
+        self._changed([(key, old, value)] if old != value else ())
+
+    def __delitem__(self, key):
+        old = self[key]
+        super().__delitem__(key)
+        self._changed([(key, old, None)])
+
+    def clear(self):
+        changes = [(key, old, None) for key, old in self.items()] if self.listeners else ()
+        super().clear()
+        self._changed(changes)
+
+    def update(self, *args, **kwargs):
+        rules = dict(*args, **kwargs)
+        changes = [(key, self.get(key), value) for key, value in rules.items()
+                   if self.get(key) != value] if self.listeners else ()
+        super().update(rules)
+        self._changed(changes)
+
+    def pop(self, key, *default):
+        present = key in self
+        value = super().pop(key, *default)
+        self._changed([(key, value, None)] if present else ())
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed([(item[0], item[1], None)])
+        return item
+
+    def setdefault(self, key, default=None):
+        present = key in self
+        value = super().setdefault(key, default)
+        self._changed(() if present else [(key, None, value)])
+        return value
+
+
+class NgramIndex:
+    """
+    子串搜索索引: 字符串中长度 1~n 的每个片段 -> 包含该片段的字符串
+
+    不超过 n 个字符的查询直接取片段对应的集合, 更长的查询取各 n 元片段集合的交集后逐个核对。
+    不区分大小写
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self._grams = {}
+        self._texts = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _grams_of(self, text):
+        return {text[i:i + size] for size in range(1, self.n + 1) for i in range(len(text) - size + 1)}
+
+    def add(self, key):
+        if key in self._texts:
+            return
+        text = key.lower()
+        self._texts[key] = text
+        for gram in self._grams_of(text):
+            self._grams.setdefault(gram, set()).add(key)
+
+    def discard(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams_of(text):
+            keys = self._grams[gram]
+            keys.discard(key)
+            if not keys:
+                del self._grams[gram]
+
+    def clear(self):
+        self._grams.clear()
+        self._texts.clear()
+
+    def search(self, query):
+        """返回包含 query 的全部字符串"""
+        query = query.lower()
+        if not query:
+            return set(self._texts)
+        if len(query) <= self.n:
+            return set(self._grams.get(query, ()))
+        candidates = []
+        for i in range(len(query) - self.n + 1):
+            keys = self._grams.get(query[i:i + self.n])
+            if not keys:
+                return set()
+            candidates.append(keys)
+        candidates.sort(key=len)
+        return {key for key in candidates[0].intersection(*candidates[1:]) if query in self._texts[key]}
+
+
+class CategoryIndex:
+    """
+    分类 -> 规则 的有序索引, 分类和分类下的规则均按名称排序, 可按变更增量更新
+
+    同时维护分类名和规则的子串搜索索引, 供规则搜索使用
+    """
+
+    def __init__(self, rules=None):
+        self.names = []
+        self._groups = {}
+        # 规则 -> 分类
+        self._category_of = {}
+        self._rule_search = NgramIndex()
+        self._category_search = NgramIndex()
+        if rules:
+            self.rebuild(rules)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, category):
+        return category in self._groups
+
+    def rebuild(self, rules):
+        """按完整的规则表重建索引"""
+        groups = {}
+        for rule, category in rules.items():
+            groups.setdefault(category, []).append(rule)
+        for members in groups.values():
+            members.sort()
+        self._groups = groups
+        self.names = sorted(groups)
+        self._category_of = dict(rules)
+        self._rule_search.clear()
+        self._category_search.clear()
+        for rule in rules:
+            self._rule_search.add(rule)
+        for category in groups:
+            self._category_search.add(category)
+
+    def rules(self, category):
+        """分类下的规则 (有序), 不存在的分类返回空列表"""
+        return self._groups.get(category, [])
+
+    def category_row(self, category):
+        """分类的位置, 不存在时为-1"""
+        row = bisect.bisect_left(self.names, category)
+        if row < len(self.names) and self.names[row] == category:
+            return row
+        return -1
+
+    def rule_row(self, category, rule):
+        """规则在分类中的位置, 不存在时为-1"""
+        members = self._groups.get(category, [])
+        row = bisect.bisect_left(members, rule)
+        if row < len(members) and members[row] == rule:
+            return row
+        return -1
+
+    def insert_position(self, category, rule):
+        """
+        添加规则前计算插入位置
+
+        Returns:
+            tuple: (分类位置, 是否为新分类, 规则在分类中的位置)
+        """
+        members = self._groups.get(category)
+        if members is None:
+            return bisect.bisect_left(self.names, category), True, 0
+        return self.category_row(category), False, bisect.bisect_left(members, rule)
+
+    def add(self, category, rule):
+        members = self._groups.get(category)
+        if members is None:
+            self._groups[category] = [rule]
+            bisect.insort(self.names, category)
+            self._category_search.add(category)
+        else:
+            bisect.insort(members, rule)
+        self._category_of[rule] = category
+        self._rule_search.add(rule)
+
+    def remove(self, category, rule):
+        """移除规则, 分类下没有规则时一并移除分类"""
+        members = self._groups[category]
+        del members[self.rule_row(category, rule)]
+        self._category_of.pop(rule, None)
+        self._rule_search.discard(rule)
+        if not members:
+            del self._groups[category]
+            del self.names[self.category_row(category)]
+            self._category_search.discard(category)
+
+    def search(self, text):
+        """
+        搜索分类名或规则中包含 text 的分类
+
+        Returns:
+            tuple: (分类名匹配的分类集合, 有规则匹配的分类集合)
+        """
+        return (self._category_search.search(text),
+                {self._category_of[rule] for rule in self._rule_search.search(text)})
+
+
+class RuleMatcher:
+    """编译后的规则匹配器"""
+
+    def __init__(self, categories, on_error=None):
+        # 后缀字典树: 每个节点为 {扩展名的一段: 子节点}, 分类存放在 None 键下
+        self._trie = {}
+        # 按固定开头/结尾分组的通配符和正则: {开头: 组}, {结尾: 组}, 没有固定部分的组
+        self._prefix_groups = {}
+        self._suffix_groups = {}
+        self._other_group = None
+        # 出现过的开头/结尾长度, 匹配时按长度截取文件名查组
+        self._prefix_lengths = ()
+        self._suffix_lengths = ()
+        self.suffix_rules = 0
+        self.pattern_rules = 0
+
+        patterns = []
+        for key, category in categories.items():
+            kind = rule_kind(key)
+            suffix = key if kind == KIND_SUFFIX else _glob_suffix(key.lower()) if kind == KIND_GLOB else None
+            if suffix is not None:
+                self._insert(suffix.lower().lstrip('.'), category)
+                continue
+            if kind == KIND_REGEX:
+                source = _scoped_flags(key[len(REGEX_PREFIX):])
+                try:
+                    re.compile(source)
+                except re.error as e:
+                    if on_error:
+                        on_error(key, e)
+                    continue
+            else:
+                source = fnmatch.translate(key)
+            patterns.append((kind, -len(key), key, source, category))
+
+        # 排序后的位置即优先级, 组内按顺序组成分支, 先匹配的分支优先
+        patterns.sort(key=lambda p: p[:3])
+        groups = []
+        for index, (kind, _, key, source, category) in enumerate(patterns):
+            prefix, suffix = _regex_anchors(source) if kind == KIND_REGEX else _glob_anchors(key)
+            # 取较长的固定部分分组, 区分度更高
+            if suffix and len(suffix) >= len(prefix):
+                group = self._suffix_groups.get(suffix)
+                if group is None:
+                    group = self._suffix_groups[suffix] = _PatternGroup()
+            elif prefix:
+                group = self._prefix_groups.get(prefix)
+                if group is None:
+                    group = self._prefix_groups[prefix] = _PatternGroup()
+            else:
+                if self._other_group is None:
+                    self._other_group = _PatternGroup()
+                group = self._other_group
+            group.add(index, category, key, source, solo=kind == KIND_REGEX and _has_groups(source))
+            groups.append(group)
+        for group in set(groups):
+            group.compile(on_error)
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._prefix_groups})
+        self._suffix_lengths = sorted({len(suffix) for suffix in self._suffix_groups})
+        self.pattern_rules = len(patterns)
+
+    def _pattern_match(self, filename, lowered):
+        """通配符和正则中优先级最高的匹配, 没有时返回None"""
+        groups = []
+        if self._other_group is not None:
+            groups.append(self._other_group)
+        size = len(lowered)
+        for length in self._prefix_lengths:
+            if length > size:
+                break
+            group = self._prefix_groups.get(lowered[:length])
+            if group is not None:
+                groups.append(group)
+        for length in self._suffix_lengths:
+            if length > size:
+                break
+            group = self._suffix_groups.get(lowered[size - length:])
+            if group is not None:
+                groups.append(group)
+        best = None
+        for group in groups:
+            found = group.match(filename)
+            if found is not None and (best is None or found[0] < best[0]):
+                best = found
+        return best[1] if best else None
+
+    def _insert(self, suffix, category):
+        node = self._trie
+        for part in reversed(suffix.split('.')):
+            node = node.setdefault(part, {})
+        if None not in node:
+            self.suffix_rules += 1
+        node[None] = category
+
+    def match(self, filename):
+        """返回文件名对应的分类, 没有匹配的规则时返回None"""
+        lowered = filename.lower()
+        if self.pattern_rules:
+            category = self._pattern_match(filename, lowered)
+            if category is not None:
+                return category
+        # 从最后一段扩展名开始沿字典树向前匹配, 取最长的后缀
+        # 第一段是文件名本身, 不参与匹配; 以点开头的文件 (如 .gitignore) 第一段为空
+        parts = lowered.split('.')
+        category = None
+        node = self._trie
+        for i in range(len(parts) - 1, 0, -1):
+            node = node.get(parts[i])
+            if node is None:
+                break
+            category = node.get(None, category)
+        return category
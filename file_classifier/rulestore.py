@@ -0,0 +1,165 @@
+"""
+规则持久化
+
+规则变更先在内存中合并, 在 delay 秒内没有新的变更后由后台线程写入一次:
+写入临时文件并 fsync 后重命名覆盖规则文件, 中途崩溃不会留下不完整的规则文件。
+每次写入前备份旧文件, 只保留最近 retention 个备份。程序退出时写入尚未保存的变更
+"""
+import atexit
+import os
+import shutil
+import stat
+import threading
+import uuid
+import weakref
+from datetime import datetime
+
+import yaml
+
+BACKUP_PREFIX = 'rules_backup_'
+
+# 尚未关闭的规则存储, 退出时统一写入
+_open_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_open_stores):
+        store.flush()
+
+
+def _create_temp(directory):
+    """
+    在目录中独占创建临时文件, 返回 (文件描述符, 路径)
+
+    与 mkstemp 的 0600 不同, 以 0666 创建, 由系统按 umask 决定新文件的权限
+    """
+    while True:
+        path = os.path.join(directory, f".rules_{uuid.uuid4().hex[:12]}.tmp")
+        try:
+            return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666), path
+        except FileExistsError:
+            continue
+
+
+class RuleStore:
+    """
+    规则文件存储
+
+    Args:
+        path: 规则文件路径
+        backup_dir: 备份目录
+        delay: 合并变更的时间窗口 (秒), 为0时同步写入
+        retention: 保留的备份数量, 为0时不备份
+        log: 日志回调
+    """
+
+    def __init__(self, path, backup_dir, delay=1.0, retention=10, log=None):
+        self.path = path
+        self.backup_dir = backup_dir
+        self.delay = delay
+        self.retention = retention
+        self.log = log
+        self.writes = 0
+        # 写入成功后的回调, 参数为写入的数据
+        self.on_written = None
+        self._data = None
+        self._lock = threading.Lock()
+        # 串行化写入, flush 与后台写入不会同时进行
+        self._write_lock = threading.Lock()
+        self._timer = None
+        _open_stores.add(self)
+
+    def _log(self, message):
+        if self.log:
+            self.log(message)
+
+    def schedule(self, data):
+        """提交最新的规则数据, 时间窗口内的多次提交只写入最后一次"""
+        with self._lock:
+            self._data = data
+            if self._timer is not None:
+                self._timer.cancel()
+            if self.delay <= 0:
+                self._timer = None
+            else:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.delay <= 0:
+            self.flush()
+
+    @property
+    def pending(self):
+        """是否有尚未写入的变更"""
+        return self._data is not None
+
+    def flush(self):
+        """立即写入尚未保存的变更"""
+        with self._write_lock:
+            with self._lock:
+                data, self._data = self._data, None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if data is None:
+                return
+            try:
+                self.backup()
+                self._write(data)
+                self.writes += 1
+                self._log("分类规则已自动保存")
+            except Exception as e:
+                self._log(f"保存规则失败: {e}")
+                return
+            if self.on_written:
+                self.on_written(data)
+
+    def _write(self, data):
+        """写入临时文件后重命名覆盖, 保证规则文件完整"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = _create_temp(directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                yaml.dump(data, f, indent=2, allow_unicode=True, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+                f.flush()
+                os.fsync(f.fileno())
+            # 覆盖已有文件时保留其权限
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def backup(self):
+        """备份现有规则文件, 并删除超出保留数量的旧备份"""
+        if self.retention <= 0 or not os.path.exists(self.path):
+            return
+        os.makedirs(self.backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        backup_file = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{timestamp}.yaml")
+        try:
+            shutil.copy2(self.path, backup_file)
+            self._log(f"规则已备份到: {backup_file}")
+        except Exception as e:
+            self._log(f"备份失败: {e}")
+            return
+        backups = sorted(name for name in os.listdir(self.backup_dir)
+                         if name.startswith(BACKUP_PREFIX) and name.endswith('.yaml'))
+        for name in backups[:-self.retention]:
+            try:
+                os.unlink(os.path.join(self.backup_dir, name))
+            except OSError:
+                pass
+
+    def close(self):
+        """写入尚未保存的变更"""
+        self.flush()
+        _open_stores.discard(self)
@@ -0,0 +1,65 @@
+"""
+目录扫描
+
+基于 os.scandir 的流式扫描器, 逐个产出文件, 复用 DirEntry 自带的类型信息,
+并在进入子目录之前剪除被排除的目录
+"""
+import os
+from collections import namedtuple
+
+# path: 完整路径, name: 文件名, rel_path: 相对源目录的路径, entry: os.DirEntry
+ScanEntry = namedtuple('ScanEntry', ['path', 'name', 'rel_path', 'entry'])
+
+
+def scan_files(src_dir, recursive=False, exclude=None, on_error=None):
+    """
+    流式扫描源目录下的文件
+
+    Args:
+        src_dir: 源目录
+        recursive: 是否递归处理子文件夹
+        exclude: 判断路径是否需要排除的函数, 递归时作用于目录, 非递归时作用于文件
+        on_error: 目录无法读取时的回调, 参数为 OSError
+
+    Yields:
+        ScanEntry
+    """
+    if recursive and exclude and exclude(src_dir):
+        return
+
+    # (目录路径, 相对路径)
+    stack = [(src_dir, '')]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                    if not recursive:
+                        # 只处理当前目录中的普通文件
+                        try:
+                            is_file = entry.is_file()
+                        except OSError:
+                            continue
+                        if is_file and not (exclude and exclude(entry.path)):
+                            yield ScanEntry(entry.path, entry.name, rel_path, entry)
+                        continue
+
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        # 与 os.walk 一致, 不进入符号链接指向的目录
+                        if not entry.is_symlink() and not (exclude and exclude(entry.path)):
+                            subdirs.append((entry.path, rel_path))
+                    else:
+                        yield ScanEntry(entry.path, entry.name, rel_path, entry)
+        except OSError as e:
+            if on_error:
+                on_error(e)
+            continue
+        # 逆序入栈, 保持与目录列出顺序一致的深度优先遍历
+        stack.extend(reversed(subdirs))
+
@@ -0,0 +1,160 @@
+"""
+设置管理
+
+不依赖Qt, GUI中传入QSettings作为存储后端, 命令行/无界面环境下使用内存存储
+"""
+
+
+def _convert(value, type_):
+    """按QSettings的习惯转换取出的值"""
+    if type_ is None or value is None:
+        return value
+    if type_ is bool and isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'on')
+    return type_(value)
+
+
+class MemorySettings:
+    """内存设置存储, 接口与QSettings中用到的部分保持一致"""
+
+    def __init__(self, values=None):
+        self._values = dict(values or {})
+
+    def value(self, key, default=None, type=None):
+        return _convert(self._values.get(key, default), type)
+
+    def setValue(self, key, value):
+        self._values[key] = value
+
+    def allKeys(self):
+        return list(self._values)
+
+    def clear(self):
+        self._values.clear()
+
+    def sync(self):
+        pass
+
+
+class SettingsManager:
+    """设置管理器"""
+
+    def __init__(self, settings=None):
+        # 存储后端: QSettings 或 MemorySettings
+        self.settings = settings if settings is not None else MemorySettings()
+        self._load_default_settings()
+        # 初次启动
+        if not self.settings.allKeys():
+            self.reset_to_defaults()
+
+    def _load_default_settings(self):
+        """加载默认设置"""
+        self.default_settings = {
+            ## 常规设置
+            # 自动保存程序设置
+            'auto_save_settings': True,
+            # 安全操作
+            'confirm_action': True,
+            # 日志等级
+            'log_level': '详细',
+            # 内存中保留的日志记录数
+            'log_buffer_size': 10000,
+            # 日志文件, 留空则不写入文件
+            'log_file': '',
+            # 日志文件超过该大小 (MB) 后滚动
+            'log_file_max_mb': 10,
+            # 保留的旧日志文件数
+            'log_file_backups': 5,
+
+            ## 界面设置
+            # 主题
+            'theme': '默认',
+            # 字体大小
+            'font_size': 10,
+            # 最大日志行数
+            'max_log_lines': 5000,
+            # 进度刷新频率 (次/秒), 进度事件按此合并
+            'progress_updates_per_second': 10,
+
+            ## 分类设置
+            # 默认输出路径
+            'default_output_pattern': './{date}_{id}_分类',
+            # 是否移动文件
+            'move_files': True,
+            # 是否递归处理子文件夹
+            'recursive': True,
+            # 是否保持原有子目录结构
+            'preserve_structure': True,
+            # 是否清空源文件夹
+            'remove_empty_folders': False,
+            # 是否排除输出路径
+            'exclude_output_dirs': True,
+            # 加载规则时移除输出目录历史中已不存在的目录
+            'prune_output_history': True,
+            # 分类前备份源文件并校验
+            'backup_and_verify_source': False,
+            # 备份方式: auto(自动选择) / hardlink(硬链接) / reflink(写时复制克隆) / copy(完整复制)
+            'backup_strategy': 'auto',
+            # 校验时比对文件内容哈希 (默认只核对文件是否存在)
+            'verify_checksum': False,
+            # 内容校验哈希算法: blake2b / sha256, 安装xxhash后可用 xxh3_128 / xxh64
+            'checksum_algorithm': 'blake2b',
+            # 分类时在输出目录中保存检查点, 中断后可恢复
+            'enable_checkpoint': True,
+            # 分类时在输出目录中写入操作日志, 用于撤销
+            'enable_journal': True,
+            # 并发执行文件操作的线程数, 0为按目标设备自动选择
+            'io_workers': 0,
+            # 扩展名无法识别的文件按文件头内容识别分类
+            'content_sniffing': False,
+            # 内容识别时每个文件最多读取的字节数
+            'sniff_max_bytes': 4096,
+            # 复制模式下缓存已分类的文件, 再次分类时跳过未变更的文件
+            'enable_cache': False,
+            # 缓存文件路径, 留空使用用户缓存目录
+            'cache_path': '',
+            # 缓存最多保留的文件数
+            'cache_max_entries': 1000000,
+            # 增量分类时, 源文件已删除则删除其副本
+            'propagate_deletions': False,
+            # 监视模式下文件多少秒内不再变化视为写入完成
+            'watch_settle_seconds': 2,
+
+            ## 高级设置
+            # 自动保存分类规则
+            'auto_save_rules': True,
+            # 备份分类规则
+            'backup_rules': True,
+            # 保留的规则备份数量
+            'rule_backup_retention': 10,
+            # 规则变更合并写入的时间窗口 (毫秒)
+            'rule_save_delay_ms': 1000,
+            # 在规则文件旁保存编译后的规则缓存, 加快启动
+            'rule_cache': True,
+            # 记录每次运行各阶段及各类操作的耗时
+            'enable_profiling': True,
+        }
+
+    def get(self, key, default=None):
+        """获取设置值"""
+        if default is None:
+            default = self.default_settings.get(key)
+        return self.settings.value(key, default)
+
+    def set(self, key, value):
+        """设置值"""
+        self.settings.setValue(key, value)
+
+    def get_bool(self, key):
+        """获取布尔值设置"""
+        return self.settings.value(key, self.default_settings.get(key, False), type=bool)
+
+    def get_int(self, key):
+        """获取整数值设置"""
+        return self.settings.value(key, self.default_settings.get(key, 0), type=int)
+
+    def reset_to_defaults(self):
+        """重置为默认设置"""
+        self.settings.clear()
+        for key, value in self.default_settings.items():
+            self.settings.setValue(key, value)
@@ -0,0 +1,150 @@
+"""
+文件内容识别
+
+扩展名规则无法识别的文件 (无扩展名或扩展名未知), 读取文件开头少量字节,
+按内置的文件头特征表判断分类。每个文件只做一次定长读取, 读取量有上限
+"""
+import os
+import stat
+
+# 每个文件最多读取的字节数
+DEFAULT_SNIFF_BYTES = 4096
+
+# 文件头特征: (偏移, 特征字节, 分类), 按顺序匹配, 更具体的特征在前
+SIGNATURES = [
+    # 图片
+    (0, b'\x89PNG\r\n\x1a\n', 'Images'),
+    (0, b'\xff\xd8\xff', 'Images'),
+    (0, b'GIF87a', 'Images'),
+    (0, b'GIF89a', 'Images'),
+    (0, b'BM', 'Images'),
+    (0, b'II*\x00', 'Images'),
+    (0, b'MM\x00*', 'Images'),
+    (0, b'\x00\x00\x01\x00', 'Images'),
+    (8, b'WEBP', 'Images'),
+    (4, b'ftypheic', 'Images'),
+    (4, b'ftypheix', 'Images'),
+    (4, b'ftypavif', 'Images'),
+    (0, b'8BPS', 'Images'),
+    # 音频
+    (0, b'ID3', 'Audio'),
+    (0, b'\xff\xfb', 'Audio'),
+    (0, b'\xff\xf3', 'Audio'),
+    (0, b'fLaC', 'Audio'),
+    (0, b'OggS', 'Audio'),
+    (8, b'WAVE', 'Audio'),
+    (4, b'ftypM4A', 'Audio'),
+    (0, b'MThd', 'Audio'),
+    # 视频
+    (8, b'AVI ', 'Videos'),
+    (4, b'ftyp', 'Videos'),
+    (0, b'\x1aE\xdf\xa3', 'Videos'),
+    (0, b'FLV', 'Videos'),
+    (0, b'\x00\x00\x01\xba', 'Videos'),
+    (0, b'0&\xb2u\x8ef\xcf\x11', 'Videos'),
+    # 文档
+    (0, b'%PDF-', 'PDF'),
+    (0, b'{\\rtf', 'Documents'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'Documents'),
+    # 电子书 (zip 容器, 需在压缩包之前匹配)
+    (30, b'mimetypeapplication/epub+zip', 'eBooks'),
+    (60, b'BOOKMOBI', 'eBooks'),
+    # 压缩包
+    (0, b'PK\x03\x04', 'Archives'),
+    (0, b'PK\x05\x06', 'Archives'),
+    (0, b'Rar!\x1a\x07', 'Archives'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'Archives'),
+    (0, b'\x1f\x8b', 'Archives'),
+    (0, b'BZh', 'Archives'),
+    (0, b'\xfd7zXZ\x00', 'Archives'),
+    (0, b'\x28\xb5\x2f\xfd', 'Archives'),
+    (257, b'ustar', 'Archives'),
+    # 可执行文件
+    (0, b'\x7fELF', 'Executables'),
+    (0, b'MZ', 'Executables'),
+    (0, b'\xcf\xfa\xed\xfe', 'Executables'),
+    (0, b'\xca\xfe\xba\xbe', 'Executables'),
+    # 数据库
+    (0, b'SQLite format 3\x00', 'Database'),
+    # 字体
+    (0, b'wOFF', 'Fonts'),
+    (0, b'wOF2', 'Fonts'),
+    (0, b'OTTO', 'Fonts'),
+    (0, b'\x00\x01\x00\x00\x00', 'Fonts'),
+    # 种子
+    (0, b'd8:announce', 'Torrents'),
+    # 脚本
+    (0, b'#!/', 'Code'),
+    (0, b'<?php', 'Code'),
+]
+
+# 特征所需的最少字节数
+SIGNATURE_BYTES = max(offset + len(magic) for offset, magic, _ in SIGNATURES)
+# 判断是否为文本时检查的字节数
+TEXT_PROBE_BYTES = 1024
+
+
+def read_header(path, size=DEFAULT_SNIFF_BYTES):
+    """
+    读取文件开头最多 size 个字节, 只发起一次读取
+
+    以非阻塞方式打开, 命名管道、设备等特殊文件不读取, 返回空字节串
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NONBLOCK', 0) | getattr(os, 'O_BINARY', 0))
+    try:
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            return b''
+        if hasattr(os, 'pread'):
+            return os.pread(fd, size, 0)
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _looks_like_text(header):
+    """没有NUL字节且能按UTF-8解码 (允许末尾被截断的多字节字符)"""
+    probe = header[:TEXT_PROBE_BYTES]
+    if not probe or b'\x00' in probe:
+        return False
+    try:
+        probe.decode('utf-8')
+    except UnicodeDecodeError as e:
+        return e.start >= len(probe) - 3 and e.reason == 'unexpected end of data'
+    return True
+
+
+def sniff_category(header):
+    """按文件头判断分类, 无法判断时返回None"""
+    text = _looks_like_text(header)
+    for offset, magic, category in SIGNATURES:
+        # 两字节的特征 (如 BM、MZ) 容易与普通文本重合
+        if header.startswith(magic, offset) and not (text and len(magic) <= 2):
+            return category
+    return 'Text' if text else None
+
+
+class ContentSniffer:
+    """
+    内容识别器
+
+    Args:
+        max_bytes: 每个文件最多读取的字节数, 至少覆盖特征表所需的字节数
+        allowed: 允许返回的分类集合 (如当前启用的分类), 为None时不限制
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SNIFF_BYTES, allowed=None):
+        self.max_bytes = max(max_bytes, SIGNATURE_BYTES)
+        self.allowed = allowed
+
+    def sniff(self, path):
+        """
+        识别单个文件
+
+        Returns:
+            tuple: (分类或None, 读取的字节数)
+        """
+        header = read_header(path, self.max_bytes)
+        category = sniff_category(header)
+        if self.allowed is not None and category not in self.allowed:
+            category = None
+        return category, len(header)
@@ -0,0 +1,130 @@
+"""
+内容校验
+
+按配置的哈希算法校验目标文件内容, 在独立线程池中运行,
+与后续的文件操作重叠进行
+"""
+import hashlib
+import os
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+HASH_BUFSIZE = 1024 * 1024
+
+# 哈希算法名 -> 构造函数
+HASH_ALGORITHMS = {
+    'blake2b': lambda: hashlib.blake2b(digest_size=32),
+    'sha256': hashlib.sha256,
+}
+if xxhash is not None:
+    HASH_ALGORITHMS['xxh3_128'] = xxhash.xxh3_128
+    HASH_ALGORITHMS['xxh64'] = xxhash.xxh64
+
+# 一次校验不通过的记录
+Mismatch = namedtuple('Mismatch', ['source', 'destination', 'reason'])
+
+
+def new_hasher(algorithm):
+    """创建哈希对象"""
+    try:
+        return HASH_ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"不支持的哈希算法: {algorithm} (可用: {', '.join(HASH_ALGORITHMS)})")
+
+
+def file_digest(path, algorithm):
+    """计算文件内容的哈希值"""
+    hasher = new_hasher(algorithm)
+    buffer = bytearray(HASH_BUFSIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class ChecksumVerifier:
+    """
+    内容校验器
+
+    源文件的哈希在复制时顺带计算, 这里只需要再读取一次目标文件;
+    同设备重命名不会改变文件数据, reflink克隆与源文件共享数据块, 只核对文件本身
+    """
+
+    # 每个校验线程最多积压的校验数, 超过时提交方等待最早的校验完成
+    PENDING_PER_WORKER = 64
+
+    def __init__(self, algorithm, max_workers=2):
+        # 提前检查算法是否可用
+        new_hasher(algorithm)
+        self.algorithm = algorithm
+        max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='verify')
+        # 尚未收取结果的校验, 按提交顺序; 内存占用与文件总数无关
+        self._pending = deque()
+        self._max_pending = max_workers * self.PENDING_PER_WORKER
+        # 已收取的不一致结果
+        self._mismatches = []
+        self._lock = threading.Lock()
+        # 统计: 计算哈希的文件数与字节数
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+
+    def submit(self, key, source, destination, result):
+        """提交一个已完成操作的校验, result 为 FileTransfer 返回的 TransferResult"""
+        self._pending.append((key, self._pool.submit(self._verify, source, destination, result)))
+        # 收取已完成的校验, 只保留不一致的结果
+        while self._pending and (self._pending[0][1].done() or len(self._pending) > self._max_pending):
+            self._collect(*self._pending.popleft())
+
+    def _collect(self, key, future):
+        try:
+            mismatch = future.result()
+        except OSError as e:
+            mismatch = Mismatch(None, None, f"校验出错: {e}")
+        if mismatch is not None:
+            self._mismatches.append((key, mismatch))
+
+    def _verify(self, source, destination, result):
+        """校验单个文件, 通过返回None, 否则返回 Mismatch"""
+        if not os.path.lexists(destination):
+            return Mismatch(source, destination, "目标文件不存在")
+        if result.digest is not None:
+            digest = file_digest(destination, self.algorithm)
+            with self._lock:
+                self.hashed_files += 1
+                self.hashed_bytes += os.path.getsize(destination)
+            if digest != result.digest:
+                # 保留源文件, 不删除
+                return Mismatch(source, destination, f"内容不一致 ({self.algorithm})")
+        elif result.method == 'reflink' and os.path.getsize(destination) != os.path.getsize(source):
+            return Mismatch(source, destination, "文件大小不一致")
+        if result.pending_unlink:
+            # 跨设备移动: 目标内容确认无误后才删除源文件
+            os.unlink(source)
+        return None
+
+    def results(self):
+        """
+        等待全部校验完成
+
+        Returns:
+            list: [(key, Mismatch)]
+        """
+        try:
+            while self._pending:
+                self._collect(*self._pending.popleft())
+        finally:
+            self._pool.shutdown()
+            self._pending.clear()
+        mismatches, self._mismatches = self._mismatches, []
+        return mismatches
@@ -0,0 +1,259 @@
+"""
+监视模式
+
+持续监视源目录 (投递目录), 文件写入完成后分批送入分类流程。
+Linux 上通过 inotify 订阅文件事件, 其他平台或 inotify 不可用时定期扫描。
+文件在 settle 秒内大小和修改时间都不再变化才视为写入完成
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from file_classifier.scanner import ScanEntry, scan_files
+
+# inotify 事件
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+READ_BUFSIZE = 64 * 1024
+
+# 空闲时检查取消标记的间隔
+IDLE_TIMEOUT = 1.0
+
+
+class PollingWatcher:
+    """定期扫描目录, 报告新增或大小/修改时间变化的文件"""
+
+    method = 'polling'
+
+    def __init__(self, src_dir, recursive=False, exclude=None, interval=2.0):
+        self.src_dir = src_dir
+        self.recursive = recursive
+        self.exclude = exclude
+        self.interval = interval
+        self._known = {}
+        self._next_scan = 0.0
+
+    def initial_files(self):
+        """当前已存在的文件"""
+        return self._scan()
+
+    def _scan(self):
+        changed = []
+        current = {}
+        for scanned in scan_files(self.src_dir, self.recursive, exclude=self.exclude):
+            try:
+                st = scanned.entry.stat()
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            current[scanned.path] = signature
+            if self._known.get(scanned.path) != signature:
+                changed.append(scanned.path)
+        self._known = current
+        self._next_scan = time.monotonic() + self.interval
+        return changed
+
+    def wait(self, timeout):
+        """等待最多 timeout 秒, 返回有变化的文件路径"""
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        return self._scan()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """基于 inotify 的监视器, 递归时为每个子目录添加监视"""
+
+    method = 'inotify'
+
+    def __init__(self, src_dir, recursive=False, exclude=None):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.src_dir = src_dir
+        self.recursive = recursive
+        self.exclude = exclude
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # 监视描述符 -> 目录
+        self._dirs = {}
+        self._poller = select.poll()
+        self._poller.register(self.fd, select.POLLIN)
+        self.overflows = 0
+        self._watch_tree(src_dir)
+
+    def _watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOSPC, errno.EMFILE):
+                raise OSError(err, f"inotify 监视数量达到上限: {os.strerror(err)}")
+            # 目录在添加监视之前已被删除
+            return
+        self._dirs[wd] = path
+
+    def _watch_tree(self, path):
+        """监视目录 (递归时包括子目录), 返回其中已存在的文件"""
+        self._watch(path)
+        if not self.recursive:
+            return []
+        files = []
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = [name for name in dir_names
+                            if not (self.exclude and self.exclude(os.path.join(dir_path, name)))]
+            for name in dir_names:
+                self._watch(os.path.join(dir_path, name))
+            files.extend(os.path.join(dir_path, name) for name in file_names)
+        return files
+
+    def initial_files(self):
+        """当前已存在的文件"""
+        return [scanned.path for scanned in scan_files(self.src_dir, self.recursive, exclude=self.exclude)]
+
+    def wait(self, timeout):
+        """等待最多 timeout 秒, 返回有写入或移入事件的文件路径"""
+        if not self._poller.poll(timeout * 1000):
+            return []
+        try:
+            data = os.read(self.fd, READ_BUFSIZE)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出, 可能漏掉事件, 重新扫描全部文件
+                self.overflows += 1
+                paths.extend(self.initial_files())
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                # 新建或移入的子目录: 添加监视, 并补上添加监视之前已写入的文件
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) \
+                        and not (self.exclude and self.exclude(path)):
+                    paths.extend(self._watch_tree(path))
+                continue
+            if self.exclude and not self.recursive and self.exclude(path):
+                continue
+            paths.append(path)
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(src_dir, recursive=False, exclude=None, polling=False, interval=2.0):
+    """创建监视器, inotify 不可用时使用定期扫描"""
+    if not polling and hasattr(select, 'poll'):
+        try:
+            return InotifyWatcher(src_dir, recursive, exclude)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(src_dir, recursive, exclude, interval)
+
+
+class StabilityTracker:
+    """
+    判断文件是否写入完成
+
+    记录每个候选文件的 (大小, 修改时间), settle 秒后再次检查, 两次一致即为写入完成
+    """
+
+    def __init__(self, settle=2.0, clock=time.monotonic):
+        self.settle = settle
+        self.clock = clock
+        # 路径 -> (签名, 到期时间)
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def touch(self, path):
+        """文件有新的事件, 重新开始计时"""
+        try:
+            self._pending[path] = (self._signature(path), self.clock() + self.settle)
+        except OSError:
+            self._pending.pop(path, None)
+
+    def next_due(self):
+        """最早到期的时间, 没有候选文件时为None"""
+        return min((due for _, due in self._pending.values()), default=None)
+
+    def ready(self):
+        """返回已写入完成的文件, 并从候选中移除"""
+        now = self.clock()
+        done = []
+        for path, (signature, due) in list(self._pending.items()):
+            if due > now:
+                continue
+            try:
+                current = self._signature(path)
+            except OSError:
+                # 文件已被删除或移走
+                del self._pending[path]
+                continue
+            if current == signature:
+                del self._pending[path]
+                done.append(path)
+            else:
+                self._pending[path] = (current, now + self.settle)
+        return done
+
+
+def scan_entries(src_dir, paths):
+    """把文件路径转换为 ScanEntry, 每个目录只列出一次"""
+    by_dir = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+    entries = []
+    for directory, names in by_dir.items():
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name in names and not entry.is_dir():
+                        entries.append(ScanEntry(entry.path, entry.name, os.path.relpath(entry.path, src_dir), entry))
+        except OSError:
+            continue
+    return entries